@@ -0,0 +1,96 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from logger_config import logger
+from market_features import MarketFeatures
+
+
+class ArtifactWriteError(RuntimeError):
+    """Raised by ArtifactWriter.join() when a background write failed."""
+
+
+
+def snapshot(data):
+    """
+    Immutable copy of an artifact for a background write.
+
+    DataFrames are deep-copied. MarketFeatures share their read-only arrays but
+    get their own latency / aggressiveness caches, which other stages keep
+    filling while the copy is saved. Other artifacts must already be read-only.
+    """
+    if isinstance(data, pd.DataFrame):
+        return data.copy(deep=True)
+    if isinstance(data, MarketFeatures):
+        return data.copy()
+    return data
+
+
+
+class ArtifactWriter:
+    """
+    Bounded background writer for intermediate artifacts.
+
+    submit() takes a snapshot of the artifact and returns at once; the write
+    runs on a small thread pool. At most max_pending writes are queued or
+    running: a further submit() blocks until one finishes (back-pressure),
+    so a slow disk cannot pile up snapshots in memory. join() waits for every
+    queued write and raises ArtifactWriteError for the first one that failed.
+    """
+
+    def __init__(self, max_workers=1, max_pending=4):
+        self.max_pending = max(int(max_pending), 1)
+        self.timings = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="artifact-writer")
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def submit(self, name, write, data):
+        """Queue write(snapshot(data)) under `name`; blocks while max_pending writes are outstanding."""
+        data = snapshot(data)
+        self._slots.acquire()
+        try:
+            future = self._pool.submit(self._write, name, write, data)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._futures.append((name, future))
+        return future
+
+    def _write(self, name, write, data):
+        start = time.perf_counter()
+        try:
+            write(data)
+        finally:
+            self._slots.release()
+        self.timings[name] = time.perf_counter() - start
+        logger.info(f"PIPELINE: Wrote '{name}' in the background in {self.timings[name]:.2f}s.")
+
+    @property
+    def pending(self):
+        with self._lock:
+            return sum(1 for _, future in self._futures if not future.done())
+
+    def join(self, raise_errors=True):
+        """Wait for all queued writes. Failed writes are logged; the first one is raised unless raise_errors is False."""
+        with self._lock:
+            futures, self._futures = self._futures, []
+
+        errors = []
+        for name, future in futures:
+            error = future.exception()
+            if error is not None:
+                logger.info(f"FLAG: Background write of '{name}' failed: {error!r}")
+                errors.append((name, error))
+
+        if errors and raise_errors:
+            name, error = errors[0]
+            raise ArtifactWriteError(f"Background write of '{name}' failed ({len(errors)} failed write(s) in total).") from error
+
+    def close(self):
+        self.join()
+        self._pool.shutdown(wait=True)
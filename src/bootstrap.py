@@ -0,0 +1,464 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger, log_blank_line
+from metrics import summarize_results
+from results_digest import ResultsDigest
+
+
+# Resampling schemes: "stationary" (geometric block lengths), "block" (fixed-length circular blocks), "iid"
+METHODS = ("stationary", "block", "iid")
+
+# Metrics with a bootstrap interval; the first two are resampled from per-trade values, the rest from interval returns
+CI_METRICS = ["avg_trade_pnl", "avg_slippage", "net_pnl", "max_drawdown", "max_drawdown_pct"]
+
+# Default memory budget of one chunk of resamples
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+
+
+# ---- Resample generation ----
+
+def _geometric(rng, p, size):
+    """Geometric(p) draws on {1, 2, ...} by inversion (several times faster than Generator.geometric)."""
+    with np.errstate(divide="ignore"):
+        return np.floor(np.log(1.0 - rng.random(size)) / np.log1p(-p)).astype(np.int64) + 1
+
+
+
+
+def resample_blocks(n, num_resamples, block_length, method, rng):
+    """
+    Draw the blocks of num_resamples bootstrap resamples of a length-n series.
+
+    Each resample is a sequence of circular blocks (start, length) whose
+    lengths add up to exactly n: fixed lengths for "block" / "iid", geometric
+    lengths with mean block_length for "stationary". Blocks past the end of a
+    resample have length 0.
+
+    Parameters
+    ----------
+    n : int
+        Length of the series.
+    num_resamples : int
+        Number of resamples.
+    block_length : float
+        (Mean) block length. Ignored for "iid".
+    method : str
+        One of METHODS.
+    rng : numpy.random.Generator
+        Source of randomness.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        (starts, lengths), both of shape (num_resamples, num_blocks).
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown bootstrap method '{method}'. Expected one of {METHODS}.")
+
+    block_length = 1 if method == "iid" else max(1, min(block_length, n))
+    if method == "stationary":
+        # Enough blocks to cover n in all but rare resamples, which are topped up below
+        num_blocks = int(np.ceil(n / block_length + 6 * np.sqrt(n / block_length))) + 10
+        lengths = _geometric(rng, 1.0 / block_length, (num_resamples, num_blocks))
+        while (lengths.sum(axis=1) < n).any():
+            lengths = np.hstack([lengths, _geometric(rng, 1.0 / block_length, (num_resamples, num_blocks))])
+    else:
+        block_length = int(round(block_length))
+        lengths = np.full((num_resamples, -(-n // block_length)), block_length)
+
+    # Truncate every resample to exactly n values
+    ends = np.minimum(np.cumsum(lengths, axis=1), n)
+    lengths = np.diff(ends, axis=1, prepend=0)
+    starts = rng.integers(0, n, size=lengths.shape)
+    return starts, lengths
+
+
+
+def resampled_sums(values, starts, lengths):
+    """
+    Sum of each resample for one or more series, without materializing the resamples.
+
+    Block sums come from prefix sums over the series repeated twice (circular
+    blocks), so the cost depends on the number of blocks, not on n.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Series of shape (n,) or (n, k).
+    starts, lengths : numpy.ndarray
+        Output of resample_blocks().
+
+    Returns
+    -------
+    numpy.ndarray
+        Sums of shape (num_resamples,) or (num_resamples, k).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    prefix = np.concatenate([np.zeros((1,) + values.shape[1:]), np.cumsum(np.concatenate([values, values]), axis=0)])
+    ends = starts + lengths
+    if values.ndim == 1:
+        return np.take(prefix, ends).sum(axis=1) - np.take(prefix, starts).sum(axis=1)
+    # One contiguous prefix array per series keeps the random gathers cache friendly
+    return np.column_stack([np.take(column, ends).sum(axis=1) - np.take(column, starts).sum(axis=1)
+                            for column in np.ascontiguousarray(prefix.T)])
+
+
+
+def resampled_indices(n, starts, lengths):
+    """Materialize the (num_resamples, n) index matrix of the resamples."""
+    flat_lengths = lengths.ravel()
+    block_first = np.cumsum(flat_lengths) - flat_lengths
+    offsets = np.arange(flat_lengths.sum()) - np.repeat(block_first, flat_lengths)
+    return ((np.repeat(starts.ravel(), flat_lengths) + offsets) % n).reshape(lengths.shape[0], n)
+
+
+
+def path_drawdowns(increments):
+    """
+    Max drawdown, max drawdown % and final PnL of PnL paths, following the RealTimePnL rule.
+
+    Parameters
+    ----------
+    increments : numpy.ndarray
+        PnL increments of shape (num_paths, num_steps).
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        (max_drawdown, max_drawdown_pct, final_pnl), each of shape (num_paths,).
+    """
+    paths = np.cumsum(increments, axis=1)
+    peak = np.maximum.accumulate(np.hstack([np.zeros((len(paths), 1)), paths]), axis=1)
+    previous_peak = peak[:, :-1]
+    drawdown = np.where(previous_peak != 0, previous_peak - paths, 0.0)
+    max_drawdown = np.maximum(drawdown.max(axis=1), 0.0)
+    final_peak = peak[:, -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        max_drawdown_pct = np.where(final_peak != 0, max_drawdown / final_peak * 100, np.nan)
+    return max_drawdown, max_drawdown_pct, paths[:, -1]
+
+
+
+class RangeExtrema:
+    """
+    Min and max of values[first:last + 1] for many ranges at once.
+
+    values is cut into chunks of chunk_size. Every position stores the running
+    min / max from its chunk start and to its chunk end, and a sparse table
+    holds the min / max of every run of 2^k whole chunks, so a range spanning
+    several chunks takes a few lookups. A range inside one chunk is reduced
+    from a gather of chunk_size values. Memory is about 5 float64 values per
+    input value.
+    """
+
+    def __init__(self, values, chunk_size=16):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.chunk_size = chunk_size
+
+        num_chunks = -(-len(self.values) // chunk_size)
+        chunk_mins = np.full(num_chunks * chunk_size, np.inf)
+        chunk_maxs = np.full(num_chunks * chunk_size, -np.inf)
+        chunk_mins[:len(self.values)] = self.values
+        chunk_maxs[:len(self.values)] = self.values
+        chunk_mins = chunk_mins.reshape(num_chunks, chunk_size)
+        chunk_maxs = chunk_maxs.reshape(num_chunks, chunk_size)
+
+        self.to_end_min = np.minimum.accumulate(chunk_mins[:, ::-1], axis=1)[:, ::-1].ravel()
+        self.to_end_max = np.maximum.accumulate(chunk_maxs[:, ::-1], axis=1)[:, ::-1].ravel()
+        self.from_start_min = np.minimum.accumulate(chunk_mins, axis=1).ravel()
+        self.from_start_max = np.maximum.accumulate(chunk_maxs, axis=1).ravel()
+
+        self.table_min = [chunk_mins.min(axis=1)]
+        self.table_max = [chunk_maxs.max(axis=1)]
+        width = 1
+        while 2 * width <= num_chunks:
+            self.table_min.append(np.minimum(self.table_min[-1][:-width], self.table_min[-1][width:]))
+            self.table_max.append(np.maximum(self.table_max[-1][:-width], self.table_max[-1][width:]))
+            width *= 2
+
+    def query(self, first, last):
+        """(min, max) of every range [first, last] (inclusive, first <= last), as flat arrays."""
+        first, last = np.ravel(first), np.ravel(last)
+        first_chunk, last_chunk = first // self.chunk_size, last // self.chunk_size
+        lows = np.minimum(self.to_end_min[first], self.from_start_min[last])
+        highs = np.maximum(self.to_end_max[first], self.from_start_max[last])
+
+        # Whole chunks between the first and the last chunk: two overlapping runs of 2^k chunks
+        num_inner = last_chunk - first_chunk - 1
+        inner = np.flatnonzero(num_inner > 0)
+        levels = np.frexp(num_inner[inner])[1] - 1
+        for level in np.unique(levels):
+            rows = inner[levels == level]
+            left, right = first_chunk[rows] + 1, last_chunk[rows] - (1 << level)
+            lows[rows] = np.minimum(lows[rows], np.minimum(self.table_min[level][left], self.table_min[level][right]))
+            highs[rows] = np.maximum(highs[rows], np.maximum(self.table_max[level][left], self.table_max[level][right]))
+
+        # Ranges inside one chunk (indices past last repeat values[last], which leaves min / max unchanged)
+        same = np.flatnonzero(first_chunk == last_chunk)
+        if len(same):
+            indices = np.minimum(first[same, None] + np.arange(self.chunk_size), last[same, None])
+            window = self.values[indices]
+            lows[same] = window.min(axis=1)
+            highs[same] = window.max(axis=1)
+        return lows, highs
+
+
+
+def resampled_path_drawdowns(prefix, extrema, starts, lengths, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    path_drawdowns() of the resampled return paths, from block sums and block extrema.
+
+    prefix holds the prefix sums of the returns repeated twice (circular
+    blocks) and extrema a RangeExtrema over it, so every block's sum and the
+    min / max of its running PnL cost a few lookups. With the PnL before each
+    block and the peak of the earlier blocks, the drawdown of a trough inside
+    a block from an earlier peak follows from the block min. A drawdown whose
+    peak and trough fall in the same block can only exceed the result when
+    the block's own range (max - min) does, so only those blocks are rebuilt
+    tick by tick, in batches of about max_bytes. The result equals
+    path_drawdowns(returns[resampled_indices(...)]) up to floating-point
+    rounding.
+
+    Parameters
+    ----------
+    prefix : numpy.ndarray
+        Prefix sums (starting with 0) of the returns repeated twice, shape (2n + 1,).
+    extrema : RangeExtrema
+        Range min / max of prefix.
+    starts, lengths : numpy.ndarray
+        Output of resample_blocks().
+    max_bytes : int, optional
+        Memory budget of one batch of rebuilt blocks. Default is DEFAULT_MAX_BYTES.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        (max_drawdown, max_drawdown_pct, final_pnl), each of shape (num_resamples,).
+    """
+    used = lengths > 0
+    base_prefix = prefix[starts]
+    lows, highs = extrema.query(starts + 1, starts + np.maximum(lengths, 1))
+    sums = np.where(used, prefix[starts + lengths] - base_prefix, 0.0)
+    block_min = np.where(used, lows.reshape(starts.shape) - base_prefix, np.inf)
+    block_max = np.where(used, highs.reshape(starts.shape) - base_prefix, -np.inf)
+
+    # PnL before each block, and the peak (at least 0) before each block
+    zeros = np.zeros((len(starts), 1))
+    bases = np.hstack([zeros, np.cumsum(sums, axis=1)[:, :-1]])
+    tops = bases + block_max
+    peaks = np.maximum.accumulate(np.hstack([zeros, tops[:, :-1]]), axis=1)
+    final_peak = np.maximum(peaks[:, -1], tops[:, -1])
+    final_pnl = bases[:, -1] + sums[:, -1]
+
+    # Troughs below an earlier block's peak (no drawdown before the first positive peak)
+    max_drawdown = np.maximum(np.where(peaks > 0, peaks - (bases + block_min), -np.inf).max(axis=1), 0.0)
+
+    # Blocks that may hold a larger drawdown from a peak inside the block
+    rows, cols = np.nonzero(used & ((peaks > 0) | (tops > 0)) & (block_max - block_min > max_drawdown[:, None]))
+    block_lengths = lengths[rows, cols]
+    ends = np.cumsum(block_lengths)
+    batch_ticks = max(1, int(max_bytes // (8 * 8)))
+    first = 0
+    while first < len(rows):
+        done = ends[first - 1] if first > 0 else 0
+        last = max(first + 1, int(np.searchsorted(ends, done + batch_ticks, side="right")))
+        batch = slice(first, last)
+        batch_lengths = block_lengths[batch]
+        block_first = np.cumsum(batch_lengths) - batch_lengths
+        offsets = np.arange(batch_lengths.sum()) - np.repeat(block_first, batch_lengths)
+        batch_starts = starts[rows[batch], cols[batch]]
+        path = (np.repeat(bases[rows[batch], cols[batch]], batch_lengths)
+                + (prefix[np.repeat(batch_starts + 1, batch_lengths) + offsets] - np.repeat(prefix[batch_starts], batch_lengths)))
+
+        # Peak before every tick: the block's starting peak or the running max inside the block
+        segments = np.repeat(np.arange(len(batch_lengths)), batch_lengths)
+        running_max = pd.Series(path).groupby(segments).cummax().to_numpy()
+        previous_max = np.empty_like(running_max)
+        previous_max[1:] = running_max[:-1]
+        previous_max[block_first] = -np.inf
+        previous_peak = np.maximum(previous_max, np.repeat(peaks[rows[batch], cols[batch]], batch_lengths))
+        drawdown = np.where(previous_peak > 0, previous_peak - path, 0.0)
+        np.maximum.at(max_drawdown, rows[batch], np.maximum.reduceat(drawdown, block_first))
+        first = last
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        max_drawdown_pct = np.where(final_peak != 0, max_drawdown / final_peak * 100, np.nan)
+    return max_drawdown, max_drawdown_pct, final_pnl
+
+
+
+# ---- Samples from the results ----
+
+def trade_samples(results_df):
+    """
+    Per-trade samples of a results DataFrame.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        - closes : (n, 2) realized PnL change and closed trade count of every row closing trades
+        - fills : (n, 2) slippage and trade count of every row with executed trades
+    """
+    closed_count = results_df["num_of_closed_trades"].to_numpy(np.float64)
+    realized_change = np.diff(results_df["realized_pnl"].to_numpy(np.float64), prepend=0.0)
+    trade_count = results_df["num_of_trades"].to_numpy(np.float64)
+    slippage = np.nan_to_num(results_df["slippage"].to_numpy(np.float64))
+
+    closes = np.column_stack([realized_change, closed_count])[closed_count > 0]
+    fills = np.column_stack([slippage, trade_count])[trade_count > 0]
+    return closes, fills
+
+
+
+def interval_returns(results_df, interval="1s"):
+    """Net PnL change per `interval` of exchange time (pandas frequency string)."""
+    net_pnl = pd.Series(results_df["net_pnl"].to_numpy(np.float64), index=pd.to_datetime(results_df["exchange_time"]))
+    net_pnl = net_pnl[net_pnl.index.notna()]
+    closing_pnl = net_pnl.groupby(net_pnl.index.floor(interval)).last()
+    return np.diff(closing_pnl.to_numpy(), prepend=0.0)
+
+
+
+# ---- Confidence intervals ----
+
+def _chunks(num_resamples, bytes_per_resample, max_bytes):
+    """Split num_resamples into chunk sizes that keep each chunk within max_bytes."""
+    chunk = max(1, int(max_bytes // max(bytes_per_resample, 1)))
+    return [min(chunk, num_resamples - start) for start in range(0, num_resamples, chunk)]
+
+
+
+def bootstrap_metrics(results_df, num_resamples=10000, method="stationary", block_length=None, interval="1s",
+                      seed=None, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Bootstrap distribution of the summary metrics of a simulation run.
+
+    avg_trade_pnl and avg_slippage resample the per-trade samples of
+    trade_samples(); net_pnl, max_drawdown and max_drawdown_pct resample the
+    per-interval net PnL returns and reduce the PnL path from block sums and
+    block extrema (resampled_path_drawdowns()). Resample blocks are drawn for
+    a whole chunk of resamples at once; chunks are sized so that no
+    intermediate array exceeds about max_bytes.
+
+    Parameters
+    ----------
+    results_df : pandas.DataFrame or ResultsDigest
+        Simulation results, or their digest built with the same interval.
+    num_resamples : int, optional
+        Number of bootstrap resamples. Default is 10000.
+    method : str, optional
+        One of METHODS. Default is "stationary".
+    block_length : float, optional
+        (Mean) block length. Default is n ** (1/3) for each series.
+    interval : str, optional
+        Frequency of the PnL returns. Default is "1s".
+    seed : int, optional
+        Seed of the resampling generator (the global NumPy RNG is not touched).
+    max_bytes : int, optional
+        Memory budget of one chunk. Default is DEFAULT_MAX_BYTES.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One column per metric of CI_METRICS, one row per resample.
+    """
+    rng = np.random.default_rng(seed)
+    if isinstance(results_df, ResultsDigest):
+        closes, fills = results_df.trade_samples()
+        returns = results_df.interval_returns(interval)
+    else:
+        closes, fills = trade_samples(results_df)
+        returns = interval_returns(results_df, interval)
+    samples = {metric: np.full(num_resamples, np.nan) for metric in CI_METRICS}
+
+    def blocks_for(n):
+        return block_length if block_length is not None else max(1.0, n ** (1 / 3))
+
+    # --- Ratio metrics from block sums (memory per resample ~ number of blocks) ---
+    for metric, data in (("avg_trade_pnl", closes), ("avg_slippage", fills)):
+        n = len(data)
+        if n == 0:
+            continue
+        done = 0
+        for chunk in _chunks(num_resamples, 8 * 8 * (n / blocks_for(n) + 6 * np.sqrt(n / blocks_for(n)) + 10), max_bytes):
+            starts, lengths = resample_blocks(n, chunk, blocks_for(n), method, rng)
+            sums = resampled_sums(data, starts, lengths)
+            samples[metric][done:done + chunk] = sums[:, 0] / sums[:, 1]
+            done += chunk
+
+    # --- Path metrics from block sums and block extrema of the interval returns ---
+    n = len(returns)
+    if n > 0:
+        prefix = np.concatenate([[0.0], np.cumsum(np.concatenate([returns, returns]))])
+        extrema = RangeExtrema(prefix)
+        done = 0
+        for chunk in _chunks(num_resamples, 8 * 16 * (n / blocks_for(n) + 6 * np.sqrt(n / blocks_for(n)) + 10), max_bytes):
+            starts, lengths = resample_blocks(n, chunk, blocks_for(n), method, rng)
+            max_drawdown, max_drawdown_pct, net_pnl = resampled_path_drawdowns(prefix, extrema, starts, lengths, max_bytes)
+            samples["net_pnl"][done:done + chunk] = net_pnl
+            samples["max_drawdown"][done:done + chunk] = max_drawdown
+            samples["max_drawdown_pct"][done:done + chunk] = max_drawdown_pct
+            done += chunk
+
+    return pd.DataFrame(samples)
+
+
+
+def confidence_intervals(results_df, confidence=0.95, **kwargs):
+    """
+    Percentile bootstrap confidence intervals of the summary metrics.
+
+    Parameters
+    ----------
+    results_df : pandas.DataFrame or ResultsDigest
+        Simulation results, or their digest.
+    confidence : float, optional
+        Confidence level. Default is 0.95.
+    **kwargs
+        Passed to bootstrap_metrics().
+
+    Returns
+    -------
+    pandas.DataFrame
+        Indexed by metric with the columns estimate (summarize_results()),
+        lower, upper and std of the bootstrap distribution.
+    """
+    samples_df = bootstrap_metrics(results_df, **kwargs)
+    estimates = results_df.summary() if isinstance(results_df, ResultsDigest) else summarize_results(results_df)
+    alpha = (1 - confidence) / 2
+
+    rows = []
+    for metric in CI_METRICS:
+        values = samples_df[metric].to_numpy()
+        values = values[np.isfinite(values)]
+        lower, upper = np.quantile(values, [alpha, 1 - alpha]) if len(values) else (np.nan, np.nan)
+        rows.append({"metric": metric, "estimate": estimates[metric], "lower": lower, "upper": upper,
+                     "std": values.std(ddof=1) if len(values) > 1 else np.nan})
+    return pd.DataFrame(rows).set_index("metric")
+
+
+
+def report_confidence_intervals(results_df, bootstrap_config, results_path):
+    """Log the confidence intervals of a run and write them to metrics_ci.csv next to the results."""
+    confidence = bootstrap_config.get("confidence", 0.95)
+
+    log_blank_line()
+    logger.info("-------- Bootstrap Confidence Intervals --------")
+    logger.info("================================================")
+
+    intervals_df = confidence_intervals(results_df, confidence,
+                                        num_resamples=bootstrap_config.get("num_resamples", 10000),
+                                        method=bootstrap_config.get("method", "stationary"),
+                                        block_length=bootstrap_config.get("block_length"),
+                                        interval=bootstrap_config.get("interval", "1s"),
+                                        seed=bootstrap_config.get("seed"))
+    for metric, row in intervals_df.iterrows():
+        logger.info(f"INFO: {metric}: {row['estimate']:.6f} ({confidence:.0%} CI {row['lower']:.6f} to {row['upper']:.6f})")
+
+    intervals_path = os.path.join(results_path, "metrics_ci.csv")
+    intervals_df.to_csv(intervals_path)
+    logger.info(f"INFO: Wrote confidence intervals to {intervals_path}")
+    return intervals_df
@@ -0,0 +1,287 @@
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger, log_blank_line
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+config_path = os.path.join(PROJECT_ROOT, "config", "config.json")
+
+# Columns of the order attempts file
+ATTEMPT_COLUMNS = ["side", "sent_price", "market_price", "spread_flag", "filled"]
+
+# Probabilities are kept inside (0, 1) when taking logs
+PROB_EPS = 1e-12
+
+# Decimals the price offset (sent / market - 1) is rounded to before grouping; 1e-7 is 0.001 bp
+DEFAULT_RATIO_DECIMALS = 7
+
+# min_price_aggressiveness is fitted in [0, 1 - MIN_AGGRESSIVENESS_MARGIN]: at 1, ca and cb collapse to 1
+MIN_AGGRESSIVENESS_MARGIN = 1e-6
+
+
+def execution_probability(is_buy, sent_price, market_price, spread_flag, ca, cb, min_price_aggressiveness, spread_penalty_factor):
+    """
+    Vectorized execution probability of simulation().
+
+    Buy orders (open_long / close_short) are priced against the market ask with
+    `ca`, sell orders (close_long / open_short) against the market bid with `cb`.
+    `ca` and `cb` are the simulation() arguments, i.e. config "cb" and "ca".
+
+    Parameters
+    ----------
+    is_buy : numpy.ndarray of bool
+        True for buy orders, False for sell orders.
+    sent_price, market_price : numpy.ndarray
+        Sent order price and market ask (buy) or bid (sell) at the execution time.
+    spread_flag : numpy.ndarray
+        1 where the execution quote was flagged.
+    ca, cb, min_price_aggressiveness, spread_penalty_factor : float
+        Execution probability parameters, as in simulation().
+
+    Returns
+    -------
+    numpy.ndarray
+        Execution probability per order.
+    """
+    c = np.where(is_buy, ca, cb)
+    m = min_price_aggressiveness
+    price_aggressiveness = (((1 - m) * sent_price) + (market_price * ((m * c) - 1))) / (market_price * (c - 1))
+    price_aggressiveness = np.clip(price_aggressiveness, 0, 1.0)
+    penalty = np.where(spread_flag == 1, spread_penalty_factor, 1.0)
+    return penalty * price_aggressiveness
+
+
+
+def load_attempts(attempts_csv_path):
+    """
+    Read historical order attempts and keep those that reached the probability draw.
+
+    The file has one row per order with the columns of ATTEMPT_COLUMNS: side
+    ("buy" / "sell"), sent_price, market_price (ask for buys, bid for sells at the
+    execution time), spread_flag and filled (1 / 0). An optional available_qty
+    column drops orders that could not fill for lack of volume. Orders priced
+    through the market never reach the draw and carry no information on the
+    parameters, so they are dropped as well.
+
+    Parameters
+    ----------
+    attempts_csv_path : str
+        Path of the attempts CSV.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Attempts with an is_buy column added.
+    """
+    attempts_df = pd.read_csv(attempts_csv_path)
+    missing = [col for col in ATTEMPT_COLUMNS if col not in attempts_df.columns]
+    if missing:
+        raise ValueError(f"Attempts file {attempts_csv_path} is missing column(s) {missing}.")
+
+    initial_row_count = len(attempts_df)
+    attempts_df = attempts_df.dropna(subset=ATTEMPT_COLUMNS)
+    attempts_df["is_buy"] = attempts_df["side"].str.lower().eq("buy")
+
+    reached_draw = np.where(attempts_df["is_buy"], attempts_df["sent_price"] >= attempts_df["market_price"],
+                            attempts_df["sent_price"] <= attempts_df["market_price"])
+    if "available_qty" in attempts_df.columns:
+        reached_draw &= attempts_df["available_qty"].to_numpy() > 0
+    attempts_df = attempts_df[reached_draw].reset_index(drop=True)
+
+    rows_dropped = initial_row_count - len(attempts_df)
+    if rows_dropped > 0:
+        logger.info(f"ACTION: Dropped {rows_dropped} attempt(s) that never reached the execution draw.")
+    logger.info(f"INFO: {len(attempts_df)} order attempt(s), {int(attempts_df['filled'].sum())} filled.")
+
+    return attempts_df
+
+
+
+def _nelder_mead(func, x0, steps, max_iter=5000, tol=1e-10):
+    """Minimize func with the Nelder-Mead simplex method (NumPy only)."""
+    n = len(x0)
+    simplex = np.vstack([x0] + [x0 + np.eye(n)[i] * steps[i] for i in range(n)])
+    values = np.array([func(x) for x in simplex])
+
+    for _ in range(max_iter):
+        order = np.argsort(values)
+        simplex, values = simplex[order], values[order]
+        if abs(values[-1] - values[0]) <= tol * (abs(values[0]) + tol) and np.ptp(simplex, axis=0).max() <= tol:
+            break
+
+        centroid = simplex[:-1].mean(axis=0)
+        reflected = centroid + (centroid - simplex[-1])
+        reflected_value = func(reflected)
+
+        if reflected_value < values[0]:
+            expanded = centroid + 2 * (centroid - simplex[-1])
+            expanded_value = func(expanded)
+            if expanded_value < reflected_value:
+                simplex[-1], values[-1] = expanded, expanded_value
+            else:
+                simplex[-1], values[-1] = reflected, reflected_value
+        elif reflected_value < values[-2]:
+            simplex[-1], values[-1] = reflected, reflected_value
+        else:
+            contracted = centroid + 0.5 * (simplex[-1] - centroid)
+            contracted_value = func(contracted)
+            if contracted_value < values[-1]:
+                simplex[-1], values[-1] = contracted, contracted_value
+            else:
+                simplex[1:] = simplex[0] + 0.5 * (simplex[1:] - simplex[0])
+                values[1:] = [func(x) for x in simplex[1:]]
+
+    best = np.argmin(values)
+    return simplex[best], values[best]
+
+
+
+def calibrate_fill_model(attempts_df, sim_config, ratio_decimals=DEFAULT_RATIO_DECIMALS):
+    """
+    Fit ca, cb, min_price_aggressiveness and spread_penalty_factor by maximum likelihood.
+
+    Each attempt fills with the probability of execution_probability(), so the
+    fit minimizes the Bernoulli negative log-likelihood of the observed fills.
+    The price aggressiveness is rewritten as m + k * (sent / market - 1) with
+    k = (1 - m) / (c - 1), which is smooth in (m, k_buy, k_sell, penalty).
+    Attempts are first grouped by (side, price offset, spread flag), with the
+    offset sent / market - 1 rounded to `ratio_decimals` decimals, so the
+    cost of each likelihood evaluation depends on the number of price levels
+    (at most a few per offset bin) rather than on the number of attempts. A
+    parameter the data cannot identify (no attempts away from the touch on
+    one side, or no flagged quotes) is kept at its config value. m is kept
+    below 1 by MIN_AGGRESSIVENESS_MARGIN, since ca and cb are 1 + (1 - m) / k.
+
+    Parameters
+    ----------
+    attempts_df : pandas.DataFrame
+        Output of load_attempts().
+    sim_config : dict
+        The "simulation" section of the config, used as the starting point.
+    ratio_decimals : int, optional
+        Decimals of the binned price offset. Default is DEFAULT_RATIO_DECIMALS.
+
+    Returns
+    -------
+    dict
+        Fitted config values ("ca", "cb", "min_price_aggressiveness",
+        "spread_penalty_factor"), plus "log_likelihood" and "initial_log_likelihood".
+    """
+    # simulation() receives config ca as cb and config cb as ca
+    ca0, cb0 = sim_config["cb"], sim_config["ca"]
+    m0 = sim_config["min_price_aggressiveness"]
+    penalty0 = sim_config["spread_penalty_factor"]
+
+    # --- Sufficient statistics: attempts and fills per (side, binned price offset, flag) ---
+    ratio = attempts_df["sent_price"].to_numpy(np.float64) / attempts_df["market_price"].to_numpy(np.float64)
+    grouped = pd.DataFrame({"is_buy": attempts_df["is_buy"].to_numpy(), "x": np.round(ratio - 1, ratio_decimals),
+                            "flag": (attempts_df["spread_flag"].to_numpy() == 1), "filled": attempts_df["filled"].to_numpy()})
+    grouped = grouped.groupby(["is_buy", "x", "flag"], sort=False)["filled"].agg(["size", "sum"]).reset_index()
+    is_buy = grouped["is_buy"].to_numpy()
+    x = grouped["x"].to_numpy()
+    flag = grouped["flag"].to_numpy()
+    attempts = grouped["size"].to_numpy(np.float64)
+    fills = grouped["sum"].to_numpy(np.float64)
+    logger.info(f"INFO: {len(attempts_df)} attempt(s) in {len(grouped)} (side, price offset, spread flag) level(s).")
+
+    def negative_log_likelihood(m, k_buy, k_sell, penalty):
+        price_aggressiveness = np.clip(m + np.where(is_buy, k_buy, k_sell) * x, 0, 1.0)
+        prob = np.clip(np.where(flag, penalty, 1.0) * price_aggressiveness, PROB_EPS, 1 - PROB_EPS)
+        return -float(np.sum(fills * np.log(prob) + (attempts - fills) * np.log1p(-prob)))
+
+    initial = {"m": m0, "k_buy": (1 - m0) / (ca0 - 1), "k_sell": (1 - m0) / (cb0 - 1), "penalty": penalty0}
+    free = ["m"]
+    if np.any(is_buy & (x != 0)):
+        free.append("k_buy")
+    if np.any(~is_buy & (x != 0)):
+        free.append("k_sell")
+    if np.any(flag):
+        free.append("penalty")
+
+    def objective(values):
+        params = {**initial, **dict(zip(free, values))}
+        params["m"] = float(np.clip(params["m"], 0, 1 - MIN_AGGRESSIVENESS_MARGIN))
+        params["penalty"] = float(np.clip(params["penalty"], 0, 1))
+        return negative_log_likelihood(**params)
+
+    x0 = np.array([initial[name] for name in free], dtype=np.float64)
+    steps = np.where(np.abs(x0) > 0, 0.1 * np.abs(x0), 0.05)
+    best, best_value = _nelder_mead(objective, x0, steps)
+
+    fitted = {**initial, **dict(zip(free, best))}
+    m = float(np.clip(fitted["m"], 0, 1 - MIN_AGGRESSIVENESS_MARGIN))
+    ca = 1 + (1 - m) / fitted["k_buy"] if fitted["k_buy"] != 0 else ca0
+    cb = 1 + (1 - m) / fitted["k_sell"] if fitted["k_sell"] != 0 else cb0
+    if not (np.isfinite(ca) and np.isfinite(cb)) or ca == 1 or cb == 1:
+        raise ValueError(f"Degenerate fill model fit (min_price_aggressiveness {m}, ca {cb}, cb {ca}): the execution "
+                         "probability divides by ca - 1 and cb - 1.")
+
+    return {
+        # Back to config naming
+        "ca": float(cb),
+        "cb": float(ca),
+        "min_price_aggressiveness": m,
+        "spread_penalty_factor": float(np.clip(fitted["penalty"], 0, 1)),
+        "log_likelihood": -float(best_value),
+        "initial_log_likelihood": -negative_log_likelihood(**initial),
+    }
+
+
+
+def save_overlay(fitted, overlay_path):
+    """Write the fitted parameters as a config overlay ({"simulation": {...}})."""
+    overlay = {"simulation": {key: fitted[key] for key in ("ca", "cb", "min_price_aggressiveness", "spread_penalty_factor")}}
+    os.makedirs(os.path.dirname(overlay_path) or ".", exist_ok=True)
+    with open(overlay_path, "w") as f:
+        json.dump(overlay, f, indent=4)
+    logger.info(f"INFO: Wrote calibrated parameters to {overlay_path}")
+
+
+
+def apply_overlay(config, overlay):
+    """Return config with the sections of a config overlay merged in (overlay values win)."""
+    merged = dict(config)
+    for section, values in overlay.items():
+        merged[section] = {**config.get(section, {}), **values} if isinstance(values, dict) else values
+    return merged
+
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Calibrate the fill model (ca, cb, min_price_aggressiveness, spread_penalty_factor) from observed fills.")
+    parser.add_argument("attempts_csv", help="CSV of order attempts with columns " + ", ".join(ATTEMPT_COLUMNS) + ".")
+    parser.add_argument("--out", default=os.path.join(PROJECT_ROOT, "config", "calibrated_overlay.json"),
+                        help="Path of the config overlay to write.")
+    parser.add_argument("--ratio-decimals", type=int, default=DEFAULT_RATIO_DECIMALS,
+                        help="Decimals the price offset (sent / market - 1) is rounded to before fitting.")
+    return parser.parse_args()
+
+
+
+def main(args):
+    with open(config_path, "r") as f:
+        config = json.load(f)
+
+    log_blank_line()
+    logger.info("-------- Fill Model Calibration --------")
+    logger.info("========================================")
+
+    attempts_df = load_attempts(args.attempts_csv)
+    fitted = calibrate_fill_model(attempts_df, config["simulation"], args.ratio_decimals)
+
+    for key in ("ca", "cb", "min_price_aggressiveness", "spread_penalty_factor"):
+        logger.info(f"INFO: {key}: {config['simulation'][key]} -> {fitted[key]:.6f}")
+    logger.info(f"INFO: Log-likelihood {fitted['initial_log_likelihood']:.3f} -> {fitted['log_likelihood']:.3f}")
+
+    save_overlay(fitted, args.out)
+
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,379 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger, log_blank_line
+from metrics import RealTimePnL
+from schema import apply_schema, matched_schema
+from signal_integration import integrate_signals
+from simulator import simulation, event_simulation, simulation_params
+from tick_runs import TickRuns, run_length_simulation
+from validation import validate_quotes, validate_signals
+
+try:
+    import pytest
+except ImportError:  # pytest is optional; the fixture is only defined when it is installed
+    pytest = None
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+config_path = os.path.join(PROJECT_ROOT, "config", "config.json")
+
+# Generated datasets checked by default: (name, generate_matched() keyword arguments)
+GENERATED_DATASETS = [
+    ("sparse_signals", {"n_ticks": 5000, "seed": 1, "signal_density": 0.02}),
+    ("dense_signals", {"n_ticks": 5000, "seed": 2, "signal_density": 0.5}),
+    ("duplicate_timestamps", {"n_ticks": 3000, "seed": 3, "signal_density": 0.2, "duplicate_rate": 0.05}),
+    ("unsorted_ticks", {"n_ticks": 3000, "seed": 4, "signal_density": 0.2, "shuffle": True}),
+    ("wide_spreads", {"n_ticks": 3000, "seed": 5, "signal_density": 0.2, "flag_rate": 0.5}),
+    ("stale_quotes", {"n_ticks": 5000, "seed": 6, "signal_density": 0.02, "stale_rate": 0.9}),
+]
+
+
+class EquivalenceError(AssertionError):
+    """Raised when a candidate engine does not reproduce the reference results."""
+
+
+
+# ---- Engines ----
+# An engine is called as engine(matched_df, pnl_obj, **simulation_params(...)) and returns the results DataFrame.
+
+def reference_engine(matched_df, pnl_obj, **params):
+    """The per-tick simulation() loop every other engine is compared against."""
+    results_df, _ = simulation(matched_df, pnl_obj=pnl_obj, **params)
+    return results_df
+
+
+
+def event_engine(matched_df, pnl_obj, **params):
+    """event_simulation() with one result row per tick."""
+    results_df, _ = event_simulation(matched_df, pnl_obj=pnl_obj, per_tick=True, **params)
+    return results_df
+
+
+
+def tick_runs_engine(matched_df, pnl_obj, **params):
+    """run_length_simulation() on the run-length encoded ticks, with one result row per tick."""
+    results_df, _ = run_length_simulation(TickRuns.from_frame(matched_df), pnl_obj=pnl_obj, per_tick=True, **params)
+    return results_df
+
+
+
+ENGINES = {
+    "reference": reference_engine,
+    "event_driven": event_engine,
+    "tick_runs": tick_runs_engine,
+}
+
+
+
+# ---- Datasets ----
+
+def generate_matched(n_ticks=2000, seed=0, signal_density=0.2, flag_rate=0.05, gap_rate=0.05, duplicate_rate=0.0,
+                     shuffle=False, precision="float64", stale_rate=0.0):
+    """
+    Generate a matched DataFrame (quotes with spread flags and signal actions).
+
+    Mid prices follow a random walk with random spreads; ticks are one second
+    apart with a share of them dropped to leave gaps in the exchange time grid.
+
+    Parameters
+    ----------
+    n_ticks : int, optional
+        Number of ticks before gaps and duplicates. Default is 2000.
+    seed : int, optional
+        Seed of the generator. Default is 0.
+    signal_density : float, optional
+        Share of ticks carrying a signal (long, short or below the threshold). Default is 0.2.
+    flag_rate : float, optional
+        Share of ticks with spread_flag = 1. Default is 0.05.
+    gap_rate : float, optional
+        Share of ticks dropped. Default is 0.05.
+    duplicate_rate : float, optional
+        Share of ticks repeated with the same timestamp. Default is 0.0.
+    shuffle : bool, optional
+        Return the rows in random order. Default is False.
+    precision : str, optional
+        Price precision of the result (see schema.py). Default is "float64".
+    stale_rate : float, optional
+        Share of ticks repeating the previous quote (prices, quantities and spread flag),
+        as in a quiet market. Default is 0.0.
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame in the matched schema.
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range("2025-01-01", periods=n_ticks, freq="1s")
+    timestamps = timestamps[rng.random(n_ticks) >= gap_rate]
+    n = len(timestamps)
+
+    mid = 100 + np.cumsum(rng.normal(0, 0.01, n))
+    spread = np.abs(rng.normal(0.002, 0.001, n)) + 1e-5
+    strength = np.where(rng.random(n) < signal_density, rng.choice([0.8, -0.9, 0.1], n), 0.0)
+    matched_df = pd.DataFrame({
+        "timestamp": timestamps,
+        "bid_price": np.round(mid - spread / 2, 5),
+        "bid_qty": rng.integers(1, 10, n),
+        "ask_price": np.round(mid + spread / 2, 5),
+        "ask_qty": rng.integers(1, 10, n),
+        "spread_flag": (rng.random(n) < flag_rate).astype(int),
+        "signal_strength": strength,
+        "action_int": np.select([strength > 0.5, strength < -0.5], [1, -1], 0),
+    })
+
+    if stale_rate > 0:
+        stale = rng.random(n) < stale_rate
+        stale[0] = False
+        source = np.maximum.accumulate(np.where(stale, 0, np.arange(n)))
+        for column in ("bid_price", "bid_qty", "ask_price", "ask_qty", "spread_flag"):
+            matched_df[column] = matched_df[column].to_numpy()[source]
+
+    if duplicate_rate > 0:
+        duplicates = matched_df.sample(frac=duplicate_rate, random_state=seed)
+        matched_df = pd.concat([matched_df, duplicates]).sort_values("timestamp", kind="stable").reset_index(drop=True)
+    if shuffle:
+        matched_df = matched_df.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+
+    return apply_schema(matched_df, matched_schema(precision))
+
+
+
+def bundled_matched(config, project_root=PROJECT_ROOT):
+    """
+    Validate and integrate the bundled quote and signal files in memory.
+
+    Nothing is written except the spread distribution plot, which goes to a
+    temporary directory.
+    """
+    data_config = config["data"]
+    validation_config = config["validation"]
+    precision = data_config.get("precision_mode", "float64")
+    quotes_path = os.path.join(project_root, data_config["quotes_csv_path"])
+
+    with tempfile.TemporaryDirectory() as plots_dir_path:
+        quotes_validated_df = validate_quotes(quotes_path, None, validation_config["k"], plots_dir_path, precision,
+                                              validation_config.get("spread_flag_method", "global"),
+                                              validation_config.get("spread_window"), validation_config.get("spread_halflife"))
+    signals_validated_df = validate_signals(os.path.join(project_root, data_config["signals_csv_path"]), None, None, precision,
+                                            quote_timestamps=quotes_validated_df["timestamp"])
+    return integrate_signals(quotes_validated_df, signals_validated_df, None, config["simulation"]["strength_threshold"])
+
+
+
+def default_datasets(config=None):
+    """Return {name: matched_df} with the generated datasets, plus the bundled data when a config is given."""
+    datasets = {name: generate_matched(**kwargs) for name, kwargs in GENERATED_DATASETS}
+    if config is not None:
+        datasets["bundled"] = bundled_matched(config)
+    return datasets
+
+
+
+# ---- Comparison ----
+
+def run_engine(engine, matched_df, sim_params, commision_per_trade):
+    """
+    Run one engine on a matched DataFrame.
+
+    The engine's stdout (update_pnl prints every tick) is discarded.
+
+    Returns
+    -------
+    tuple
+        (results_df, final_state) where final_state is the RealTimePnL attributes after the run.
+    """
+    pnl_obj = RealTimePnL(commision_per_trade)
+    with contextlib.redirect_stdout(io.StringIO()):
+        results_df = engine(matched_df, pnl_obj, **sim_params)
+    return results_df.reset_index(drop=True), dict(vars(pnl_obj))
+
+
+
+def _matching_values(reference, candidate, rtol, atol):
+    """Elementwise True where two result columns agree (NaN / NaT equal to each other)."""
+    if pd.api.types.is_numeric_dtype(reference) and pd.api.types.is_numeric_dtype(candidate) \
+            and not pd.api.types.is_bool_dtype(reference):
+        return np.isclose(reference.to_numpy(np.float64), candidate.to_numpy(np.float64), rtol=rtol, atol=atol, equal_nan=True)
+    both_null = reference.isna().to_numpy() & candidate.isna().to_numpy()
+    return (reference.to_numpy() == candidate.to_numpy()) | both_null
+
+
+
+def first_divergence(reference_df, candidate_df, rtol=0.0, atol=0.0):
+    """
+    Find the first result row where two engines disagree.
+
+    Parameters
+    ----------
+    reference_df, candidate_df : pandas.DataFrame
+        Results of the reference and the candidate engine.
+    rtol, atol : float, optional
+        Tolerances of numpy.isclose for numeric columns. Default is 0 (exact).
+
+    Returns
+    -------
+    dict or None
+        None when the results agree. Otherwise "row", "columns" (diverging
+        columns at that row) and the "reference" / "candidate" rows as dicts.
+        A column mismatch is reported at row -1.
+    """
+    if list(reference_df.columns) != list(candidate_df.columns):
+        return {"row": -1, "columns": sorted(set(reference_df.columns) ^ set(candidate_df.columns)),
+                "reference": list(reference_df.columns), "candidate": list(candidate_df.columns)}
+
+    num_rows = min(len(reference_df), len(candidate_df))
+    mismatches = {}
+    for column in reference_df.columns:
+        agree = _matching_values(reference_df[column].iloc[:num_rows], candidate_df[column].iloc[:num_rows], rtol, atol)
+        if not agree.all():
+            mismatches[column] = int(np.argmin(agree))
+
+    if mismatches:
+        row = min(mismatches.values())
+    elif len(reference_df) != len(candidate_df):
+        row = num_rows
+    else:
+        return None
+
+    def row_state(df):
+        return df.iloc[row].to_dict() if row < len(df) else None
+
+    return {"row": row, "columns": [column for column, first in mismatches.items() if first == row],
+            "reference": row_state(reference_df), "candidate": row_state(candidate_df)}
+
+
+
+def check_engine(engine, datasets, sim_params, commision_per_trade=0.0, rtol=0.0, atol=0.0, reference=reference_engine):
+    """
+    Run the reference and a candidate engine on every dataset with the same seed and compare them.
+
+    Every result column is compared, then the final RealTimePnL state.
+
+    Parameters
+    ----------
+    engine : callable
+        Candidate engine, called as engine(matched_df, pnl_obj, **sim_params).
+    datasets : dict
+        {name: matched_df}, e.g. from default_datasets().
+    sim_params : dict
+        Output of simulation_params(config["simulation"]).
+    commision_per_trade : float, optional
+        Commission of the RealTimePnL objects. Default is 0.0.
+    rtol, atol : float, optional
+        Comparison tolerances. Default is 0 (bit-identical).
+    reference : callable, optional
+        Reference engine. Default is reference_engine (simulation()).
+
+    Returns
+    -------
+    dict
+        {dataset name: None when equivalent, else the first_divergence() report}.
+        Diverging final states are reported at row "final_state".
+    """
+    reports = {}
+    for name, matched_df in datasets.items():
+        reference_df, reference_state = run_engine(reference, matched_df, sim_params, commision_per_trade)
+        candidate_df, candidate_state = run_engine(engine, matched_df, sim_params, commision_per_trade)
+
+        report = first_divergence(reference_df, candidate_df, rtol, atol)
+        if report is None:
+            diverging = [key for key in reference_state
+                         if not np.isclose(reference_state[key], candidate_state.get(key, np.nan), rtol=rtol, atol=atol, equal_nan=True)]
+            if diverging:
+                report = {"row": "final_state", "columns": diverging,
+                          "reference": {key: reference_state[key] for key in diverging},
+                          "candidate": {key: candidate_state.get(key) for key in diverging}}
+        reports[name] = report
+    return reports
+
+
+
+def format_report(name, report):
+    """Multi-line description of one first_divergence() report."""
+    lines = [f"Dataset '{name}' diverges at row {report['row']} in column(s) {report['columns']}."]
+    for label in ("reference", "candidate"):
+        lines.append(f"  {label}: {report[label]}")
+    return "\n".join(lines)
+
+
+
+def assert_equivalent(engine, datasets=None, sim_params=None, commision_per_trade=0.0, rtol=0.0, atol=0.0,
+                      reference=reference_engine):
+    """
+    Raise EquivalenceError unless the engine reproduces the reference on every dataset.
+
+    Defaults to the generated datasets and the simulation section of config.json.
+    """
+    if datasets is None:
+        datasets = default_datasets()
+    if sim_params is None:
+        with open(config_path, "r") as f:
+            sim_params = simulation_params(json.load(f)["simulation"])
+
+    reports = check_engine(engine, datasets, sim_params, commision_per_trade, rtol, atol, reference)
+    failures = [format_report(name, report) for name, report in reports.items() if report is not None]
+    if failures:
+        raise EquivalenceError("\n".join(failures))
+
+
+
+if pytest is not None:
+    @pytest.fixture
+    def equivalence():
+        """
+        Fixture returning assert_equivalent, e.g.
+
+            pytest_plugins = ["equivalence"]
+
+            def test_event_engine(equivalence):
+                equivalence(event_engine)
+        """
+        return assert_equivalent
+
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare a simulation engine against the reference simulation() loop.")
+    parser.add_argument("--engine", default="event_driven", choices=[name for name in ENGINES if name != "reference"],
+                        help="Engine to check.")
+    parser.add_argument("--rtol", type=float, default=0.0, help="Relative tolerance of numeric columns.")
+    parser.add_argument("--atol", type=float, default=0.0, help="Absolute tolerance of numeric columns.")
+    parser.add_argument("--no-bundled", action="store_true", help="Only use the generated datasets.")
+    return parser.parse_args()
+
+
+
+def main(args):
+    with open(config_path, "r") as f:
+        config = json.load(f)
+
+    datasets = default_datasets(None if args.no_bundled else config)
+    sim_params = simulation_params(config["simulation"])
+
+    log_blank_line()
+    logger.info("-------- Engine Equivalence Check --------")
+    logger.info("==========================================")
+
+    reports = check_engine(ENGINES[args.engine], datasets, sim_params, config["simulation"]["commision_per_trade"], args.rtol, args.atol)
+    for name, report in reports.items():
+        if report is None:
+            logger.info(f"PASS: '{args.engine}' matches the reference on '{name}' ({len(datasets[name])} ticks).")
+        else:
+            logger.info(f"FLAG: {format_report(name, report)}")
+
+    if any(report is not None for report in reports.values()):
+        raise SystemExit(1)
+
+
+
+if __name__ == "__main__":
+    main(parse_args())
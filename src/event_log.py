@@ -0,0 +1,171 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger
+
+
+# Order types in the order exchange_fill() processes them; the index is the order_type code
+ORDER_TYPES = ("close_long", "close_short", "open_short", "open_long")
+
+# +1 buy, -1 sell
+ORDER_SIDES = {"close_long": -1, "close_short": 1, "open_short": -1, "open_long": 1}
+
+ORDER_DTYPE = np.dtype([
+    ("order_id", np.int64),
+    ("order_type", np.int8),
+    ("side", np.int8),
+    ("size", np.float64),
+    ("sent_time", "datetime64[ns]"),
+    ("sent_price", np.float64),
+    ("exec_time", "datetime64[ns]"),
+])
+
+FILL_DTYPE = np.dtype([
+    ("order_id", np.int64),
+    ("fill_time", "datetime64[ns]"),
+    ("fill_price", np.float64),
+    ("size", np.float64),
+    ("slippage", np.float64),
+    ("prob_exec", np.float64),
+])
+
+EQUITY_DTYPE = np.dtype([
+    ("time", "datetime64[ns]"),
+    ("gross_pnl", np.float64),
+    ("net_pnl", np.float64),
+    ("max_drawdown", np.float64),
+    ("peak_pnl", np.float64),
+    ("realized_pnl", np.float64),
+    ("unrealized_pnl", np.float64),
+    ("long_position", np.float64),
+    ("short_position", np.float64),
+])
+
+# File of each table in an event log directory
+EVENT_LOG_FILES = {"orders": "orders.npy", "fills": "fills.npy", "equity": "equity.npy"}
+
+
+class EventLog:
+    """
+    Sparse record of a simulation run: orders, fills and an equity curve.
+
+    The wide results hold one mostly-zero row per tick. An event log instead
+    keeps one ORDER_DTYPE record per order that reached an exchange quote, one
+    FILL_DTYPE record per (partial) fill and an EQUITY_DTYPE equity curve
+    sampled at the signal ticks, the last tick and, optionally, every
+    equity_every-th exchange tick. On signal-sparse data its size is a small
+    fraction of the per-tick results.
+
+    Fill slippage follows the formula of exchange_fill() for every order:
+    (fill - sent) * size for sells and (sent - fill) * size for buys. The
+    per-tick slippage column of the wide results adds an open_long fill's
+    slippage one order late, so the totals of the two can differ.
+    """
+
+    def __init__(self, equity_every=None):
+        self.equity_every = equity_every
+        self.next_order_id = 0
+        self._orders = []
+        self._fills = []
+        self._equity = []
+
+    def record_orders(self, order_dict, fills, sent_time, exec_time):
+        """Record the orders of one tick (order_generator() output) and their fills (exchange_fill() output)."""
+        for code, order_type in enumerate(ORDER_TYPES):
+            size = order_dict[f"{order_type}_size"]
+            if size <= 0:
+                continue
+            order_id = self.next_order_id
+            self.next_order_id += 1
+            side = ORDER_SIDES[order_type]
+            self._orders.append((order_id, code, side, size, sent_time, order_dict["sent_order_price"], exec_time))
+
+            filled_size = fills[f"filled_{order_type}_size"]
+            if filled_size > 0:
+                sent_price, fill_price = fills[f"{order_type}_sent_price"], fills[f"{order_type}_fill_price"]
+                slippage = (sent_price - fill_price) * filled_size if side == 1 else (fill_price - sent_price) * filled_size
+                self._fills.append((order_id, exec_time, fill_price, filled_size, slippage,
+                                    fills["order_prob_exec"][order_type]))
+
+    def record_equity(self, times, marks, long_position, short_position):
+        """
+        Append points to the equity curve.
+
+        Parameters
+        ----------
+        times : numpy.ndarray
+            Exchange times of the points.
+        marks : dict
+            gross_pnl, net_pnl, max_drawdown, peak_pnl, realized_pnl and
+            unrealized_pnl of the points (arrays or scalars).
+        long_position, short_position : float or numpy.ndarray
+            Positions at the points.
+        """
+        points = np.zeros(len(times), dtype=EQUITY_DTYPE)
+        points["time"] = times
+        for name in EQUITY_DTYPE.names[1:7]:
+            points[name] = marks[name]
+        points["long_position"] = long_position
+        points["short_position"] = short_position
+        self._equity.append(points)
+
+    def equity_points(self, start, stop, last):
+        """Positions in [start, stop) that are sampled for the equity curve (every equity_every-th and the last)."""
+        positions = np.arange(start, stop)
+        if self.equity_every:
+            return positions[(positions % self.equity_every == 0) | (positions == last)]
+        return positions[positions == last]
+
+    # ---- Tables ----
+    @property
+    def orders(self):
+        return np.array(self._orders, dtype=ORDER_DTYPE)
+
+    @property
+    def fills(self):
+        return np.array(self._fills, dtype=FILL_DTYPE)
+
+    @property
+    def equity(self):
+        if not self._equity:
+            return np.empty(0, dtype=EQUITY_DTYPE)
+        equity = np.concatenate(self._equity)
+        return equity[np.argsort(equity["time"], kind="stable")]
+
+    def tables(self):
+        return {"orders": self.orders, "fills": self.fills, "equity": self.equity}
+
+    def save(self, directory):
+        """Write the tables as typed record arrays (.npy) to directory and return their paths."""
+        os.makedirs(directory, exist_ok=True)
+        paths = {}
+        for name, records in self.tables().items():
+            paths[name] = os.path.join(directory, EVENT_LOG_FILES[name])
+            np.save(paths[name], records)
+
+        num_bytes = sum(os.path.getsize(path) for path in paths.values())
+        logger.info(f"INFO: Wrote {len(self._orders)} order(s), {len(self._fills)} fill(s) and {sum(map(len, self._equity))} "
+                    f"equity point(s) ({num_bytes / 1024:.1f} KiB) to {directory}")
+        return paths
+
+
+
+def load_event_log(directory, as_frames=True):
+    """
+    Read an event log written by EventLog.save().
+
+    Returns
+    -------
+    dict
+        {"orders", "fills", "equity"} -> DataFrame (order_type as the type
+        name), or the raw record arrays when as_frames is False.
+    """
+    tables = {name: np.load(os.path.join(directory, file_name)) for name, file_name in EVENT_LOG_FILES.items()}
+    if not as_frames:
+        return tables
+
+    frames = {name: pd.DataFrame(records) for name, records in tables.items()}
+    frames["orders"]["order_type"] = pd.Categorical.from_codes(frames["orders"]["order_type"], ORDER_TYPES)
+    return frames
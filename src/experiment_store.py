@@ -0,0 +1,305 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+from logger_config import logger
+from partitions import resolve_data_files
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+config_path = os.path.join(PROJECT_ROOT, "config", "config.json")
+
+# Summary metrics stored as indexed columns of the runs table (see summarize_results)
+METRIC_COLUMNS = ["num_of_trades", "gross_pnl", "net_pnl", "avg_trade_pnl", "avg_slippage", "max_drawdown", "max_drawdown_pct"]
+
+# Config keys that determine the results and the analysis outputs of a run (a stored run is skipped,
+# so every key that changes what a run writes must be here); checkpoint and pipeline settings do not
+RUN_CONFIG_KEYS = {
+    "data": ["signals_csv_path", "quotes_csv_path", "precision_mode", "time_range"],
+    "validation": None,
+    "simulation": None,
+    "output": ["results_format", "results_layout", "results_per_tick", "equity_every"],
+    "bootstrap": None,
+    "latency_scan": None,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    config_hash TEXT NOT NULL,
+    data_hash TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    name TEXT,
+    config_json TEXT NOT NULL,
+    results_path TEXT,
+    num_of_trades INTEGER,
+    gross_pnl REAL,
+    net_pnl REAL,
+    avg_trade_pnl REAL,
+    avg_slippage REAL,
+    max_drawdown REAL,
+    max_drawdown_pct REAL,
+    UNIQUE (config_hash, data_hash)
+);
+CREATE TABLE IF NOT EXISTS params (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    text TEXT,
+    PRIMARY KEY (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_params_name_value ON params (name, value, run_id);
+CREATE INDEX IF NOT EXISTS idx_params_name_text ON params (name, text, run_id);
+CREATE TABLE IF NOT EXISTS timings (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    stage TEXT NOT NULL,
+    seconds REAL,
+    PRIMARY KEY (run_id, stage)
+);
+""" + "".join(f"CREATE INDEX IF NOT EXISTS idx_runs_{col} ON runs ({col});\n" for col in METRIC_COLUMNS)
+
+# "name<op>value" filters accepted by the query CLI
+FILTER_PATTERN = re.compile(r"^\s*([\w.]+)\s*(<=|>=|!=|<|>|=)\s*(.+?)\s*$")
+
+
+def run_config(config):
+    """Return the part of the config that determines the results of a run."""
+    selected = {}
+    for section, keys in RUN_CONFIG_KEYS.items():
+        values = config.get(section, {})
+        selected[section] = dict(values) if keys is None else {key: values.get(key) for key in keys}
+    return selected
+
+
+
+def config_hash(config):
+    """SHA-256 of the canonical JSON of run_config(config)."""
+    canonical = json.dumps(run_config(config), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+
+def data_hash(paths, chunk_size=1 << 20):
+    """SHA-256 of the contents of the input files, in the given order (patterns and directories by their sorted files)."""
+    digest = hashlib.sha256()
+    files = []
+    for path in (file for pattern in paths for file in resolve_data_files(pattern)):
+        files.extend(sorted(str(file) for file in Path(path).rglob("*") if file.is_file()) if os.path.isdir(path) else [path])
+    for path in files:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+
+def flatten_params(config):
+    """Flatten run_config(config) into {"section.key": value}."""
+    return {f"{section}.{key}": value for section, values in run_config(config).items() for key, value in values.items()}
+
+
+
+def _sql_value(value):
+    """Python / NumPy scalar to an SQLite value, with NaN stored as NULL."""
+    if value is None:
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+
+class ExperimentStore:
+    """
+    Embedded SQLite store of simulation runs.
+
+    One row per run holds the config and data hashes, the full run config and
+    the summary metrics (each metric indexed). Parameters are kept in a
+    name / value table indexed on (name, value), and stage timings in their own
+    table. A (config_hash, data_hash) pair is stored only once, so repeated
+    runs of the same config on the same data can be skipped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def find_run(self, config_hash, data_hash):
+        """Return the run_id stored for this config and data, or None."""
+        row = self.conn.execute("SELECT run_id FROM runs WHERE config_hash = ? AND data_hash = ?",
+                                (config_hash, data_hash)).fetchone()
+        return None if row is None else row[0]
+
+    def record_run(self, config, data_hash, metrics, timings=None, results_path=None, name=None):
+        """
+        Store one run and return its run_id.
+
+        Parameters
+        ----------
+        config : dict
+            Full config of the run; run_config(config) is stored and hashed.
+        data_hash : str
+            Fingerprint of the input data (see data_hash()).
+        metrics : dict
+            Output of summarize_results().
+        timings : dict, optional
+            Seconds per pipeline stage.
+        results_path : str, optional
+            Location of the full per-tick results of the run.
+        name : str, optional
+            Label of the run, e.g. a multi-strategy strategy name.
+
+        Returns
+        -------
+        int
+            run_id of the stored run.
+        """
+        with self.conn:
+            cursor = self.conn.execute(
+                f"INSERT INTO runs (config_hash, data_hash, created_at, name, config_json, results_path, {', '.join(METRIC_COLUMNS)}) "
+                f"VALUES (?, ?, ?, ?, ?, ?, {', '.join('?' * len(METRIC_COLUMNS))})",
+                (config_hash(config), data_hash, datetime.now(timezone.utc).isoformat(), name,
+                 json.dumps(run_config(config), sort_keys=True, default=str), results_path,
+                 *(_sql_value(metrics.get(col)) for col in METRIC_COLUMNS)))
+            run_id = cursor.lastrowid
+
+            params = []
+            for param, value in flatten_params(config).items():
+                value = _sql_value(value)
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    params.append((run_id, param, None, None if value is None else json.dumps(value, default=str)))
+                else:
+                    params.append((run_id, param, value, None))
+            self.conn.executemany("INSERT INTO params (run_id, name, value, text) VALUES (?, ?, ?, ?)", params)
+            self.conn.executemany("INSERT INTO timings (run_id, stage, seconds) VALUES (?, ?, ?)",
+                                  [(run_id, stage, seconds) for stage, seconds in (timings or {}).items()])
+        return run_id
+
+    def query(self, order_by="net_pnl", descending=True, limit=10, filters=()):
+        """
+        Return the best runs by a metric, restricted by metric / parameter filters.
+
+        Parameters
+        ----------
+        order_by : str, optional
+            Metric column to sort by. Default is "net_pnl".
+        descending : bool, optional
+            Sort from the highest value. Default is True.
+        limit : int, optional
+            Number of runs to return. Default is 10.
+        filters : iterable of tuple, optional
+            (name, op, value) conditions, where name is a metric column or a
+            parameter such as "simulation.seed", and op one of <, <=, >, >=, =, !=.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Matching runs with their metrics and results path.
+        """
+        if order_by not in METRIC_COLUMNS:
+            raise ValueError(f"Unknown metric '{order_by}'. Expected one of {METRIC_COLUMNS}.")
+
+        clauses, args = [], []
+        for name, op, value in filters:
+            if op not in ("<", "<=", ">", ">=", "=", "!="):
+                raise ValueError(f"Unknown filter operator '{op}'.")
+            if name in METRIC_COLUMNS:
+                clauses.append(f"{name} {op} ?")
+                args.append(value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                clauses.append(f"run_id IN (SELECT run_id FROM params WHERE name = ? AND value {op} ?)")
+                args.extend([name, value])
+            else:
+                clauses.append(f"run_id IN (SELECT run_id FROM params WHERE name = ? AND text {op} ?)")
+                args.extend([name, json.dumps(value)])
+
+        sql = (f"SELECT run_id, name, created_at, config_hash, data_hash, results_path, {', '.join(METRIC_COLUMNS)} FROM runs"
+               + (f" WHERE {' AND '.join(clauses)}" if clauses else "")
+               + f" ORDER BY {order_by} IS NULL, {order_by} {'DESC' if descending else 'ASC'} LIMIT ?")
+        return pd.read_sql_query(sql, self.conn, params=[*args, int(limit)])
+
+    def params(self, run_id):
+        """Return the parameters of a run as {name: value}."""
+        rows = self.conn.execute("SELECT name, value, text FROM params WHERE run_id = ?", (run_id,)).fetchall()
+        return {name: value if text is None else json.loads(text) for name, value, text in rows}
+
+    def timings(self, run_id):
+        """Return the stage timings of a run as {stage: seconds}."""
+        return dict(self.conn.execute("SELECT stage, seconds FROM timings WHERE run_id = ?", (run_id,)).fetchall())
+
+
+
+def keep_results(results_sink_path, store_path, config_hash, data_hash):
+    """Copy the results of a run next to the store and return the copy's path."""
+    target_dir = os.path.join(os.path.dirname(store_path) or ".", "results", f"{config_hash[:12]}-{data_hash[:12]}")
+    os.makedirs(target_dir, exist_ok=True)
+    target = os.path.join(target_dir, os.path.basename(results_sink_path))
+    if os.path.isdir(results_sink_path):
+        shutil.copytree(results_sink_path, target, dirs_exist_ok=True)
+    else:
+        shutil.copyfile(results_sink_path, target)
+    return target
+
+
+
+def parse_filter(text):
+    """Parse a "name<op>value" filter, e.g. "max_drawdown<0.5" or "simulation.event_driven=false"."""
+    match = FILTER_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"Cannot parse filter '{text}'. Expected name<op>value.")
+    name, op, value = match.groups()
+    try:
+        value = json.loads(value)  # numbers, true / false, null, "quoted strings"
+    except ValueError:
+        pass
+    return name, op, value
+
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Query the experiment store of past runs.")
+    parser.add_argument("--store", help="Path of the SQLite store (default: experiments.path in config.json).")
+    parser.add_argument("--metric", default="net_pnl", help="Metric to rank by.")
+    parser.add_argument("--ascending", action="store_true", help="Rank from the lowest value.")
+    parser.add_argument("-n", "--limit", type=int, default=10, help="Number of runs to show.")
+    parser.add_argument("--where", nargs="*", default=[],
+                        help='Filters such as "max_drawdown<0.5" or "simulation.strength_threshold>=0.6".')
+    return parser.parse_args()
+
+
+
+def main(args):
+    store_path = args.store
+    if store_path is None:
+        with open(config_path, "r") as f:
+            config = json.load(f)
+        store_path = os.path.join(PROJECT_ROOT, config.get("experiments", {}).get("path", "output/experiments/experiments.sqlite"))
+
+    store = ExperimentStore(store_path)
+    runs_df = store.query(args.metric, not args.ascending, args.limit, [parse_filter(text) for text in args.where])
+    store.close()
+    logger.info(f"INFO: {len(runs_df)} run(s) from {store_path}")
+    print(runs_df.to_string(index=False))
+
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,242 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger
+from partitions import parse_timestamps, resolve_data_files
+from schema import RAW_QUOTES_DTYPES
+
+
+# Layout of the spilled runs; row_id is the position in the input, so "keep first" survives the sort
+RUN_DTYPE = np.dtype([
+    ("timestamp", np.int64),
+    ("row_id", np.int64),
+    ("bid_price", RAW_QUOTES_DTYPES["bid_price"]),
+    ("bid_qty", RAW_QUOTES_DTYPES["bid_qty"]),
+    ("ask_price", RAW_QUOTES_DTYPES["ask_price"]),
+    ("ask_qty", RAW_QUOTES_DTYPES["ask_qty"]),
+])
+
+QUOTE_COLUMNS = ["timestamp", "bid_price", "bid_qty", "ask_price", "ask_qty"]
+
+# Sort key of NaT timestamps, so they end up last as with sort_values
+NAT_KEY = np.iinfo(np.int64).max
+
+DEFAULT_RUN_ROWS = 1_000_000
+DEFAULT_BLOCK_ROWS = 100_000
+
+
+def _to_records(chunk, first_row_id):
+    """Quote chunk with parsed timestamps -> RUN_DTYPE records."""
+    records = np.empty(len(chunk), dtype=RUN_DTYPE)
+    timestamps = chunk["timestamp"].to_numpy("datetime64[ns]")
+    records["timestamp"] = np.where(np.isnat(timestamps), NAT_KEY, timestamps.view(np.int64))
+    records["row_id"] = np.arange(first_row_id, first_row_id + len(chunk))
+    for column in QUOTE_COLUMNS[1:]:
+        records[column] = chunk[column].to_numpy(RUN_DTYPE[column])
+    return records
+
+
+
+def _sort_records(records, drop_duplicates=True):
+    """Sort records by (timestamp, row_id) and drop full-row duplicates, keeping the first input row."""
+    records = records[np.lexsort((records["row_id"], records["timestamp"]))]
+    if not drop_duplicates:
+        return records
+    values = pd.DataFrame({column: records[column] for column in QUOTE_COLUMNS})
+    return records[~values.duplicated(keep="first").to_numpy()]
+
+
+
+def _to_frame(records):
+    """RUN_DTYPE records -> raw quote DataFrame with datetime64 timestamps."""
+    timestamps = records["timestamp"]
+    df = pd.DataFrame({column: records[column] for column in QUOTE_COLUMNS[1:]})
+    df.insert(0, "timestamp", np.where(timestamps == NAT_KEY, np.datetime64("NaT", "ns"), timestamps.view("datetime64[ns]")))
+    return df
+
+
+
+def read_quote_chunks(quotes_path, chunksize, time_range=None):
+    """Yield raw quote chunks with parsed timestamps from a CSV or partitioned CSVs, restricted to [start, end)."""
+    start, end = time_range if time_range is not None else (None, None)
+    for path in resolve_data_files(quotes_path):
+        for chunk in pd.read_csv(path, dtype=RAW_QUOTES_DTYPES, chunksize=chunksize):
+            chunk["timestamp"] = parse_timestamps(chunk["timestamp"])
+            if start is not None:
+                chunk = chunk[chunk["timestamp"] >= pd.Timestamp(start)]
+            if end is not None:
+                chunk = chunk[chunk["timestamp"] < pd.Timestamp(end)]
+            yield chunk
+
+
+
+def spill_sorted_runs(chunks, tmp_dir, drop_duplicates=True):
+    """
+    Sort (and dedupe) each chunk in memory and spill it to tmp_dir as one run.
+
+    Returns
+    -------
+    tuple
+        (run_paths, rows_read)
+    """
+    run_paths = []
+    rows_read = 0
+
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        records = _to_records(chunk, rows_read)
+        rows_read += len(records)
+
+        run_path = os.path.join(tmp_dir, f"run_{len(run_paths):05d}.npy")
+        np.save(run_path, _sort_records(records, drop_duplicates))
+        run_paths.append(run_path)
+
+    return run_paths, rows_read
+
+
+
+def merge_runs(run_paths, block_rows=DEFAULT_BLOCK_ROWS, drop_duplicates=True):
+    """
+    K-way merge of sorted runs into sorted, deduplicated batches (drop_duplicates=False keeps duplicates).
+
+    Each run is read through a memmap, one block at a time. A batch holds all
+    buffered rows earlier than the smallest "last buffered timestamp" of the
+    runs that still have unread rows, so every row of a given timestamp lands
+    in the same batch and duplicates across run boundaries are dropped there.
+
+    Yields
+    ------
+    numpy.ndarray
+        RUN_DTYPE records, sorted by (timestamp, row_id) and unique.
+    """
+    runs = [np.load(path, mmap_mode="r") for path in run_paths]
+    positions = [0] * len(runs)
+    buffers = [np.empty(0, dtype=RUN_DTYPE) for _ in runs]
+
+    while True:
+        # Top up short buffers, and buffers holding a single timestamp so the merge can move past it
+        for i, run in enumerate(runs):
+            buffer = buffers[i]
+            if positions[i] < len(run) and (len(buffer) < block_rows or buffer["timestamp"][0] == buffer["timestamp"][-1]):
+                block = np.asarray(run[positions[i]:positions[i] + block_rows])
+                positions[i] += len(block)
+                buffers[i] = np.concatenate([buffer, block])
+
+        if not any(len(buffer) for buffer in buffers):
+            return
+
+        limits = [buffers[i]["timestamp"][-1] for i in range(len(runs)) if positions[i] < len(runs[i])]
+        if limits:
+            cutoff = min(limits)
+            counts = [int(np.searchsorted(buffer["timestamp"], cutoff, side="left")) for buffer in buffers]
+        else:
+            counts = [len(buffer) for buffer in buffers]
+
+        batch = np.concatenate([buffer[:count] for buffer, count in zip(buffers, counts)])
+        buffers = [buffer[count:] for buffer, count in zip(buffers, counts)]
+        if len(batch):
+            yield _sort_records(batch, drop_duplicates)
+
+
+
+class ExternalQuoteSort:
+    """
+    A quote feed sorted out of core, iterated as sorted blocks.
+
+    Iterating reads the input (a CSV or partitioned CSVs) in runs of run_rows
+    rows, sorts and deduplicates each run in memory and spills it to a
+    temporary file, then k-way merges the runs with deduplication across run
+    boundaries and yields the merged blocks as raw quote DataFrames. Peak
+    memory is about one run while spilling and one block per run while
+    merging, so a consumer that handles one block at a time (e.g. the tick
+    store importer) never holds the whole feed. Duplicates are full-row
+    duplicates and the first input row is kept, as with
+    drop_duplicates(keep="first"); rows with the same timestamp stay in input
+    order and NaT timestamps sort last.
+
+    rows_read is set once the runs are spilled, before the first block. After
+    a complete iteration, stats holds the "rows" read, "duplicates" dropped,
+    "out_of_order" (places where the deduplicated input goes back in time),
+    "sorted" (the deduplicated input was already in order, as checked by
+    is_monotonic_increasing) and "runs".
+    """
+
+    def __init__(self, quotes_path, run_rows=DEFAULT_RUN_ROWS, block_rows=DEFAULT_BLOCK_ROWS, tmp_dir=None, time_range=None,
+                 drop_duplicates=True):
+        self.quotes_path = quotes_path
+        self.run_rows = run_rows
+        self.block_rows = block_rows
+        self.tmp_dir = tmp_dir
+        self.time_range = time_range
+        self.drop_duplicates = drop_duplicates
+        self.rows_read = None
+        self.stats = None
+
+    def __iter__(self):
+        if self.tmp_dir is not None:
+            os.makedirs(self.tmp_dir, exist_ok=True)
+
+        with tempfile.TemporaryDirectory(dir=self.tmp_dir, prefix="quotes_sort_") as run_dir:
+            run_paths, self.rows_read = spill_sorted_runs(read_quote_chunks(self.quotes_path, self.run_rows, self.time_range), run_dir,
+                                                          self.drop_duplicates)
+            logger.info(f"INFO: External sort of {self.rows_read} quote row(s) in {len(run_paths)} run(s).")
+
+            rows_out, out_of_order, last_row_id, has_nat = 0, 0, -1, False
+            for records in merge_runs(run_paths, self.block_rows, self.drop_duplicates):
+                # The deduplicated input was already in order iff the sorted rows keep their input order (NaT never counts as ordered)
+                row_ids = records["row_id"]
+                out_of_order += int((np.diff(row_ids) < 0).sum()) + int(row_ids[0] < last_row_id)
+                last_row_id = int(row_ids[-1])
+                has_nat = has_nat or bool((records["timestamp"] == NAT_KEY).any())
+                rows_out += len(records)
+                yield _to_frame(records)
+
+        self.stats = {"rows": self.rows_read, "duplicates": self.rows_read - rows_out, "out_of_order": out_of_order,
+                      "sorted": out_of_order == 0 and not has_nat, "runs": len(run_paths)}
+
+
+
+def external_sort_quotes(quotes_path, run_rows=DEFAULT_RUN_ROWS, block_rows=DEFAULT_BLOCK_ROWS, tmp_dir=None, time_range=None):
+    """
+    Sort and deduplicate a quote feed out of core into one DataFrame (see ExternalQuoteSort).
+
+    validate_quotes() needs the whole sorted feed for its spread statistics.
+    The merged blocks are copied straight into columns preallocated for the
+    rows read, so the sorted feed is held once, plus one block.
+
+    Parameters
+    ----------
+    quotes_path : str
+        Quote CSV, glob pattern or directory of CSVs.
+    run_rows : int, optional
+        Rows per sorted run. Default is DEFAULT_RUN_ROWS.
+    block_rows : int, optional
+        Rows read from each run at a time during the merge. Default is DEFAULT_BLOCK_ROWS.
+    tmp_dir : str, optional
+        Directory for the spilled runs. Default is the system temporary directory.
+    time_range : tuple, optional
+        (start, end) restriction applied while reading.
+
+    Returns
+    -------
+    tuple
+        (quotes_df, stats) with the sorted, unique raw quotes and the
+        ExternalQuoteSort stats.
+    """
+    sorter = ExternalQuoteSort(quotes_path, run_rows, block_rows, tmp_dir, time_range)
+    columns = None
+    filled = 0
+    for block in sorter:
+        if columns is None:
+            columns = {column: np.empty(sorter.rows_read, dtype=block[column].dtype) for column in QUOTE_COLUMNS}
+        for column in QUOTE_COLUMNS:
+            columns[column][filled:filled + len(block)] = block[column].to_numpy()
+        filled += len(block)
+
+    if columns is None:
+        return _to_frame(np.empty(0, dtype=RUN_DTYPE)), sorter.stats
+    return pd.DataFrame({column: values[:filled] for column, values in columns.items()}, copy=False), sorter.stats
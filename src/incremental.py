@@ -0,0 +1,370 @@
+import hashlib
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger, log_blank_line
+from checkpoint import SimulationCheckpointer
+from experiment_store import config_hash
+from metrics import RealTimePnL
+from partitions import is_partitioned, parse_timestamps
+from results_writer import make_results_sink
+from schema import RAW_QUOTES_DTYPES, RAW_SIGNALS_DTYPES, apply_schema, validated_quotes_schema, validated_signals_schema
+from signal_integration import integrate_signals
+from simulator import event_simulation, latency_offset, simulation_params
+from spread_flags import OnlineSpreadFlagger
+from tick_store import is_tick_store
+
+
+# Bytes hashed at the start of an input and just before its offset, to recognise a rewritten file
+SIGNATURE_BYTES = 4096
+
+INPUTS = ("quotes", "signals")
+
+# Seconds a signal may arrive after the quotes of its time; validated quotes this recent are held back for it
+DEFAULT_SIGNAL_LAG_SECS = 60
+
+
+class IncrementalStateError(RuntimeError):
+    """Raised when the appended data cannot continue the saved state; the inputs are then processed from the start."""
+
+
+
+# ---- Appended input rows ----
+
+def file_signature(path, offset):
+    """Offset plus BLAKE2 digests of the first and the last SIGNATURE_BYTES bytes before it."""
+    with open(path, "rb") as f:
+        head = f.read(min(offset, SIGNATURE_BYTES))
+        f.seek(max(offset - SIGNATURE_BYTES, 0))
+        tail = f.read(offset - max(offset - SIGNATURE_BYTES, 0))
+    return {"offset": offset, "head": hashlib.blake2b(head, digest_size=16).hexdigest(),
+            "tail": hashlib.blake2b(tail, digest_size=16).hexdigest()}
+
+
+
+def is_appended(path, signature):
+    """True when the file still starts with the bytes read up to signature["offset"], i.e. it was only appended to."""
+    return os.path.getsize(path) >= signature["offset"] and file_signature(path, signature["offset"]) == signature
+
+
+
+def read_appended_rows(csv_path, offset, dtype):
+    """
+    Read the complete CSV lines after a byte offset.
+
+    A last line without its newline is still being written and is left for the
+    next read.
+
+    Parameters
+    ----------
+    csv_path : str
+        CSV file with a header line.
+    offset : int
+        Byte offset of the first unread line; 0 reads the file from the start.
+    dtype : dict
+        Column dtypes, as for pandas.read_csv.
+
+    Returns
+    -------
+    tuple
+        (DataFrame of the new rows, byte offset after the last complete line).
+    """
+    with open(csv_path, "rb") as f:
+        header = f.readline()
+        if offset > len(header):
+            f.seek(offset)
+        data = f.read()
+        start = max(offset, len(header))
+
+    data = data[:data.rfind(b"\n") + 1]
+    return pd.read_csv(io.BytesIO(header + data), dtype=dtype), start + len(data)
+
+
+
+# ---- Validation of appended rows ----
+
+def validate_appended_quotes(quotes_raw_df, flagger, precision):
+    """
+    validate_quotes() on newly arrived rows, continuing the streaming spread statistics.
+
+    Runs the same checks in the same order (duplicates, sort, nulls, bid <= ask,
+    spread flags, positive volume), with the spread flags of the rolling /
+    EWMA OnlineSpreadFlagger carried over from the earlier rows.
+    """
+    initial_row_count = len(quotes_raw_df)
+    if quotes_raw_df.duplicated().any():
+        quotes_raw_df = quotes_raw_df.drop_duplicates(subset=quotes_raw_df.columns, keep="first")
+    if not quotes_raw_df["timestamp"].is_monotonic_increasing:
+        quotes_raw_df = quotes_raw_df.sort_values("timestamp").reset_index(drop=True)
+    quotes_raw_df = quotes_raw_df.dropna().reset_index(drop=True)
+    quotes_raw_df = quotes_raw_df[quotes_raw_df["bid_price"] <= quotes_raw_df["ask_price"]].copy()
+
+    quotes_raw_df["spread_flag"] = flagger.update_many(quotes_raw_df["bid_price"].to_numpy(), quotes_raw_df["ask_price"].to_numpy())
+    flagged = int(quotes_raw_df["spread_flag"].sum())
+    quotes_raw_df = quotes_raw_df[(quotes_raw_df["bid_qty"] > 0) & (quotes_raw_df["ask_qty"] > 0)]
+
+    logger.info(f"INFO: Appended quotes: {initial_row_count} read, {initial_row_count - len(quotes_raw_df)} dropped, "
+                f"{flagged} spread flag(s).")
+    return apply_schema(quotes_raw_df, validated_quotes_schema(precision))
+
+
+
+def latest(*times):
+    """Latest of the given times, ignoring None (None when all are)."""
+    return max((time for time in times if time is not None), default=None)
+
+
+
+def integration_horizon(integrated_until, last_quote_time, last_signal_time, signal_lag):
+    """
+    Latest quote time whose signals have all arrived: the last signal read, or
+    the last quote time minus the allowed signal lag, whichever is later.
+
+    Signals arrive in time order, so no signal at or before the last one read
+    can still come; signal_lag bounds how long a quiet signal file holds back
+    the quotes. The horizon never moves back and never passes the last quote.
+    """
+    if last_quote_time is None:
+        return integrated_until
+    return min(latest(integrated_until, last_signal_time, last_quote_time - signal_lag), last_quote_time)
+
+
+
+def split_signals(signals_df, integrated_until, horizon, quote_timestamps):
+    """
+    Split null-free signals into those ready to match and those waiting for their quote.
+
+    Signals up to the integration horizon are kept when a quote has their
+    timestamp (the alignment check of validate_signals()); later signals wait
+    for the next update. A signal at or before the quotes already integrated
+    comes too late for them and raises IncrementalStateError.
+    """
+    timestamps = signals_df["timestamp"]
+    if integrated_until is not None and bool((timestamps <= integrated_until).any()):
+        raise IncrementalStateError(f"{int((timestamps <= integrated_until).sum())} appended signal(s) at or before "
+                                    f"the quotes already simulated up to {integrated_until}.")
+
+    ready = timestamps <= horizon if horizon is not None else pd.Series(False, index=signals_df.index)
+    aligned = signals_df[ready & timestamps.isin(quote_timestamps)]
+    if int(ready.sum()) > len(aligned):
+        logger.info(f"FLAG: Removed {int(ready.sum()) - len(aligned)} misaligned signal row(s).")
+    return aligned, signals_df[~ready]
+
+
+
+# ---- State ----
+
+def initial_state(config, results_path):
+    """State of a run that has not read any input yet."""
+    validation_config, sim_config = config["validation"], config["simulation"]
+    return {
+        "config_hash": config_hash(config),
+        "inputs": {name: {"offset": 0, "head": None, "tail": None} for name in INPUTS},
+        "last_quote_time": None,
+        "last_signal_time": None,
+        "integrated_until": None,
+        "flagger": OnlineSpreadFlagger(validation_config["k"], validation_config["spread_flag_method"],
+                                       validation_config.get("spread_window"), validation_config.get("spread_halflife")),
+        "pnl": RealTimePnL(sim_config["commision_per_trade"]),
+        "rng": np.random.RandomState(sim_config["seed"]),
+        "mid_price": np.nan,
+        "pending_signals": None,
+        "held_quotes": None,
+        "pending_ticks": None,
+        "results_path": results_path,
+        "sink": None,
+        "next_row": 0,
+    }
+
+
+
+def stale_reason(state, config, input_paths, results_path):
+    """Why a saved state cannot be continued (changed config, rewritten input, missing results), or None."""
+    if state["config_hash"] != config_hash(config):
+        return "The config changed since the saved state."
+    if state["results_path"] != results_path or not os.path.exists(results_path):
+        return f"The results of the saved state are not at {results_path}."
+    for name, path in input_paths.items():
+        signature = state["inputs"][name]
+        if signature["offset"] and not is_appended(path, signature):
+            return f"{path} was rewritten or truncated since the saved state."
+    return None
+
+
+
+def check_incremental_config(config):
+    """Raise ValueError for settings whose full-rerun results cannot be reproduced by appending."""
+    validation_config, data_config = config["validation"], config["data"]
+    if validation_config.get("spread_flag_method", "global") not in ("rolling", "ewma"):
+        raise ValueError("Incremental mode needs validation.spread_flag_method 'rolling' or 'ewma': global spread flags "
+                         "change with every appended quote.")
+    if data_config.get("precision_mode", "float64") != "float64":
+        raise ValueError("Incremental mode needs data.precision_mode 'float64'.")
+    time_range = data_config.get("time_range") or {}
+    if time_range.get("start") is not None or time_range.get("end") is not None:
+        raise ValueError("Incremental mode reads whole files; data.time_range must be unset.")
+    if not config["output"].get("results_per_tick", True) or config["output"].get("results_layout", "wide") != "wide":
+        raise ValueError("Incremental mode appends per-tick results: set output.results_per_tick to true and "
+                         "output.results_layout to 'wide'.")
+    if config["simulation"].get("tick_runs", False):
+        raise ValueError("Incremental mode runs the event-driven engine on the appended rows only; set simulation.tick_runs to false.")
+    for name in ("quotes_csv_path", "signals_csv_path"):
+        if is_partitioned(data_config[name]) or is_tick_store(data_config[name]):
+            raise ValueError(f"Incremental mode reads a single CSV per input; data.{name} is '{data_config[name]}'.")
+
+
+
+# ---- Update ----
+
+def process_update(state, input_paths, config, results_sink):
+    """
+    Validate, integrate and simulate the rows appended since the state, and advance the state.
+
+    The signal file may lag the quote file, so quotes after the integration
+    horizon (see integration_horizon()) are held in the state and only
+    validated and integrated once their signals can no longer arrive; held
+    quotes may also arrive out of time order. Ticks whose
+    exchange time (sent time + latency) is after the horizon wait in the
+    state, since the quote they execute against is not integrated yet; they
+    are simulated by the update that integrates it.
+
+    Returns
+    -------
+    dict
+        Counts of the update: quotes, signals, results, pending_ticks, pending_signals and held_quotes.
+    """
+    sim_params = simulation_params(config["simulation"])
+    quotes_raw_df, quotes_offset = read_appended_rows(input_paths["quotes"], state["inputs"]["quotes"]["offset"], RAW_QUOTES_DTYPES)
+    signals_raw_df, signals_offset = read_appended_rows(input_paths["signals"], state["inputs"]["signals"]["offset"], RAW_SIGNALS_DTYPES)
+    quotes_raw_df["timestamp"] = parse_timestamps(quotes_raw_df["timestamp"])
+    signals_raw_df["timestamp"] = parse_timestamps(signals_raw_df["timestamp"])
+
+    # --- Appended quotes must follow the quotes already simulated ---
+    integrated_until = state["integrated_until"]
+    raw_times = quotes_raw_df["timestamp"].dropna()
+    if integrated_until is not None and bool((raw_times <= integrated_until).any()):
+        raise IncrementalStateError(f"{int((raw_times <= integrated_until).sum())} appended quote(s) at or before "
+                                    f"the quotes already simulated up to {integrated_until}.")
+    last_quote_time = latest(state["last_quote_time"], raw_times.max() if len(raw_times) else None)
+
+    # --- Quotes up to the horizon are validated and integrated; later ones are held back for signals still to come ---
+    signals_df = signals_raw_df.dropna()
+    if state["pending_signals"] is not None:
+        signals_df = pd.concat([state["pending_signals"], signals_df], ignore_index=True)
+    last_signal_time = latest(state["last_signal_time"], signals_df["timestamp"].max() if len(signals_df) else None)
+    signal_lag = pd.Timedelta(seconds=config.get("incremental", {}).get("signal_lag_secs", DEFAULT_SIGNAL_LAG_SECS))
+    horizon = integration_horizon(integrated_until, last_quote_time, last_signal_time, signal_lag)
+
+    window_df = quotes_raw_df if state["held_quotes"] is None else pd.concat([state["held_quotes"], quotes_raw_df], ignore_index=True)
+    # Rows without a timestamp are dropped by validation, so they need not wait
+    ready_quotes = window_df["timestamp"].isna()
+    if horizon is not None:
+        ready_quotes |= window_df["timestamp"] <= horizon
+    held_quotes_df = window_df[~ready_quotes].reset_index(drop=True)
+    ready_raw_df = window_df[ready_quotes].reset_index(drop=True)
+    quotes_validated_df = validate_appended_quotes(ready_raw_df, state["flagger"], "float64")
+
+    signals_ready_df, pending_signals_df = split_signals(signals_df, integrated_until, horizon, ready_raw_df["timestamp"])
+    signals_validated_df = apply_schema(signals_ready_df.reset_index(drop=True), validated_signals_schema("float64"))
+
+    matched_df = integrate_signals(quotes_validated_df, signals_validated_df, None, config["simulation"]["strength_threshold"])
+    if state["pending_ticks"] is not None:
+        matched_df = pd.concat([state["pending_ticks"], matched_df], ignore_index=True)
+
+    # --- Simulate; ticks whose exchange quote is not integrated yet produce no row and wait ---
+    num_results = 0
+    if len(matched_df):
+        results_df, _ = event_simulation(matched_df, pnl_obj=state["pnl"], per_tick=True, rng=state["rng"],
+                                         mid_price=state["mid_price"], **sim_params)
+        results_sink.write(results_df)
+        num_results = len(results_df)
+        if num_results:
+            state["mid_price"] = float(results_df["mid_price"].iloc[-1])
+
+    exec_times = matched_df["timestamp"].to_numpy() + latency_offset(sim_params["latency"])
+    waiting = exec_times > np.datetime64(horizon) if horizon is not None else np.ones(len(matched_df), dtype=bool)
+    pending_ticks_df = matched_df[waiting].reset_index(drop=True)
+
+    state.update({
+        "inputs": {"quotes": file_signature(input_paths["quotes"], quotes_offset),
+                   "signals": file_signature(input_paths["signals"], signals_offset)},
+        "last_quote_time": last_quote_time,
+        "last_signal_time": last_signal_time,
+        "integrated_until": horizon,
+        "pending_signals": pending_signals_df.reset_index(drop=True),
+        "held_quotes": held_quotes_df,
+        "pending_ticks": pending_ticks_df,
+        "sink": results_sink.state(),
+        "next_row": state["next_row"] + len(quotes_raw_df),
+    })
+    return {"quotes": len(quotes_raw_df), "signals": len(signals_raw_df), "results": num_results,
+            "pending_ticks": len(pending_ticks_df), "pending_signals": len(pending_signals_df), "held_quotes": len(held_quotes_df)}
+
+
+
+def run_incremental(config, project_root, full_rerun=False):
+    """
+    Process only the quotes and signals appended since the last invocation.
+
+    The state saved after each update (see initial_state()) holds the byte
+    offset read in each input, the last quote time, the streaming spread
+    statistics, the PnL object, the RNG, the carried-over mid price, the
+    signals and ticks still waiting for quotes, the recent quotes held back
+    for late signals (at most incremental.signal_lag_secs of them) and the
+    position of the results file. An update reads from the offsets, appends
+    its result rows and saves the new state atomically, so its cost depends
+    only on the new rows and the held-back window.
+
+    The results equal a run from the start over all rows up to the
+    integration horizon. When that cannot hold (config changed, an input
+    rewritten, quotes appended out of time order, a signal arriving after
+    the quotes of its time were simulated) or full_rerun is set, the inputs
+    are processed from the start and the results file is replaced.
+
+    Parameters
+    ----------
+    config : dict
+        The loaded config.json.
+    project_root : str
+        Directory the config paths are relative to.
+    full_rerun : bool, optional
+        Discard the saved state. Default is False.
+    """
+    check_incremental_config(config)
+    incremental_config = config.get("incremental", {})
+    input_paths = {"quotes": os.path.join(project_root, config["data"]["quotes_csv_path"]),
+                   "signals": os.path.join(project_root, config["data"]["signals_csv_path"])}
+    results_path = os.path.join(project_root, config["output"]["results_csv"])
+    results_sink = make_results_sink(config["output"].get("results_format", "csv"), results_path)
+    checkpointer = SimulationCheckpointer(os.path.join(project_root, incremental_config.get("state_path", "output/checkpoints/incremental.pkl")))
+
+    log_blank_line()
+    logger.info("-------- Incremental Update --------")
+    logger.info("====================================")
+
+    state = None if full_rerun else checkpointer.load()
+    reason = None if state is None else stale_reason(state, config, input_paths, results_sink.path)
+    if state is not None and reason is None:
+        results_sink.restore(state["sink"])
+        try:
+            counts = process_update(state, input_paths, config, results_sink)
+        except IncrementalStateError as e:
+            reason = str(e)
+    if state is None or reason is not None:
+        logger.info(f"FLAG: {reason} Processing the inputs from the start." if reason else "INFO: Processing the inputs from the start.")
+        state = initial_state(config, results_sink.path)
+        results_sink.start()
+        counts = process_update(state, input_paths, config, results_sink)
+
+    checkpointer.save(state)
+    logger.info(f"INFO: {counts['quotes']} new quote(s) and {counts['signals']} new signal(s): appended {counts['results']} "
+                f"result row(s) to {results_sink.path}.")
+    logger.info(f"INFO: {counts['pending_ticks']} tick(s) and {counts['pending_signals']} signal(s) wait for later quotes; "
+                f"{counts['held_quotes']} quote(s) after {state['integrated_until']} wait for late signals.")
+    pnl = state["pnl"]
+    logger.info(f"INFO: Net PnL {pnl.net_pnl:.6f}, max drawdown {pnl.max_drawdown:.6f}, "
+                f"long {pnl.total_long_position_size}, short {pnl.total_short_position_size}.")
+    return state
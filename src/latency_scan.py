@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger, log_blank_line
+from metrics import RealTimePnL, summarize_results
+from market_features import MarketFeatures
+from simulator import event_simulation, readonly_column, simulation_params
+
+
+def run_latency_scan(matched_df, latencies, sim_config, features=None):
+    """
+    Summary metrics of one strategy under several order latencies.
+
+    The matched data is loaded and indexed once (MarketFeatures). Each latency
+    then resolves the exchange quote of every tick with a single vectorized
+    lookup into the shared index, and runs the event-driven engine from its own fresh PnL,
+    positions and RNG stream (seeded as a standalone run), so each row equals
+    a separate run with simulation.latency_in_secs set to that latency. The
+    cost grows linearly with the number of latencies.
+
+    Orders are only filled against a quote at exactly sent time + latency, as
+    in simulation(), so latencies that fall between quote times cancel more
+    orders; num_of_cancelled counts them.
+
+    Parameters
+    ----------
+    matched_df : pandas.DataFrame
+        Matched quotes and signals.
+    latencies : list of float
+        Latencies in seconds.
+    sim_config : dict
+        The "simulation" section of the config; latency_in_secs is replaced by each latency.
+    features : MarketFeatures, optional
+        Features of matched_df. Default is None (computed here).
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per latency, sorted by latency: latency_secs, num_of_signals,
+        num_of_cancelled and the summarize_results() metrics.
+    """
+    if features is None:
+        features = MarketFeatures.from_quotes(matched_df)
+    is_signal = readonly_column(matched_df, "action_int") != 0
+    num_of_signals = int(is_signal.sum())
+
+    rows = []
+    for latency in sorted(latencies):
+        params = simulation_params({**sim_config, "latency_in_secs": latency})
+        pnl_obj = RealTimePnL(sim_config["commision_per_trade"])
+        # A private RNG seeded like a standalone run; the scan may run next to the simulate stage
+        rng = np.random.RandomState(params["seed"])
+        results_df, _ = event_simulation(matched_df, pnl_obj=pnl_obj, per_tick=False, features=features, rng=rng, **params)
+
+        cancelled = features.exec_rows(latency)[is_signal] < 0
+        rows.append({"latency_secs": latency, "num_of_signals": num_of_signals, "num_of_cancelled": int(cancelled.sum()),
+                     **summarize_results(results_df)})
+
+    return pd.DataFrame(rows)
+
+
+
+def report_latency_scan(matched_df, config, features=None):
+    """Run the latency scan of config["latency_scan"] and log the metrics-vs-latency table."""
+    latencies = config["latency_scan"]["latencies_secs"]
+
+    log_blank_line()
+    logger.info("-------- Latency Sensitivity --------")
+    logger.info("=====================================")
+    logger.info(f"INFO: {len(latencies)} latency(ies) over {len(matched_df)} matched row(s).")
+
+    metrics_df = run_latency_scan(matched_df, latencies, config["simulation"], features)
+    for row in metrics_df.itertuples(index=False):
+        logger.info(f"INFO: latency {row.latency_secs:g}s: net PnL {row.net_pnl:.6f}, {row.num_of_trades} trade(s), "
+                    f"{row.num_of_cancelled} cancelled order tick(s), max drawdown {row.max_drawdown:.6f}.")
+    return metrics_df
+
+
+
+def save_latency_metrics(metrics_df, results_path):
+    """Write the metrics-vs-latency table next to results.csv."""
+    metrics_df.to_csv(os.path.join(results_path, "latency_metrics.csv"), index=False)
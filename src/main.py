@@ -2,14 +2,34 @@ import pandas as pd
 import numpy as np 
 import json
 import os
+import argparse
 from pathlib import Path
 
 from validation import validate_signals, validate_quotes 
 from signal_integration import integrate_signals
-from simulator import simulation
+from simulator import simulation, event_simulation
+from event_log import EventLog
+from tick_runs import TickRuns, run_length_simulation
+from incremental import run_incremental
+from market_features import MarketFeatures, features_path
+from walk_forward import run_walk_forward, save_walk_forward
+from multi_strategy import run_multi_strategy, save_strategy_metrics, strategy_run_config
+from bootstrap import report_confidence_intervals
+from latency_scan import report_latency_scan, save_latency_metrics
+from experiment_store import ExperimentStore, config_hash, data_hash, keep_results
+from checkpoint import SimulationCheckpointer
+from calibration import apply_overlay
+from results_writer import make_results_sink
+from results_digest import ResultsDigest, digest_results
 from metrics import RealTimePnL
 from plotting import *
 from metrics import *
+from schema import (memory_per_row, apply_schema, resolve_precision, validated_quotes_schema,
+                    validated_signals_schema, matched_schema)
+from pipeline import Pipeline
+from artifact_writer import ArtifactWriter
+from profiler import SamplingProfiler, DEFAULT_INTERVAL
+from logger_config import logger
 
 # --- Path Setup ---
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -19,26 +39,71 @@ config_path = os.path.join(PROJECT_ROOT,"config","config.json")
 
 
 
-def main():
+def parse_args():
+    parser = argparse.ArgumentParser(description="SignalSim - Lightweight Signal Simulation Framework")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the simulation from the last checkpoint (see 'checkpoint' in config.json).")
+    parser.add_argument("--overlay", action="append", default=[],
+                        help="Config overlay JSON merged over config.json, e.g. the output of calibration.py. Can be repeated.")
+    parser.add_argument("--stages", nargs="+",
+                        help="Run only these pipeline stages, loading their other inputs from the processed CSVs of an "
+                             "earlier run (e.g. --stages simulate report plot).")
+    parser.add_argument("--profile", nargs="*", metavar="STAGE",
+                        help="Sample the Python stacks of the given pipeline stages (all stages when none are given, e.g. "
+                             "--profile simulate) and write a flamegraph / speedscope profile and a hot-function table "
+                             "to the 'profile' folder next to the results.")
+    parser.add_argument("--profile-interval", type=float, default=DEFAULT_INTERVAL,
+                        help="Seconds between two profiler samples.")
+    parser.add_argument("--start", help="Only simulate quotes and signals at or after this time (overrides data.time_range).")
+    parser.add_argument("--end", help="Only simulate quotes and signals before this time (overrides data.time_range).")
+    parser.add_argument("--full-rerun", action="store_true",
+                        help="In incremental mode, discard the saved state and process the inputs from the start.")
+    return parser.parse_args()
+
+
+
+def main(args):
     
     # Load config.json
     with open(config_path, "r") as f:
         config = json.load(f)
+    for overlay_path in args.overlay:
+        with open(overlay_path, "r") as f:
+            config = apply_overlay(config, json.load(f))
+    if args.start is not None or args.end is not None:
+        time_range = config["data"].get("time_range") or {}
+        config = apply_overlay(config, {"data": {"time_range": {"start": args.start if args.start is not None else time_range.get("start"),
+                                                                "end": args.end if args.end is not None else time_range.get("end")}}})
 
     SEED = config["simulation"]["seed"]  
     STRENGTH_THRESHOLD = config["simulation"]["strength_threshold"]  
     LATENCY = config["simulation"]["latency_in_secs"] 
     OPEN_ORDER_SIZE = config["simulation"]["open_order_size"] 
     K = config["validation"]["k"] 
+    SPREAD_FLAG_METHOD = config["validation"].get("spread_flag_method", "global")
+    SPREAD_WINDOW = config["validation"].get("spread_window")
+    SPREAD_HALFLIFE = config["validation"].get("spread_halflife")
+    EXTERNAL_SORT_ROWS = config["validation"].get("external_sort_rows")
+    EXTERNAL_SORT_DIR = config["validation"].get("external_sort_dir")
     SPREAD_PENALTY_FACTOR = config["simulation"]["spread_penalty_factor"]
     C_a = config["simulation"]["ca"]
     C_b = config["simulation"]["cb"]
     MIN_EXEC_PROB_THRESHOLD = config["simulation"]["min_exec_prob_threshold"]
     MIN_PRICE_AGGRESSIVENESS = config["simulation"]["min_price_aggressiveness"]
     COMMISION_PER_TRADE = config["simulation"]["commision_per_trade"]
+    PRECISION_MODE = config["data"].get("precision_mode", "float64")
+    RESULTS_FORMAT = config["output"].get("results_format", "csv")
+    RESULTS_FLUSH_ROWS = config["output"].get("results_flush_rows", 100000)
+    RESULTS_PER_TICK = config["output"].get("results_per_tick", True)
+    RESULTS_LAYOUT = config["output"].get("results_layout", "wide")
+    EQUITY_EVERY = config["output"].get("equity_every")
+    EVENT_DRIVEN = config["simulation"].get("event_driven", False)
+    TICK_RUNS = config["simulation"].get("tick_runs", False)
+    TIME_RANGE = config["data"].get("time_range") or {}
+    TIME_RANGE = (TIME_RANGE.get("start"), TIME_RANGE.get("end"))
 
     signals_csv_path = os.path.join(PROJECT_ROOT,config["data"]["signals_csv_path"])
-    quotes_csv_path = os.path.join(PROJECT_ROOT,config["data"]["quotes_csv_path"])
+    quotes_csv_path = os.path.join(PROJECT_ROOT,config["data"]["quotes_csv_path"])  # a CSV, a glob pattern / directory of CSVs or a tick store
 
     signals_validated_csv_path = os.path.join(PROJECT_ROOT,config["data"]["signals_validated_csv_path"])
     quotes_validated_csv_path = os.path.join(PROJECT_ROOT,config["data"]["quotes_validated_csv_path"])
@@ -47,43 +112,216 @@ def main():
     os.makedirs(plots_dir_path, exist_ok=True)
 
     matched_csv_path = os.path.join(PROJECT_ROOT,config["data"]["matched_csv_path"])
+    matched_features_path = features_path(matched_csv_path)
 
     results_path = os.path.join(PROJECT_ROOT, config["output"]["results_csv"])
     os.makedirs(results_path, exist_ok=True)
-    results_csv = os.path.join(results_path, "results.csv")
-
-
-    # --- Call Validation Functions ---
-    signals_validated_df = validate_signals(signals_csv_path, quotes_csv_path, signals_validated_csv_path)
-    quotes_validated_df = validate_quotes(quotes_csv_path, quotes_validated_csv_path, K, plots_dir_path)
-    matched_df = integrate_signals(quotes_validated_df,signals_validated_df,matched_csv_path,STRENGTH_THRESHOLD)
-                                                
-    pnl_obj = RealTimePnL(COMMISION_PER_TRADE)
-    results_df, total_received_signal_count = simulation(matched_df, OPEN_ORDER_SIZE, pnl_obj, SPREAD_PENALTY_FACTOR, C_a, C_b, MIN_PRICE_AGGRESSIVENESS, SEED, MIN_EXEC_PROB_THRESHOLD)
-    results_df.to_csv(results_csv, index=False)
-
-    # --- Call Metrics ---
-    # num_of_trades = get_total_num_of_trades(results_df)
-    # max_drawdown = get_max_drawdown(results_df)
-    # gross_pnl, net_pnl = get_gross_and_net_pnl(results_df)
-    # avg_trade_pnl = calculate_average_trade_pnl(results_df)
-    # avg_slippage, total_trade_count = calculate_average_slippage(results_df)
-    
+    results_sink = make_results_sink(RESULTS_FORMAT, results_path)
 
-    plot_pnl_and_slippage_summary(results_df, plots_dir_path)
-    
+    # --- Incremental mode: only validate, integrate and simulate the rows appended since the last run ---
+    if config.get("incremental", {}).get("enabled", False):
+        run_incremental(config, PROJECT_ROOT, args.full_rerun)
+        return
 
+    if RESULTS_LAYOUT not in ("wide", "events"):
+        raise ValueError(f"Unknown output.results_layout '{RESULTS_LAYOUT}'. Expected 'wide' or 'events'.")
+    if TICK_RUNS and (not EVENT_DRIVEN or RESULTS_LAYOUT != "wide"):
+        raise ValueError("simulation.tick_runs runs the event-driven engine: set simulation.event_driven to true and "
+                         "output.results_layout to 'wide'.")
 
+    checkpoint_config = config.get("checkpoint", {})
+    checkpointer = None
+    if checkpoint_config.get("enabled", False) or args.resume:
+        checkpointer = SimulationCheckpointer(os.path.join(PROJECT_ROOT, checkpoint_config.get("path", "output/checkpoints/simulation.pkl")),
+                                              checkpoint_config.get("every_n_ticks"), checkpoint_config.get("every_secs"))
 
 
+    # --- Experiment store: skip configs already run on the same data, record new runs ---
+    experiments_config = config.get("experiments", {})
+    store = None
+    if experiments_config.get("enabled", False):
+        store = ExperimentStore(os.path.join(PROJECT_ROOT, experiments_config.get("path", "output/experiments/experiments.sqlite")))
+    skip_existing = store is not None and experiments_config.get("skip_existing", True) and not args.stages
+    record_runs = store is not None and (not args.stages or "simulate" in args.stages or "multi_strategy" in args.stages)
 
 
+    # ====================== PIPELINE ======================================================
+    # Each stage declares the artifacts it reads and produces; independent stages run concurrently
+    # and the CSV / plot side effects are separate stages that nothing downstream waits on.
+    profiler = None
+    if args.profile is not None:
+        profiler = SamplingProfiler(args.profile, args.profile_interval, os.path.join(results_path, "profile"))
+    pipeline_config = config.get("pipeline", {})
+    # Intermediate CSVs / features are written by a bounded background writer, or not at all
+    persist_artifacts = pipeline_config.get("persist_artifacts", True)
+    writer = ArtifactWriter(max_pending=pipeline_config.get("writer_max_pending", 4)) if persist_artifacts else None
+    pipeline = Pipeline(max_workers=pipeline_config.get("max_workers"), profiler=profiler, writer=writer)
 
+    pipeline.cache("quotes_validated", lambda: read_processed_csv(quotes_validated_csv_path, validated_quotes_schema, PRECISION_MODE))
+    pipeline.cache("signals_validated", lambda: read_processed_csv(signals_validated_csv_path, validated_signals_schema, PRECISION_MODE,
+                                                                  resolve=False))
+    pipeline.cache("matched", lambda: read_processed_csv(matched_csv_path, matched_schema, PRECISION_MODE))
+    pipeline.cache("features", lambda: MarketFeatures.load(matched_features_path))
+    # The results are read back in chunks into a digest: summary metrics, downsampled plot series and bootstrap samples
+    bootstrap_config = config.get("bootstrap", {})
+    bootstrap_interval = bootstrap_config.get("interval", "1s")
+    if RESULTS_LAYOUT == "wide":
+        pipeline.cache("results", lambda: digest_results(results_sink, bootstrap_interval, chunksize=RESULTS_FLUSH_ROWS))
 
+    # --- Validation ---
+    pipeline.add("validate_quotes", lambda: validate_quotes(quotes_csv_path, None, K, plots_dir_path, PRECISION_MODE,
+                                                            SPREAD_FLAG_METHOD, SPREAD_WINDOW, SPREAD_HALFLIFE, TIME_RANGE,
+                                                            EXTERNAL_SORT_ROWS, EXTERNAL_SORT_DIR),
+                 output="quotes_validated")
+    if persist_artifacts:
+        pipeline.persist("write_quotes", "quotes_validated", lambda df: df.to_csv(quotes_validated_csv_path, index=False))
 
-    
+    # --- Multi-strategy mode: validate the quotes once and evaluate every signal set in one pass ---
+    if config.get("multi_strategy", {}).get("enabled", False):
+        strategies = config["multi_strategy"]["strategies"]
+        run_keys = {}
+        for i, strategy in enumerate(strategies):
+            strategy_config = strategy_run_config(config, strategy)
+            run_keys[strategy.get("name", f"strategy_{i}")] = (strategy_config, config_hash(strategy_config),
+                                                              data_hash([os.path.join(PROJECT_ROOT, strategy["signals_csv_path"]), quotes_csv_path]))
+        if skip_existing:
+            stored = [name for name, (_, run_hash, input_hash) in run_keys.items() if store.find_run(run_hash, input_hash) is not None]
+            if stored:
+                logger.info(f"SKIP: {len(stored)} strategy(ies) already in the experiment store: {stored}")
+            strategies = [strategy for i, strategy in enumerate(strategies) if strategy.get("name", f"strategy_{i}") not in stored]
+            if not strategies:
+                return
+        multi_config = {**config, "multi_strategy": {**config["multi_strategy"], "strategies": strategies}}
+
+        pipeline.add("multi_strategy", lambda quotes_validated_df: run_multi_strategy(quotes_validated_df, multi_config, PROJECT_ROOT, PRECISION_MODE),
+                     inputs=["quotes_validated"], output="strategy_metrics")
+        pipeline.add("write_strategy_metrics", lambda metrics_df: save_strategy_metrics(metrics_df, results_path), inputs=["strategy_metrics"])
+        artifacts = pipeline.run(args.stages)
+
+        if record_runs and "strategy_metrics" in artifacts:
+            for summary in artifacts["strategy_metrics"].to_dict("records"):
+                strategy_config, run_hash, input_hash = run_keys[summary["strategy"]]
+                if store.find_run(run_hash, input_hash) is None:
+                    store.record_run(strategy_config, input_hash, summary, pipeline.timings, name=summary["strategy"])
+        return
+
+    pipeline.add("validate_signals", lambda: validate_signals(signals_csv_path, quotes_csv_path, None, PRECISION_MODE,
+                                                              time_range=TIME_RANGE),
+                 output="signals_validated")
+    if persist_artifacts:
+        pipeline.persist("write_signals", "signals_validated", lambda df: df.to_csv(signals_validated_csv_path, index=False))
+
+    # --- Signal integration ---
+    pipeline.add("integrate", lambda quotes_validated_df, signals_validated_df: integrate_signals(quotes_validated_df, signals_validated_df, None, STRENGTH_THRESHOLD),
+                 inputs=["quotes_validated", "signals_validated"], output="matched")
+    if persist_artifacts:
+        pipeline.persist("write_matched", "matched", lambda df: df.to_csv(matched_csv_path, index=False))
+
+    # --- Walk-forward mode: simulate time windows in parallel instead of one full run ---
+    if config.get("walk_forward", {}).get("enabled", False):
+        pipeline.add("walk_forward", lambda matched_df: run_walk_forward(matched_df, config), inputs=["matched"], output="walk_forward")
+        pipeline.add("write_walk_forward", lambda outputs: save_walk_forward(outputs[0], outputs[1], results_path), inputs=["walk_forward"])
+        pipeline.add("plot", lambda outputs: None if outputs[1].empty else plot_pnl_and_slippage_summary(outputs[1], plots_dir_path),
+                     inputs=["walk_forward"])
+        pipeline.run(args.stages)
+        return
+
+    # --- Market features: mids, spreads, exchange rows and fill terms, computed once and shared read-only ---
+    pipeline.add("features", lambda matched_df: MarketFeatures.from_quotes(matched_df, LATENCY, (C_a, C_b, MIN_PRICE_AGGRESSIVENESS)),
+                 inputs=["matched"], output="features")
+    if persist_artifacts:
+        pipeline.persist("write_features", "features", lambda features: features.save(matched_features_path))
+
+    def simulate(matched_df, features):
+        if not features.matches(matched_df):
+            logger.info(f"FLAG: {matched_features_path} does not match the matched data. Recomputing the market features.")
+            features = MarketFeatures.from_quotes(matched_df)
+        pnl_obj = RealTimePnL(COMMISION_PER_TRADE)
+        if RESULTS_LAYOUT == "events":
+            # Orders, fills and the equity curve replace the per-tick results file; the signal-tick
+            # results are kept in memory for the report and plots
+            event_log = EventLog(EQUITY_EVERY)
+            event_results_df, _ = event_simulation(matched_df, OPEN_ORDER_SIZE, pnl_obj, SPREAD_PENALTY_FACTOR, C_a, C_b, MIN_PRICE_AGGRESSIVENESS, SEED, MIN_EXEC_PROB_THRESHOLD,
+                                                   latency=LATENCY, per_tick=False, event_log=event_log, features=features)
+            event_log.save(os.path.join(results_path, "events"))
+            return ResultsDigest.from_frame(event_results_df, interval=bootstrap_interval)
+        if EVENT_DRIVEN:
+            # Only signal ticks run through the loop; checkpoints apply to the per-tick loop only
+            if TICK_RUNS:
+                # Unchanged quotes without a signal are simulated as runs (start, count) instead of row by row
+                runs = TickRuns.from_frame(matched_df)
+                runs.log_compression()
+                event_results_df, _ = run_length_simulation(runs, OPEN_ORDER_SIZE, pnl_obj, SPREAD_PENALTY_FACTOR, C_a, C_b, MIN_PRICE_AGGRESSIVENESS, SEED, MIN_EXEC_PROB_THRESHOLD,
+                                                            latency=LATENCY, per_tick=RESULTS_PER_TICK)
+            else:
+                event_results_df, _ = event_simulation(matched_df, OPEN_ORDER_SIZE, pnl_obj, SPREAD_PENALTY_FACTOR, C_a, C_b, MIN_PRICE_AGGRESSIVENESS, SEED, MIN_EXEC_PROB_THRESHOLD,
+                                                       latency=LATENCY, per_tick=RESULTS_PER_TICK, features=features)
+            results_sink.start()
+            results_sink.write(event_results_df)
+            results_sink.close()
+            del event_results_df
+        else:
+            simulation(matched_df, OPEN_ORDER_SIZE, pnl_obj, SPREAD_PENALTY_FACTOR, C_a, C_b, MIN_PRICE_AGGRESSIVENESS, SEED, MIN_EXEC_PROB_THRESHOLD,
+                       latency=LATENCY, checkpointer=checkpointer, resume=args.resume,
+                       results_sink=results_sink, flush_every=RESULTS_FLUSH_ROWS, features=features)
+            if checkpointer is not None:
+                checkpointer.remove()
+
+        # Results were streamed to disk during the run; read them back chunk by chunk for the report and plots
+        return digest_results(results_sink, bootstrap_interval, chunksize=RESULTS_FLUSH_ROWS)
+
+    def precision_report(matched_df, results):
+        price_precision = str(matched_df["bid_price"].dtype)
+        max_abs_price = float(matched_df[["bid_price", "ask_price"]].abs().max().max())
+        logger.info(f"MEMORY: matched {memory_per_row(matched_df):.1f} bytes/row, results {results.bytes_per_row:.1f} bytes/row ({price_precision} prices).")
+        logger.info(f"PRECISION: PnL error bound from {price_precision} prices: {results.pnl_error_bound(max_abs_price, price_precision):.3e}")
+
+    # --- Simulation, report and plots ---
+    if store is not None:
+        run_hash, input_hash = config_hash(config), data_hash([signals_csv_path, quotes_csv_path])
+    pipeline.add("simulate", simulate, inputs=["matched", "features"], output="results")
+    pipeline.add("report", precision_report, inputs=["matched", "results"])
+    pipeline.add("plot", lambda results: plot_pnl_and_slippage_summary(results.frame(), plots_dir_path, results.summary()), inputs=["results"])
+    if bootstrap_config.get("enabled", False):
+        pipeline.add("bootstrap", lambda results: report_confidence_intervals(results, bootstrap_config, results_path), inputs=["results"])
+    if config.get("latency_scan", {}).get("enabled", False):
+        # One pass per latency over the matched data already in memory
+        pipeline.add("latency_scan", lambda matched_df, features: report_latency_scan(matched_df, config, features),
+                     inputs=["matched", "features"], output="latency_metrics")
+        pipeline.add("write_latency_metrics", lambda metrics_df: save_latency_metrics(metrics_df, results_path), inputs=["latency_metrics"])
+        pipeline.add("plot_latency", lambda metrics_df: plot_latency_curve(metrics_df, plots_dir_path), inputs=["latency_metrics"])
+
+    if skip_existing:
+        run_id = store.find_run(run_hash, input_hash)
+        if run_id is not None:
+            logger.info(f"SKIP: This config and data were already run (experiment store run_id {run_id}).")
+            return
+
+    artifacts = pipeline.run(args.stages)
+
+    if record_runs and "results" in artifacts and store.find_run(run_hash, input_hash) is None:
+        results_pointer = None
+        if experiments_config.get("keep_results", False):
+            results_pointer = keep_results(results_sink.path, store.path, run_hash, input_hash)
+        run_id = store.record_run(config, input_hash, artifacts["results"].summary(), pipeline.timings, results_pointer)
+        logger.info(f"INFO: Recorded run {run_id} in the experiment store {store.path}")
+
+
+
+def read_processed_csv(csv_path, schema_for_precision, precision, resolve=True):
+    """
+    Load a processed CSV written by an earlier run, with the dtypes of its stage schema.
+
+    The precision is checked against the bid / ask prices (resolve_precision())
+    for the quote and matched frames; signals have no prices and take the
+    requested precision, as in validate_signals().
+    """
+    df = pd.read_csv(csv_path, parse_dates=["timestamp"])
+    if resolve:
+        precision = resolve_precision(df, precision)
+    return apply_schema(df, schema_for_precision(precision))
 
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(parse_args())
\ No newline at end of file
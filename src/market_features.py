@@ -0,0 +1,161 @@
+import copy
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from logger_config import logger
+from spread_flags import relative_spread
+from simulator import build_exchange_index, find_exchange_rows, latency_offset, aggressiveness_terms
+
+
+# Latency / aggressiveness arrays kept per MarketFeatures; the least recently used beyond this are dropped
+DEFAULT_MAX_CACHED = 8
+
+
+def _readonly(values):
+    values = np.ascontiguousarray(values)
+    values.flags.writeable = False
+    return values
+
+
+
+def quotes_fingerprint(timestamps, bid_prices, ask_prices):
+    """BLAKE2 digest of the timestamps and prices, identifying the quote set the features belong to."""
+    digest = hashlib.blake2b(digest_size=16)
+    for values in (np.asarray(timestamps, dtype="datetime64[ns]").view(np.int64), np.asarray(bid_prices, dtype=np.float64),
+                   np.asarray(ask_prices, dtype=np.float64)):
+        digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+
+
+class MarketFeatures:
+    """
+    Per-quote market features, computed once per validated quote set and shared read-only.
+
+    Holds contiguous float64 arrays of bid, ask, mid, absolute and relative
+    spread, the exchange row every tick's order executes against under a
+    given latency (exec_rows()), and the execution-probability terms of
+    exchange_fill() for given (cb, ca, min_price_aggressiveness)
+    (aggressiveness()). The arrays are write-protected; latency and
+    aggressiveness arrays are computed on first use and the max_cached most
+    recently used of each are kept, so a resident service or a wide latency
+    scan does not keep one n-length array per parameter ever asked for. The service
+    workers, the latency scan and the background writer share one instance
+    across threads, so the caches are only changed and copied under a lock.
+
+    The simulators take a MarketFeatures through their `features` argument
+    and then index these arrays instead of recomputing mids, denominators
+    and exchange lookups tick by tick; the values are bit-identical.
+    """
+
+    def __init__(self, timestamps, bid_prices, ask_prices, fingerprint=None, max_cached=DEFAULT_MAX_CACHED):
+        self.timestamps = _readonly(np.asarray(timestamps, dtype="datetime64[ns]"))
+        self.bid = _readonly(np.asarray(bid_prices, dtype=np.float64))
+        self.ask = _readonly(np.asarray(ask_prices, dtype=np.float64))
+        self.mid = _readonly((self.bid + self.ask) / 2)
+        self.spread = _readonly(self.ask - self.bid)
+        self.relative_spread = _readonly(relative_spread(self.bid, self.ask))
+        self.fingerprint = fingerprint or quotes_fingerprint(self.timestamps, self.bid, self.ask)
+        self.exchange_index = build_exchange_index(self.timestamps)
+        self.max_cached = max_cached
+        self._exec_rows = OrderedDict()
+        self._aggressiveness = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_quotes(cls, quotes_df, latency=None, aggressiveness_params=None, max_cached=DEFAULT_MAX_CACHED):
+        """
+        Features of a validated quote or matched DataFrame.
+
+        latency (seconds) and aggressiveness_params ((cb, ca, min_price_aggressiveness),
+        as passed to simulation()) are computed up front when given.
+        """
+        features = cls(quotes_df["timestamp"].to_numpy(), quotes_df["bid_price"].to_numpy(), quotes_df["ask_price"].to_numpy(),
+                       max_cached=max_cached)
+        if latency is not None:
+            features.exec_rows(latency)
+        if aggressiveness_params is not None:
+            features.aggressiveness(*aggressiveness_params)
+        return features
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def matches(self, quotes_df):
+        """True when the features were computed from the quotes of quotes_df."""
+        return len(quotes_df) == len(self) and self.fingerprint == quotes_fingerprint(
+            quotes_df["timestamp"].to_numpy(), quotes_df["bid_price"].to_numpy(), quotes_df["ask_price"].to_numpy())
+
+    def copy(self):
+        """Copy sharing the read-only arrays with its own latency / aggressiveness caches, e.g. to save() while this one is in use."""
+        features = copy.copy(self)
+        with self._lock:
+            features._exec_rows = OrderedDict(self._exec_rows)
+            features._aggressiveness = OrderedDict(self._aggressiveness)
+        features._lock = threading.Lock()
+        return features
+
+    # ---- Derived arrays ----
+    def _cached(self, cache, key, compute):
+        """Cached value of key, computed on a miss and evicting the least recently used values beyond max_cached."""
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        # Computed outside the lock; a thread that lost the race uses the first stored array
+        value = compute()
+        with self._lock:
+            value = cache.setdefault(key, value)
+            cache.move_to_end(key)
+            while len(cache) > self.max_cached:
+                cache.popitem(last=False)
+        return value
+
+    def exec_rows(self, latency):
+        """Row of the quote at exactly timestamp + latency for every tick (-1 = none, the order is cancelled)."""
+        return self._cached(self._exec_rows, float(latency), lambda: _readonly(
+            find_exchange_rows(*self.exchange_index, self.timestamps + latency_offset(latency))))
+
+    def aggressiveness(self, cb, ca, min_price_aggressiveness):
+        """(n, 5) array of aggressiveness_terms() per quote row: mid, bid offset / denominator, ask offset / denominator."""
+        key = (float(cb), float(ca), float(min_price_aggressiveness))
+        return self._cached(self._aggressiveness, key, lambda: _readonly(
+            np.column_stack(aggressiveness_terms(self.bid, self.ask, cb, ca, min_price_aggressiveness))))
+
+    # ---- Persistence ----
+    def save(self, path):
+        """Write the features, including the cached latency / aggressiveness arrays, to a .npz file."""
+        arrays = {"timestamps": self.timestamps, "bid": self.bid, "ask": self.ask, "fingerprint": np.array(self.fingerprint)}
+        for i, (latency, rows) in enumerate(self._exec_rows.items()):
+            arrays[f"exec_rows_{i}"] = rows
+            arrays[f"exec_rows_{i}_latency"] = np.array(latency)
+        for i, (params, terms) in enumerate(self._aggressiveness.items()):
+            arrays[f"aggressiveness_{i}"] = terms
+            arrays[f"aggressiveness_{i}_params"] = np.array(params)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+        logger.info(f"INFO: Wrote market features of {len(self)} quote(s) to {path}")
+
+    @classmethod
+    def load(cls, path, max_cached=DEFAULT_MAX_CACHED):
+        """Read features written by save()."""
+        with np.load(path) as data:
+            features = cls(data["timestamps"], data["bid"], data["ask"], str(data["fingerprint"]), max_cached)
+            for name in data.files:
+                if name.startswith("exec_rows_") and not name.endswith("_latency"):
+                    features._exec_rows[float(data[f"{name}_latency"])] = _readonly(data[name])
+                elif name.startswith("aggressiveness_") and not name.endswith("_params"):
+                    features._aggressiveness[tuple(data[f"{name}_params"].tolist())] = _readonly(data[name])
+        return features
+
+
+
+def features_path(matched_csv_path):
+    """Features file stored next to the matched CSV (matched.csv -> matched.features.npz)."""
+    return os.path.splitext(matched_csv_path)[0] + ".features.npz"
@@ -152,7 +152,59 @@ class RealTimePnL:
             'total_short_pos':self.total_short_position_size,
             'net_position': self.total_long_position_size - self.total_short_position_size
         }
-    
+
+    def mark_to_market(self, best_bid_prices, best_ask_prices):
+        """
+        Vectorized update_pnl() for a run of ticks without trades.
+
+        Positions, realized PnL and commission are constant between trades, so
+        each tick only re-marks the open positions. Uses the same operation order
+        as update_pnl(), giving bit-identical values, and leaves the state as
+        update_pnl() would after the last tick.
+
+        Parameters
+        ----------
+        best_bid_prices : numpy.ndarray
+            Bid price of each tick (float64).
+        best_ask_prices : numpy.ndarray
+            Ask price of each tick (float64).
+
+        Returns
+        -------
+        dict
+            Per-tick arrays of gross_pnl, net_pnl, max_drawdown, peak_pnl,
+            realized_pnl and unrealized_pnl.
+        """
+        unrealized_long_pnl = (self.total_long_position_size * best_bid_prices) - self.total_long_spent_value
+        total_long_pnl = self.realized_long_pnl + unrealized_long_pnl
+        unrealized_short_pnl = self.total_short_spent_value - (self.total_short_position_size * best_ask_prices)
+        total_short_pnl = self.realized_short_pnl + unrealized_short_pnl
+        gross_pnl = total_long_pnl + total_short_pnl
+
+        # No trades, so no new commission (the addition keeps update_pnl's float type)
+        self.total_running_commision = self.total_running_commision + 0.0
+        net_pnl = gross_pnl - self.total_running_commision
+        peak_pnl, max_drawdown = running_drawdown(net_pnl, self.current_peak_pnl, self.max_drawdown)
+
+        if len(net_pnl) > 0:
+            self.unrealized_long_pnl = float(unrealized_long_pnl[-1])
+            self.total_long_pnl = float(total_long_pnl[-1])
+            self.unrealized_short_pnl = float(unrealized_short_pnl[-1])
+            self.total_short_pnl = float(total_short_pnl[-1])
+            self.gross_pnl = float(gross_pnl[-1])
+            self.net_pnl = float(net_pnl[-1])
+            self.current_peak_pnl = float(peak_pnl[-1])
+            self.max_drawdown = float(max_drawdown[-1])
+
+        return {
+            'gross_pnl': gross_pnl,
+            'net_pnl': net_pnl,
+            'max_drawdown': max_drawdown,
+            'peak_pnl': peak_pnl,
+            'realized_pnl': np.full(len(net_pnl), self.realized_long_pnl + self.realized_short_pnl),
+            'unrealized_pnl': unrealized_long_pnl + unrealized_short_pnl,
+        }
+
 
 
 
@@ -274,4 +326,69 @@ def calculate_average_slippage(df, slippage_col="slippage", traded_count_col="nu
 
     avg_slippage = executed[slippage_col].sum()/ total_trade_count
 
-    return float(avg_slippage), total_trade_count
\ No newline at end of file
+    return float(avg_slippage), total_trade_count
+
+
+def running_drawdown(net_pnl, peak_pnl=0.0, max_drawdown=0.0):
+    """
+    Vectorized peak and max drawdown series, following the RealTimePnL update rule.
+
+    The drawdown at a step is measured against the peak reached before that step,
+    and only once a non-zero peak exists.
+
+    Parameters
+    ----------
+    net_pnl : numpy.ndarray
+        Net PnL at each step.
+    peak_pnl : float, optional
+        Peak PnL before the first step. Default is 0.0.
+    max_drawdown : float, optional
+        Max drawdown before the first step. Default is 0.0.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        (peak_pnl, max_drawdown) after each step.
+    """
+    net_pnl = np.asarray(net_pnl, dtype=np.float64)
+    peak = np.maximum.accumulate(np.concatenate(([peak_pnl], net_pnl)))
+    previous_peak, peak = peak[:-1], peak[1:]
+    drawdown = np.where(previous_peak != 0, previous_peak - net_pnl, max_drawdown)
+    return peak, np.maximum.accumulate(np.maximum(drawdown, max_drawdown))
+
+
+
+def summarize_results(df):
+    """
+    Collect the summary metrics of a simulation run into one dictionary.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Simulation results as returned by simulation().
+
+    Returns
+    -------
+    dict
+        num_of_trades, gross_pnl, net_pnl, avg_trade_pnl, avg_slippage,
+        max_drawdown and max_drawdown_pct (NaN where undefined).
+    """
+    if df.empty:
+        return {"num_of_trades": 0, "gross_pnl": 0.0, "net_pnl": 0.0, "avg_trade_pnl": np.nan,
+                "avg_slippage": 0.0, "max_drawdown": 0.0, "max_drawdown_pct": np.nan}
+
+    gross_pnl, net_pnl = get_gross_and_net_pnl(df)
+    max_drawdown, max_drawdown_percentage = get_max_drawdown(df)
+    closed_count = df["num_of_closed_trades"].sum()
+    executed = df[df["num_of_trades"] > 0]
+    total_trade_count = int(df["num_of_trades"].sum())
+
+    return {
+        "num_of_trades": total_trade_count,
+        "gross_pnl": gross_pnl,
+        "net_pnl": net_pnl,
+        "avg_trade_pnl": calculate_average_trade_pnl(df) if closed_count > 0 else np.nan,
+        "avg_slippage": float(executed["slippage"].sum() / total_trade_count) if total_trade_count > 0 else 0.0,
+        "max_drawdown": float(max_drawdown),
+        "max_drawdown_pct": float(max_drawdown_percentage) if df["peak_pnl"].iloc[-1] != 0 else np.nan,
+    }
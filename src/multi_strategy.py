@@ -0,0 +1,260 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger, log_blank_line
+from validation import validate_signals
+from metrics import RealTimePnL
+from simulator import (order_generator, exchange_fill, readonly_column, build_exchange_index, find_exchange_row,
+                       latency_offset, simulation_params)
+
+
+def action_column(name):
+    """Name of the action_int column attached for one strategy."""
+    return f"action_int_{name}"
+
+
+
+def strategy_run_config(config, strategy):
+    """Return the single-run config equivalent to one strategy of config["multi_strategy"]."""
+    overrides = {key: value for key, value in strategy.items() if key not in ("name", "signals_csv_path")}
+    return {**config,
+            "data": {**config["data"], "signals_csv_path": strategy["signals_csv_path"]},
+            "simulation": {**config["simulation"], **overrides}}
+
+
+
+def attach_strategy_signals(quotes_validated_df, strategies, signals_by_path):
+    """
+    Attach one action_int column per strategy to the validated quotes.
+
+    Uses the same classification as integrate_signals(): Buy = 1 above
+    strength_threshold, Sell = -1 below -strength_threshold, Hold = 0.
+
+    Parameters
+    ----------
+    quotes_validated_df : pandas.DataFrame
+        Validated quotes, shared by every strategy.
+    strategies : list of dict
+        Strategy configs, each with "name", "signals_csv_path" and "strength_threshold".
+    signals_by_path : dict
+        Validated signals DataFrame per signals_csv_path.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The quotes with an int8 action_int_<name> column per strategy.
+    """
+    matched_df = quotes_validated_df.copy()
+    timestamps = matched_df[["timestamp"]]
+
+    for strategy in strategies:
+        signals_df = signals_by_path[strategy["signals_csv_path"]]
+        if signals_df["timestamp"].duplicated().any():
+            logger.info(f"FLAG: {strategy['name']}: duplicate signal timestamps, keeping the first signal of each.")
+            signals_df = signals_df.drop_duplicates(subset="timestamp", keep="first")
+
+        strength = pd.merge(timestamps, signals_df, on="timestamp", how="left")["signal_strength"].fillna(0).to_numpy()
+        threshold = strategy["strength_threshold"]
+        matched_df[action_column(strategy["name"])] = np.select([strength > threshold, strength < -threshold], [1, -1],
+                                                                default=0).astype(np.int8)
+
+    return matched_df
+
+
+
+class StrategyState:
+    """
+    Order generator / PnL state of one strategy in a lockstep multi-strategy run.
+
+    Keeps its own positions, RealTimePnL and RNG stream, and running totals of
+    the summary metrics instead of the per-tick results.
+    """
+
+    def __init__(self, name, sim_config):
+        self.name = name
+        self.params = simulation_params(sim_config)
+        self.latency = latency_offset(sim_config.get("latency_in_secs", 1))
+        self.pnl_obj = RealTimePnL(sim_config["commision_per_trade"])
+        # RandomState(seed) draws the same stream as np.random.seed(seed) in simulation()
+        self.random = np.random.RandomState(self.params["seed"]).random_sample
+        self.long_position = 0.0
+        self.short_position = 0.0
+        self.mid_price = np.nan
+        self.num_of_rows = 0
+        self.num_of_trades = 0
+        self.num_of_closed_trades = 0
+        self.received_signal_count = 0
+        self.trade_slippages = []
+        self.last_pnl = None
+
+    def step(self, signal, best_bid_price, best_ask_price, market):
+        """Generate this tick's orders and, when the exchange has a quote, fill them and update PnL."""
+        order_dict = order_generator(signal, best_bid_price, best_ask_price, self.long_position, self.short_position,
+                                     self.params["open_order_size"])
+        if market is None:
+            logger.info(f"Order Cancelled!!! --> No Matched events. ")
+            return
+
+        fills = exchange_fill(order_dict, market, self.mid_price, best_bid_price, best_ask_price,
+                              self.params["spread_penalty_factor"], self.params["cb"], self.params["ca"],
+                              self.params["min_price_aggressiveness"], random=self.random)
+        self.mid_price = fills["mid_price"]
+
+        pnl_and_pos_dict = self.pnl_obj.update_pnl(market[0], market[1], fills["filled_open_long_size"], fills["filled_close_long_size"],
+                                                   fills["filled_open_short_size"], fills["filled_close_short_size"])
+        self.long_position = pnl_and_pos_dict["total_long_pos"]
+        self.short_position = pnl_and_pos_dict["total_short_pos"]
+
+        self.num_of_rows += 1
+        self.num_of_trades += pnl_and_pos_dict["num_of_trades"]
+        self.num_of_closed_trades += pnl_and_pos_dict["num_of_closed_trades"]
+        if pnl_and_pos_dict["num_of_trades"] > 0:
+            self.trade_slippages.append(fills["slippage"])
+        self.last_pnl = pnl_and_pos_dict
+
+    def summary(self):
+        """Summary metrics, equal to summarize_results() of the strategy's single run."""
+        if self.num_of_rows == 0:
+            return {"num_of_trades": 0, "gross_pnl": 0.0, "net_pnl": 0.0, "avg_trade_pnl": np.nan,
+                    "avg_slippage": 0.0, "max_drawdown": 0.0, "max_drawdown_pct": np.nan}
+
+        last = self.last_pnl
+        peak_pnl = last["peak_pnl"]
+        return {
+            "num_of_trades": self.num_of_trades,
+            "gross_pnl": float(last["gross_pnl"]),
+            "net_pnl": float(last["net_pnl"]),
+            "avg_trade_pnl": float(last["realized_pnl"] / self.num_of_closed_trades) if self.num_of_closed_trades > 0 else np.nan,
+            "avg_slippage": float(np.sum(self.trade_slippages) / self.num_of_trades) if self.num_of_trades > 0 else 0.0,
+            "max_drawdown": float(last["max_drawdown"]),
+            "max_drawdown_pct": float(last["max_drawdown"] / peak_pnl * 100) if peak_pnl != 0 else np.nan,
+        }
+
+
+
+def run_strategies(matched_df, strategies, sim_config):
+    """
+    Simulate several strategies in lockstep over a single scan of the quotes.
+
+    The exchange lookup of each tick is shared by the strategies with the same
+    latency_in_secs (done once per distinct latency); every strategy then runs
+    its own order generator, fills and PnL update from independent state, so its
+    metrics equal those of a separate simulation() run on its own signals.
+
+    Parameters
+    ----------
+    matched_df : pandas.DataFrame
+        Quotes with the action_int_<name> columns of attach_strategy_signals().
+    strategies : list of dict
+        Strategy configs. Any "simulation" key set on a strategy overrides sim_config.
+    sim_config : dict
+        The "simulation" section of the config.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row of summary metrics per strategy.
+    """
+    timestamps = readonly_column(matched_df, "timestamp")
+    bid_prices = readonly_column(matched_df, "bid_price")
+    ask_prices = readonly_column(matched_df, "ask_price")
+    bid_qtys = readonly_column(matched_df, "bid_qty")
+    ask_qtys = readonly_column(matched_df, "ask_qty")
+    spread_flags = readonly_column(matched_df, "spread_flag")
+    sorted_timestamps, exchange_order = build_exchange_index(timestamps)
+
+    states = [StrategyState(strategy["name"], {**sim_config, **strategy}) for strategy in strategies]
+    latencies = list(dict.fromkeys(state.latency for state in states))
+    signals = np.column_stack([matched_df[action_column(state.name)].to_numpy() for state in states])
+    for state, strategy_signals in zip(states, signals.T):
+        state.received_signal_count = int(np.count_nonzero(strategy_signals))
+
+    for row, (ts, best_bid_price, best_ask_price) in enumerate(zip(timestamps, bid_prices, ask_prices)):
+        best_bid_price, best_ask_price = float(best_bid_price), float(best_ask_price)
+
+        markets = {}
+        for latency in latencies:
+            matched_row = find_exchange_row(sorted_timestamps, exchange_order, ts + latency)
+            markets[latency] = None
+            if matched_row >= 0:
+                markets[latency] = (float(bid_prices[matched_row]), float(ask_prices[matched_row]),
+                                    bid_qtys[matched_row], ask_qtys[matched_row], spread_flags[matched_row])
+
+        for state, signal in zip(states, signals[row]):
+            state.step(signal, best_bid_price, best_ask_price, markets[state.latency])
+
+    rows = []
+    for state, strategy in zip(states, strategies):
+        rows.append({"strategy": state.name, "signals_csv_path": strategy["signals_csv_path"],
+                     "strength_threshold": strategy["strength_threshold"],
+                     "num_of_signals": state.received_signal_count, **state.summary()})
+    return pd.DataFrame(rows)
+
+
+
+def run_multi_strategy(quotes_validated_df, config, project_root, precision="float64"):
+    """
+    Evaluate every strategy of config["multi_strategy"] against one pass over the quotes.
+
+    The quotes are validated once by the caller; each distinct signals file is
+    validated once and shared by the strategies that use it.
+
+    Parameters
+    ----------
+    quotes_validated_df : pandas.DataFrame
+        Output of validate_quotes().
+    config : dict
+        Full config. Uses the "simulation" and "multi_strategy" sections and data.time_range.
+    project_root : str or Path
+        Root that relative signals_csv_path entries are resolved against.
+    precision : str, optional
+        Price precision of the validated signals. Default is "float64".
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row of summary metrics per strategy.
+    """
+    sim_config = config["simulation"]
+    strategies = []
+    for i, strategy in enumerate(config["multi_strategy"]["strategies"]):
+        strategy = dict(strategy)
+        strategy.setdefault("name", f"strategy_{i}")
+        strategy.setdefault("strength_threshold", sim_config["strength_threshold"])
+        strategies.append(strategy)
+
+    names = [strategy["name"] for strategy in strategies]
+    if len(set(names)) != len(names):
+        raise ValueError(f"multi_strategy strategy names must be unique, got {names}.")
+
+    log_blank_line()
+    logger.info("-------- Multi-Strategy Evaluation --------")
+    logger.info("===========================================")
+    logger.info(f"INFO: {len(strategies)} strategy(ies) over {len(quotes_validated_df)} quote row(s).")
+
+    quote_timestamps = quotes_validated_df["timestamp"]
+    time_range = config["data"].get("time_range") or {}
+    time_range = (time_range.get("start"), time_range.get("end"))
+    signals_by_path = {}
+    for strategy in strategies:
+        path = strategy["signals_csv_path"]
+        if path not in signals_by_path:
+            signals_by_path[path] = validate_signals(os.path.join(project_root, path), None, None, precision,
+                                                     quote_timestamps=quote_timestamps, time_range=time_range)
+
+    matched_df = attach_strategy_signals(quotes_validated_df, strategies, signals_by_path)
+    metrics_df = run_strategies(matched_df, strategies, sim_config)
+
+    for summary in metrics_df.itertuples(index=False):
+        logger.info(f"INFO: {summary.strategy}: net PnL {summary.net_pnl:.6f}, {summary.num_of_trades} trade(s), "
+                    f"max drawdown {summary.max_drawdown:.6f}.")
+
+    return metrics_df
+
+
+
+def save_strategy_metrics(metrics_df, results_path):
+    """Write the per-strategy metrics table next to results.csv."""
+    metrics_df.to_csv(os.path.join(results_path, "strategy_metrics.csv"), index=False)
@@ -0,0 +1,116 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+
+from logger_config import logger
+from tick_store import is_tick_store
+
+
+# Characters that make a data path a glob pattern
+GLOB_CHARS = "*?["
+
+
+def is_partitioned(path):
+    """True when a data path is a glob pattern or a directory of CSV files (a tick store is not)."""
+    path = str(path)
+    return any(char in path for char in GLOB_CHARS) or (os.path.isdir(path) and not is_tick_store(path))
+
+
+
+def resolve_data_files(path):
+    """
+    List the files behind a data path.
+
+    A glob pattern expands to its matches, a directory to the CSV files below
+    it, and a single file or tick store to itself. Files are returned in name
+    order, which is time order for the usual date-stamped capture names.
+    """
+    path = str(path)
+    if not is_partitioned(path):
+        return [path]
+    if os.path.isdir(path):
+        files = glob.glob(os.path.join(path, "**", "*.csv"), recursive=True)
+    else:
+        files = [file for file in glob.glob(path, recursive=True) if os.path.isfile(file)]
+    if not files:
+        raise FileNotFoundError(f"No data files match {path}.")
+    return sorted(files)
+
+
+
+def parse_timestamps(timestamps):
+    """Parse raw feed timestamps (decimal comma allowed); unparseable values become NaT."""
+    return pd.to_datetime(timestamps.astype(str).str.replace(",", ".", regex=False), errors="coerce")
+
+
+
+def _read_partition(path, dtype, usecols, parse=True):
+    """Read one CSV partition (runs in a reader thread), parsing its timestamps unless they go to a worker process."""
+    df = pd.read_csv(path, dtype=dtype, usecols=usecols)
+    if parse:
+        df["timestamp"] = parse_timestamps(df["timestamp"])
+    return df
+
+
+
+def read_partitions(path, dtype, usecols=None, max_workers=None, parse_executor=None):
+    """
+    Read every file of a partitioned data path into one DataFrame.
+
+    The files are read in a thread pool: reading is mostly I/O, and the
+    pandas CSV parser releases the GIL, so threads overlap the reads without
+    pickling every frame back from a worker process. Only the timestamp
+    parsing, which is CPU-bound Python-level string work, can go to a
+    process pool; just the timestamp column is sent to and returned from
+    the workers. The frames are concatenated in file order and the
+    validation that follows sees one dataset, so duplicates, ordering and
+    latency matching across file boundaries behave exactly as for a single
+    file.
+
+    Parameters
+    ----------
+    path : str
+        Glob pattern or directory of CSV files.
+    dtype : dict
+        Column dtypes of the raw files (e.g. RAW_QUOTES_DTYPES).
+    usecols : list of str, optional
+        Columns to read. Default is all columns.
+    max_workers : int, optional
+        Reader threads and parser processes. Default is the number of CPUs.
+    parse_executor : {"thread", "process"}, optional
+        Where the timestamps are parsed: in the reader threads or in a
+        process pool. Default is "process" when there are several files
+        and workers, "thread" otherwise.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Rows of all files with parsed timestamps.
+    """
+    files = resolve_data_files(path)
+    workers = min(max_workers or os.cpu_count() or 1, len(files))
+    if parse_executor is None:
+        parse_executor = "process" if workers > 1 else "thread"
+    if parse_executor not in ("thread", "process"):
+        raise ValueError(f"Unknown parse_executor '{parse_executor}'. Expected 'thread' or 'process'.")
+
+    parse_in_readers = parse_executor == "thread"
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="partition-reader") as readers:
+        frames = list(readers.map(_read_partition, files, [dtype] * len(files), [usecols] * len(files),
+                                  [parse_in_readers] * len(files)))
+    if not parse_in_readers:
+        with ProcessPoolExecutor(max_workers=workers) as parsers:
+            parsed = list(parsers.map(parse_timestamps, [frame["timestamp"] for frame in frames]))
+        for frame, timestamps in zip(frames, parsed):
+            frame["timestamp"] = timestamps
+
+    # Boundaries where a file starts before the previous one ends are re-sorted by validation
+    bounds = [(frame["timestamp"].min(), frame["timestamp"].max()) for frame in frames if frame["timestamp"].notna().any()]
+    overlaps = sum(1 for (_, previous_end), (start, _) in zip(bounds, bounds[1:]) if start < previous_end)
+    logger.info(f"INFO: Read {sum(len(frame) for frame in frames)} row(s) from {len(files)} file(s) matching {path}.")
+    if overlaps > 0:
+        logger.info(f"FLAG: {overlaps} file boundary(ies) overlap in time.")
+
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,144 @@
+import contextlib
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from logger_config import logger
+
+
+class Stage:
+    """One step of a Pipeline: a callable with named input and output artifacts."""
+
+    def __init__(self, name, func, inputs=(), output=None):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.output = output
+
+
+
+class Pipeline:
+    """
+    Small stage graph with declared inputs and outputs.
+
+    Each stage runs as soon as all of its input artifacts exist, on a thread
+    pool, so independent stages (e.g. signal and quote validation, or writing a
+    CSV while the next stage computes) run concurrently. Stages without an
+    output are side effects that nothing waits on. The wall time of every stage
+    is kept in `timings`.
+
+    A run can be restricted to a subset of the stages; inputs produced by stages
+    outside the subset are then loaded with the loader registered through
+    cache(), e.g. the processed CSV written by an earlier run.
+
+    With a SamplingProfiler, the profiler runs for the duration of run() and
+    samples the threads of the stages it profiles.
+
+    With an ArtifactWriter, the stages added through persist() hand a snapshot
+    of their artifact to the writer and return at once; run() joins the
+    writer before returning, so a failed write is raised from run().
+    """
+
+    def __init__(self, max_workers=None, profiler=None, writer=None):
+        self.max_workers = max_workers
+        self.profiler = profiler
+        self.writer = writer
+        self.stages = {}
+        self.loaders = {}
+        self.timings = {}
+
+    def add(self, name, func, inputs=(), output=None):
+        """Add a stage calling func(*inputs) and storing its return value as `output`."""
+        if name in self.stages:
+            raise ValueError(f"Pipeline stage '{name}' is defined twice.")
+        self.stages[name] = Stage(name, func, inputs, output)
+
+    def persist(self, name, artifact, write):
+        """Add a stage calling write(artifact), in the background when the pipeline has a writer."""
+        if self.writer is None:
+            self.add(name, write, inputs=[artifact])
+        else:
+            self.add(name, lambda data: self.writer.submit(artifact, write, data), inputs=[artifact])
+
+    def cache(self, artifact, loader):
+        """Register how to load an artifact when the stage producing it does not run."""
+        self.loaders[artifact] = loader
+
+    def producers(self):
+        """Map each artifact to the name of the stage producing it."""
+        return {stage.output: name for name, stage in self.stages.items() if stage.output is not None}
+
+    def run(self, stage_names=None):
+        """
+        Run the selected stages (all by default) in dependency order.
+
+        Parameters
+        ----------
+        stage_names : list of str, optional
+            Stages to run. Inputs produced by other stages are loaded from cache.
+
+        Returns
+        -------
+        dict
+            Artifacts loaded or produced by the run.
+        """
+        stage_names = list(self.stages) if not stage_names else list(stage_names)
+        unknown = [name for name in stage_names if name not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown pipeline stage(s) {unknown}. Available: {list(self.stages)}.")
+        if self.profiler is not None and self.profiler.stages is not None:
+            unknown = sorted(self.profiler.stages - set(self.stages))
+            if unknown:
+                raise ValueError(f"Cannot profile unknown pipeline stage(s) {unknown}. Available: {list(self.stages)}.")
+
+        # --- Load the inputs that no selected stage produces ---
+        produced = {self.stages[name].output for name in stage_names}
+        artifacts = {}
+        for name in stage_names:
+            for artifact in self.stages[name].inputs:
+                if artifact in produced or artifact in artifacts:
+                    continue
+                if artifact not in self.loaders:
+                    raise ValueError(f"Stage '{name}' needs '{artifact}', which is neither produced by the selected "
+                                     f"stages nor cached. Add stage '{self.producers().get(artifact)}'.")
+                logger.info(f"PIPELINE: Loading cached '{artifact}'.")
+                artifacts[artifact] = self.loaders[artifact]()
+
+        # --- Run every stage once its inputs are available ---
+        pending = list(stage_names)
+        running = {}
+        with self.profiler or contextlib.nullcontext(), ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            try:
+                while pending or running:
+                    for name in list(pending):
+                        stage = self.stages[name]
+                        if all(artifact in artifacts for artifact in stage.inputs):
+                            pending.remove(name)
+                            running[pool.submit(self._run_stage, stage, [artifacts[artifact] for artifact in stage.inputs])] = stage
+
+                    if not running:
+                        raise ValueError(f"Pipeline stages {pending} wait on each other (cycle in the stage graph).")
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage = running.pop(future)
+                        result = future.result()
+                        if stage.output is not None:
+                            artifacts[stage.output] = result
+            except BaseException:
+                # The stage error wins; writes already queued still finish
+                if self.writer is not None:
+                    self.writer.join(raise_errors=False)
+                raise
+
+            if self.writer is not None:
+                self.writer.join()
+
+        return artifacts
+
+    def _run_stage(self, stage, inputs):
+        start = time.perf_counter()
+        with self.profiler.track(stage.name) if self.profiler is not None else contextlib.nullcontext():
+            result = stage.func(*inputs)
+        self.timings[stage.name] = time.perf_counter() - start
+        logger.info(f"PIPELINE: Stage '{stage.name}' finished in {self.timings[stage.name]:.2f}s.")
+        return result
@@ -1,5 +1,6 @@
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
+from matplotlib.figure import Figure
 import pandas as pd
 import numpy as np
 import os
@@ -32,18 +33,27 @@ def plot_spread_distribution(spread, mean, k, spread_threshold, plots_dir_path):
     print(f"Spread Distribution plot saved at: {plots_dir_path}")
 
 
-def plot_pnl_and_slippage_summary(df, plots_dir_path):
+def plot_pnl_and_slippage_summary(df, plots_dir_path, summary=None):
     """
     Plot PnL, slippage, and drawdown metrics in a 2-column layout:
     Left: Gross vs Net PnL + Max Drawdown curves.
     Right: Slippage curve + textual summary.
+
+    df may be a downsampled series (ResultsDigest.frame()) when the
+    summarize_results() metrics of the full results are passed as summary.
     """
 
     # --- Extract metrics using your helper functions ---
-    gross_pnl, net_pnl = get_gross_and_net_pnl(df)
-    avg_trade_pnl = calculate_average_trade_pnl(df)
-    avg_slippage, total_trade_count = calculate_average_slippage(df)
-    max_drawdown, max_drawdown_percentage = get_max_drawdown(df)
+    if summary is None:
+        gross_pnl, net_pnl = get_gross_and_net_pnl(df)
+        avg_trade_pnl = calculate_average_trade_pnl(df)
+        avg_slippage, total_trade_count = calculate_average_slippage(df)
+        max_drawdown, max_drawdown_percentage = get_max_drawdown(df)
+    else:
+        gross_pnl, net_pnl = summary["gross_pnl"], summary["net_pnl"]
+        avg_trade_pnl = summary["avg_trade_pnl"]
+        avg_slippage, total_trade_count = summary["avg_slippage"], summary["num_of_trades"]
+        max_drawdown, max_drawdown_percentage = summary["max_drawdown"], summary["max_drawdown_pct"]
 
     # --- Convert timestamp ---
     df["exchange_time"] = pd.to_datetime(df["exchange_time"])
@@ -137,3 +147,41 @@ def plot_pnl_and_slippage_summary(df, plots_dir_path):
     # --- Print Summary ---
     print(summary_text)
     print(f"Combined plot saved to: {os.path.abspath(combined_path)}")
+
+
+def plot_latency_curve(metrics_df, plots_dir_path):
+    """
+    Plot the metrics-vs-latency curve of a latency scan:
+    Left: Gross and Net PnL per latency.
+    Right: Max Drawdown and number of trades per latency.
+    """
+    x = metrics_df["latency_secs"]
+
+    # A standalone Figure leaves pyplot's current figure alone, so it can be drawn while other plot stages run
+    fig = Figure(figsize=(14, 5))
+    ax1, ax2 = fig.subplots(1, 2)
+
+    ax1.plot(x, metrics_df["gross_pnl"], marker="o", color="green", linewidth=1.5, label="Gross PnL")
+    ax1.plot(x, metrics_df["net_pnl"], marker="o", color="orange", linestyle="--", linewidth=1.5, label="Net PnL")
+    ax1.set_title("PnL vs Latency")
+    ax1.set_xlabel("Latency (s)")
+    ax1.set_ylabel("PnL")
+    ax1.legend()
+    ax1.grid(True)
+
+    ax2.plot(x, metrics_df["max_drawdown"], marker="o", color="darkred", linewidth=1.5, label="Max Drawdown")
+    ax2.set_title("Max Drawdown and Trades vs Latency")
+    ax2.set_xlabel("Latency (s)")
+    ax2.set_ylabel("Drawdown")
+    ax2.grid(True)
+    ax2_trades = ax2.twinx()
+    ax2_trades.bar(x, metrics_df["num_of_trades"], width=0.2 * (x.max() - x.min()) / max(len(x), 1) or 0.1,
+                   alpha=0.3, color="steelblue", label="Trades")
+    ax2_trades.set_ylabel("Trades")
+    lines, labels = ax2.get_legend_handles_labels()
+    bars, bar_labels = ax2_trades.get_legend_handles_labels()
+    ax2.legend(lines + bars, labels + bar_labels)
+
+    latency_path = os.path.join(plots_dir_path, "latency_sensitivity.png")
+    fig.savefig(latency_path, dpi=300, bbox_inches="tight")
+    print(f"Latency sensitivity plot saved to: {os.path.abspath(latency_path)}")
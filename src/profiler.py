@@ -0,0 +1,200 @@
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import pandas as pd
+
+from logger_config import logger, log_blank_line
+
+
+# Default time between two samples (seconds)
+DEFAULT_INTERVAL = 0.01
+
+# Rows of the hot-function table written and logged
+DEFAULT_TOP_N = 25
+
+
+def _frame_label(frame):
+    """'function (file.py:line)' label of a frame, using the line of the function definition."""
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for pipeline stages.
+
+    A background thread wakes every `interval` seconds and records the Python
+    stack of each thread currently running a tracked stage (see track()),
+    through sys._current_frames(). Nothing is added to the profiled code
+    itself, so the per-tick loop runs at full speed and the overhead stays
+    at a few percent with the default interval.
+
+    Samples are kept as collapsed stacks (stage;outer;...;inner -> count).
+    When the profiled block exits, write() produces a collapsed-stack file
+    (flamegraph.pl / speedscope), a speedscope JSON profile and a hot-function
+    table in output_dir.
+
+    Time spent in C code that holds the GIL is attributed to the Python frame
+    that called it once the sampler gets the GIL back.
+    """
+
+    def __init__(self, stages=None, interval=DEFAULT_INTERVAL, output_dir=None, top_n=DEFAULT_TOP_N):
+        self.stages = set(stages) if stages else None
+        self.interval = interval
+        self.output_dir = output_dir
+        self.top_n = top_n
+        self.samples = Counter()
+        self.elapsed = 0.0
+        self._tracked = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_at = None
+
+    # ---- Tracking ----
+    @contextlib.contextmanager
+    def track(self, stage_name):
+        """Sample the calling thread while the block runs, if stage_name is profiled."""
+        if self.stages is not None and stage_name not in self.stages:
+            yield
+            return
+        # Frames up to the caller of track() (thread bootstrap, stage runner) are left out of the stacks
+        caller = sys._getframe(1)
+        while caller is not None and caller.f_code.co_filename == contextlib.__file__:
+            caller = caller.f_back
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._tracked[thread_id] = (stage_name, caller)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._tracked.pop(thread_id, None)
+
+    # ---- Sampling thread ----
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.elapsed += time.perf_counter() - self._started_at
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        if self.output_dir is not None:
+            self.write(self.output_dir)
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """Record the current stack of every tracked thread."""
+        with self._lock:
+            tracked = dict(self._tracked)
+        if not tracked:
+            return
+        frames = sys._current_frames()
+        for thread_id, (stage_name, caller) in tracked.items():
+            frame = frames.get(thread_id)
+            stack = []
+            while frame is not None and frame is not caller:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(stage_name)
+            self.samples[tuple(reversed(stack))] += 1
+
+    # ---- Reports ----
+    @property
+    def num_samples(self):
+        return sum(self.samples.values())
+
+    def collapsed(self):
+        """Collapsed stacks, one 'stage;outer;...;inner count' line per distinct stack."""
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+    def speedscope(self, name="SignalSim"):
+        """Profile in the speedscope file format (one sampled profile per stage)."""
+        frame_index = {}
+        profiles = {}
+        for stack, count in self.samples.items():
+            indices = [frame_index.setdefault(label, len(frame_index)) for label in stack]
+            profile = profiles.setdefault(stack[0], {"samples": [], "weights": []})
+            profile["samples"].append(indices)
+            profile["weights"].append(count * self.interval)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "SignalSim sampling profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": [{"name": label} for label in frame_index]},
+            "profiles": [{"type": "sampled", "name": stage_name, "unit": "seconds", "startValue": 0,
+                          "endValue": sum(profile["weights"]), **profile}
+                         for stage_name, profile in profiles.items()],
+        }
+
+    def top_functions(self, n=None):
+        """
+        Hot-function table.
+
+        Returns
+        -------
+        pandas.DataFrame
+            function, self / total sample counts and their share of all samples,
+            sorted by self samples. Total counts a function once per sample even
+            when it recurses.
+        """
+        self_counts, total_counts = Counter(), Counter()
+        for stack, count in self.samples.items():
+            self_counts[stack[-1]] += count
+            for label in set(stack[1:]):
+                total_counts[label] += count
+
+        num_samples = max(self.num_samples, 1)
+        table = pd.DataFrame({"function": list(total_counts),
+                              "self_samples": [self_counts[label] for label in total_counts],
+                              "total_samples": list(total_counts.values())})
+        table["self_pct"] = 100 * table["self_samples"] / num_samples
+        table["total_pct"] = 100 * table["total_samples"] / num_samples
+        table = table.sort_values(["self_samples", "total_samples"], ascending=False).reset_index(drop=True)
+        return table if n is None else table.head(n)
+
+    def write(self, output_dir):
+        """Write profile.collapsed.txt, profile.speedscope.json and profile_top.csv and log the hottest functions."""
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, "profile.collapsed.txt"), "w") as f:
+            f.write(self.collapsed())
+        with open(os.path.join(output_dir, "profile.speedscope.json"), "w") as f:
+            json.dump(self.speedscope(), f)
+        table = self.top_functions(self.top_n)
+        table.to_csv(os.path.join(output_dir, "profile_top.csv"), index=False)
+
+        log_blank_line()
+        logger.info("-------- Sampling Profile --------")
+        logger.info("==================================")
+        logger.info(f"INFO: {self.num_samples} sample(s) every {self.interval * 1000:.1f} ms over {self.elapsed:.2f}s "
+                    f"({'all stages' if self.stages is None else ', '.join(sorted(self.stages))}).")
+        for row in table.head(10).itertuples(index=False):
+            logger.info(f"INFO: {row.self_pct:5.1f}% self {row.total_pct:5.1f}% total  {row.function}")
+        logger.info(f"INFO: Wrote the profile to {output_dir}")
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+from schema import apply_schema
+
+
+class ResultsBuffer:
+    """
+    Preallocated columnar storage for simulation result rows.
+
+    Each record is written into one NumPy array per column instead of being kept
+    as a Python dict, so the buffer costs a fixed number of bytes per row.
+    Columns are created on the first append, in the key order of that record.
+    Integer and price columns are buffered as float64 and cast to the results
+    schema when the frame is built (fractional sizes stay float).
+    """
+
+    def __init__(self, schema, capacity):
+        self.schema = schema
+        self.capacity = max(int(capacity), 1)
+        self.columns = {}
+        self.size = 0
+
+    def _buffer_dtype(self, name):
+        dtype = np.dtype(self.schema.get(name, np.float64))
+        return dtype if dtype.kind == "M" else np.dtype(np.float64)
+
+    def append(self, record):
+        if not self.columns:
+            self.columns = {name: np.zeros(self.capacity, dtype=self._buffer_dtype(name)) for name in record}
+
+        if self.size == self.capacity:
+            self.capacity *= 2
+            for name, values in self.columns.items():
+                self.columns[name] = np.resize(values, self.capacity)
+
+        row = self.size
+        for name, value in record.items():
+            self.columns[name][row] = value
+        self.size += 1
+
+    def snapshot(self):
+        """Return a copy of the buffered rows as {column: array}, e.g. for checkpoints."""
+        return {name: values[:self.size].copy() for name, values in self.columns.items()}
+
+    def restore(self, columns):
+        """Refill the buffer from the output of snapshot()."""
+        self.size = len(next(iter(columns.values()))) if columns else 0
+        self.capacity = max(self.capacity, self.size)
+        self.columns = {}
+        for name, values in columns.items():
+            self.columns[name] = np.zeros(self.capacity, dtype=values.dtype)
+            self.columns[name][:self.size] = values
+
+    def clear(self):
+        """Drop all buffered rows, keeping the allocated arrays."""
+        self.size = 0
+
+    def to_frame(self):
+        """
+        Return the buffered rows as a DataFrame with the results schema applied.
+
+        Columns that need no cast share memory with the buffer, so the frame must
+        be consumed before the buffer is cleared and refilled.
+        """
+        frame = pd.DataFrame({name: values[:self.size] for name, values in self.columns.items()}, copy=False)
+        return apply_schema(frame, self.schema)
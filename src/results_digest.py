@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+
+from metrics import summarize_results
+from results_writer import iter_results
+from schema import FILLED_SIZE_COLUMNS, price_error_bound
+
+
+# Points of the downsampled PnL / drawdown series kept for the plots (rows with trades are kept on top)
+DEFAULT_MAX_POINTS = 20_000
+
+# Columns kept per row: enough for summarize_results() and plot_pnl_and_slippage_summary()
+DIGEST_COLUMNS = ["exchange_time", "gross_pnl", "net_pnl", "realized_pnl", "num_of_trades", "num_of_closed_trades",
+                  "slippage", "max_drawdown", "peak_pnl"]
+
+
+class ResultsDigest:
+    """
+    What the report, plots, bootstrap and experiment store use of the per-tick results, accumulated chunk by chunk.
+
+    The per-tick results of a long run are streamed to disk and can be much
+    larger than memory. They are read back in chunks (digest_results()) and
+    every chunk is folded into:
+
+    - the rows with executed or closed trades and the last row, so summary()
+      is exactly summarize_results() of the full results
+    - every stride-th row and the max drawdown row for the plots; the stride
+      doubles whenever more than 2 * max_points rows are sampled
+    - the per-trade samples and closing net PnL per `interval` of
+      bootstrap_metrics()
+    - the totals of pnl_error_bound() and the in-memory bytes per row
+
+    so memory grows with the number of trades and bootstrap intervals, not
+    with the number of ticks.
+
+    Parameters
+    ----------
+    max_points : int, optional
+        Rows of the downsampled plot series. Default is DEFAULT_MAX_POINTS.
+    interval : str, optional
+        Bootstrap return interval (pandas frequency string). Default is "1s".
+    """
+
+    def __init__(self, max_points=DEFAULT_MAX_POINTS, interval="1s"):
+        self.max_points = max_points
+        self.interval = interval
+        self.stride = 1
+        self.num_rows = 0
+        self.bytes = 0
+        self.traded_qty = 0.0
+        self.max_position = np.nan
+        self._last_realized = 0.0
+        self._max_drawdown = -np.inf
+        self._max_drawdown_row = None
+        self._last_row = None
+        self._trade_rows = []
+        self._sampled_rows = []
+        self._num_sampled = 0
+        self._closes = []
+        self._fills = []
+        self._closing_pnl = []
+
+    @classmethod
+    def from_frame(cls, results_df, max_points=DEFAULT_MAX_POINTS, interval="1s"):
+        """Digest of results already in memory (e.g. the signal-tick results of the events layout)."""
+        digest = cls(max_points, interval)
+        digest.update(results_df)
+        return digest
+
+    def update(self, chunk):
+        """Fold the next chunk of result rows into the digest."""
+        if chunk.empty:
+            return
+
+        chunk = chunk.set_axis(pd.RangeIndex(self.num_rows, self.num_rows + len(chunk)))
+        self.num_rows += len(chunk)
+        self.bytes += int(chunk.memory_usage(index=False, deep=True).sum())
+
+        # --- pnl_error_bound() totals ---
+        self.traded_qty += chunk[FILLED_SIZE_COLUMNS].to_numpy(dtype=np.float64).sum()
+        self.max_position = np.fmax(self.max_position, (chunk["long_position"] + chunk["short_position"]).max())
+
+        # --- Bootstrap samples, as trade_samples() and interval_returns() of the full results ---
+        realized = chunk["realized_pnl"].to_numpy(np.float64)
+        closed_count = chunk["num_of_closed_trades"].to_numpy(np.float64)
+        trade_count = chunk["num_of_trades"].to_numpy(np.float64)
+        realized_change = np.diff(realized, prepend=self._last_realized)
+        self._last_realized = realized[-1]
+        self._closes.append(np.column_stack([realized_change, closed_count])[closed_count > 0])
+        self._fills.append(np.column_stack([np.nan_to_num(chunk["slippage"].to_numpy(np.float64)), trade_count])[trade_count > 0])
+
+        net_pnl = pd.Series(chunk["net_pnl"].to_numpy(np.float64), index=pd.to_datetime(chunk["exchange_time"]))
+        net_pnl = net_pnl[net_pnl.index.notna()]
+        self._closing_pnl.append(net_pnl.groupby(net_pnl.index.floor(self.interval)).last())
+
+        # --- Rows kept for the summary and the plots ---
+        rows = chunk[DIGEST_COLUMNS]
+        traded = (trade_count > 0) | (closed_count > 0)
+        self._trade_rows.append(rows[traded])
+        self._last_row = rows.iloc[[-1]]
+
+        drawdowns = rows["max_drawdown"]
+        if drawdowns.notna().any() and drawdowns.max() > self._max_drawdown:
+            self._max_drawdown = drawdowns.max()
+            self._max_drawdown_row = rows.loc[[drawdowns.idxmax()]]
+
+        sampled = rows[~traded & (rows.index % self.stride == 0)]
+        self._sampled_rows.append(sampled)
+        self._num_sampled += len(sampled)
+        while self._num_sampled > 2 * self.max_points:
+            self.stride *= 2
+            sampled = pd.concat(self._sampled_rows)
+            self._sampled_rows = [sampled[sampled.index % self.stride == 0]]
+            self._num_sampled = len(self._sampled_rows[0])
+
+    @property
+    def bytes_per_row(self):
+        """In-memory size of the results in bytes per row, as memory_per_row()."""
+        return self.bytes / self.num_rows if self.num_rows else 0.0
+
+    def frame(self):
+        """The kept rows (trades, samples, max drawdown and last row) in result order."""
+        if self.num_rows == 0:
+            return pd.DataFrame(columns=DIGEST_COLUMNS)
+        parts = self._trade_rows + self._sampled_rows + [self._last_row]
+        if self._max_drawdown_row is not None:
+            parts.append(self._max_drawdown_row)
+        rows = pd.concat(parts).sort_index()
+        return rows[~rows.index.duplicated(keep="first")]
+
+    def summary(self):
+        """Summary metrics, equal to summarize_results() of the full results."""
+        return summarize_results(self.frame())
+
+    def pnl_error_bound(self, max_abs_price, precision):
+        """pnl_error_bound() of the full results."""
+        if self.num_rows == 0:
+            return 0.0
+        return price_error_bound(max_abs_price, precision, self.traded_qty, self.max_position)
+
+    def trade_samples(self):
+        """trade_samples() of the full results."""
+        closes = np.concatenate(self._closes) if self._closes else np.empty((0, 2))
+        fills = np.concatenate(self._fills) if self._fills else np.empty((0, 2))
+        return closes, fills
+
+    def interval_returns(self, interval="1s"):
+        """interval_returns() of the full results; interval must be the one the digest was built with."""
+        if interval != self.interval:
+            raise ValueError(f"Results digest holds {self.interval} returns, not {interval}.")
+        if not self._closing_pnl:
+            return np.empty(0)
+        closing_pnl = pd.concat(self._closing_pnl)
+        closing_pnl = closing_pnl.groupby(level=0).last()
+        return np.diff(closing_pnl.to_numpy(), prepend=0.0)
+
+
+
+def digest_results(sink, interval="1s", max_points=DEFAULT_MAX_POINTS, chunksize=100_000):
+    """
+    Read the results written to a sink back in chunks into a ResultsDigest.
+
+    Parameters
+    ----------
+    sink : CsvResultsSink or ParquetResultsSink
+        Sink the simulation wrote to.
+    interval : str, optional
+        Bootstrap return interval. Default is "1s".
+    max_points : int, optional
+        Rows of the downsampled plot series. Default is DEFAULT_MAX_POINTS.
+    chunksize : int, optional
+        Rows read at a time. Default is 100,000.
+
+    Returns
+    -------
+    ResultsDigest
+        Digest of all result rows.
+    """
+    digest = ResultsDigest(max_points, interval)
+    for chunk in iter_results(sink, chunksize):
+        digest.update(chunk)
+    return digest
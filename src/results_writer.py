@@ -0,0 +1,252 @@
+import glob
+import gzip
+import os
+import shutil
+
+import pandas as pd
+
+from logger_config import logger
+
+
+# File name of the results for each output.results_format
+RESULTS_FILE_NAMES = {
+    "csv": "results.csv",
+    "csv.gz": "results.csv.gz",
+    "csv.zst": "results.csv.zst",
+    "parquet": "results.parquet",
+}
+
+
+class CsvResultsSink:
+    """
+    Appends result chunks to a CSV file, optionally gzip or zstd compressed.
+
+    Every chunk is written and flushed on its own (as a separate gzip member /
+    zstd frame when compressed), so a plain CSV can be followed with `tail -f`
+    while the run is in progress, and the byte offset after any chunk is a valid
+    point to truncate to when resuming from a checkpoint.
+    """
+
+    def __init__(self, path, compression=None):
+        if compression not in (None, "gzip", "zstd"):
+            raise ValueError(f"Unknown results compression '{compression}'. Expected None, 'gzip' or 'zstd'.")
+
+        self.path = path
+        self.compression = compression
+        self.rows_written = 0
+        self.bytes_written = 0
+        self._zstd_compressor = None
+
+        if compression == "zstd":
+            try:
+                import zstandard
+            except ImportError as e:
+                raise ImportError("zstd results compression requires the 'zstandard' package.") from e
+            self._zstd_compressor = zstandard.ZstdCompressor()
+
+    def start(self):
+        """Create an empty results file, replacing any previous one."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        open(self.path, "wb").close()
+        self.rows_written = 0
+        self.bytes_written = 0
+
+    def write(self, df):
+        """Append one chunk of result rows."""
+        if df.empty:
+            return
+
+        data = df.to_csv(index=False, header=self.rows_written == 0).encode()
+        if self.compression == "gzip":
+            data = gzip.compress(data)
+        elif self.compression == "zstd":
+            data = self._zstd_compressor.compress(data)
+
+        with open(self.path, "ab") as f:
+            f.write(data)
+            f.flush()
+
+        self.rows_written += len(df)
+        self.bytes_written += len(data)
+
+    def state(self):
+        """Position of the sink, stored in simulation checkpoints."""
+        return {"rows_written": self.rows_written, "bytes_written": self.bytes_written}
+
+    def restore(self, state):
+        """Drop everything written after the given state() (resume from a checkpoint)."""
+        with open(self.path, "r+b") as f:
+            f.truncate(state["bytes_written"])
+        self.rows_written = state["rows_written"]
+        self.bytes_written = state["bytes_written"]
+
+    def close(self):
+        logger.info(f"INFO: Wrote {self.rows_written} result row(s) to {self.path}")
+
+
+
+class ParquetResultsSink:
+    """
+    Writes result chunks as Parquet files partitioned by exchange date.
+
+    Each chunk becomes one part file per date it covers, under
+    `<path>/date=YYYY-MM-DD/part-NNNNN.parquet`. Requires pyarrow.
+    """
+
+    def __init__(self, path):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ImportError("Parquet results require the 'pyarrow' package.") from e
+
+        self.path = path
+        self.rows_written = 0
+        self.parts_written = 0
+
+    def start(self):
+        """Create an empty results directory, replacing any previous one."""
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+        os.makedirs(self.path, exist_ok=True)
+        self.rows_written = 0
+        self.parts_written = 0
+
+    def write(self, df):
+        """Write one chunk of result rows, split by exchange date."""
+        if df.empty:
+            return
+
+        dates = df["exchange_time"].dt.strftime("%Y-%m-%d")
+        for date, chunk in df.groupby(dates, sort=True):
+            partition_dir = os.path.join(self.path, f"date={date}")
+            os.makedirs(partition_dir, exist_ok=True)
+            chunk.to_parquet(os.path.join(partition_dir, f"part-{self.parts_written:05d}.parquet"), index=False)
+        self.parts_written += 1
+        self.rows_written += len(df)
+
+    def state(self):
+        """Position of the sink, stored in simulation checkpoints."""
+        return {"rows_written": self.rows_written, "parts_written": self.parts_written}
+
+    def restore(self, state):
+        """Delete part files written after the given state() (resume from a checkpoint)."""
+        for part_path in glob.glob(os.path.join(self.path, "date=*", "part-*.parquet")):
+            if int(os.path.basename(part_path)[5:10]) >= state["parts_written"]:
+                os.remove(part_path)
+        self.rows_written = state["rows_written"]
+        self.parts_written = state["parts_written"]
+
+    def close(self):
+        logger.info(f"INFO: Wrote {self.rows_written} result row(s) to {self.path}")
+
+
+
+def make_results_sink(results_format, results_path):
+    """
+    Create the results sink for an output.results_format value.
+
+    Parameters
+    ----------
+    results_format : str
+        One of RESULTS_FILE_NAMES: "csv", "csv.gz", "csv.zst" or "parquet".
+    results_path : str
+        Output directory of the results.
+
+    Returns
+    -------
+    CsvResultsSink or ParquetResultsSink
+        Sink writing to results_path.
+    """
+    if results_format not in RESULTS_FILE_NAMES:
+        raise ValueError(f"Unknown results_format '{results_format}'. Expected one of {list(RESULTS_FILE_NAMES)}.")
+
+    path = os.path.join(results_path, RESULTS_FILE_NAMES[results_format])
+    if results_format == "parquet":
+        return ParquetResultsSink(path)
+
+    compression = {"csv": None, "csv.gz": "gzip", "csv.zst": "zstd"}[results_format]
+    return CsvResultsSink(path, compression)
+
+
+
+def _parquet_parts(sink):
+    """Part files of a Parquet sink in write order."""
+    return sorted(glob.glob(os.path.join(sink.path, "date=*", "part-*.parquet")),
+                  key=lambda part_path: (os.path.basename(part_path), part_path))
+
+
+
+def read_results(sink):
+    """
+    Load everything written to a results sink back into one DataFrame.
+
+    Parameters
+    ----------
+    sink : CsvResultsSink or ParquetResultsSink
+        Sink the simulation wrote to.
+
+    Returns
+    -------
+    pandas.DataFrame
+        All result rows in write order.
+    """
+    if isinstance(sink, ParquetResultsSink):
+        parts = _parquet_parts(sink)
+        if not parts:
+            return pd.DataFrame()
+        return pd.concat([pd.read_parquet(part_path) for part_path in parts], ignore_index=True)
+
+    # Also reads the results of an earlier run, e.g. when only the plots are re-rendered
+    if not os.path.exists(sink.path) or os.path.getsize(sink.path) == 0:
+        return pd.DataFrame()
+
+    if sink.compression == "zstd":
+        import zstandard
+        with open(sink.path, "rb") as f:
+            reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            return pd.read_csv(reader, parse_dates=["exchange_time", "order_sent_time"])
+
+    # gzip.open reads all members of a multi-member file
+    return pd.read_csv(sink.path, compression=sink.compression, parse_dates=["exchange_time", "order_sent_time"])
+
+
+
+def iter_results(sink, chunksize=100_000):
+    """
+    Read everything written to a results sink back chunk by chunk, in write order.
+
+    As read_results(), but only one chunk of at most chunksize rows is held
+    at a time (Parquet parts are read in record batches).
+
+    Parameters
+    ----------
+    sink : CsvResultsSink or ParquetResultsSink
+        Sink the simulation wrote to.
+    chunksize : int, optional
+        Rows per chunk. Default is 100,000.
+
+    Yields
+    ------
+    pandas.DataFrame
+        Consecutive chunks of result rows.
+    """
+    if isinstance(sink, ParquetResultsSink):
+        import pyarrow.parquet as pq
+        for part_path in _parquet_parts(sink):
+            for batch in pq.ParquetFile(part_path).iter_batches(batch_size=chunksize):
+                yield batch.to_pandas()
+        return
+
+    if not os.path.exists(sink.path) or os.path.getsize(sink.path) == 0:
+        return
+
+    if sink.compression == "zstd":
+        import zstandard
+        with open(sink.path, "rb") as f:
+            reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            yield from pd.read_csv(reader, parse_dates=["exchange_time", "order_sent_time"], chunksize=chunksize)
+        return
+
+    with pd.read_csv(sink.path, compression=sink.compression, parse_dates=["exchange_time", "order_sent_time"],
+                     chunksize=chunksize) as reader:
+        yield from reader
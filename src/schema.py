@@ -0,0 +1,267 @@
+import numpy as np
+from logger_config import logger
+
+
+# ---------------- Precision modes ----------------
+# Timestamps are always datetime64[ns] (int64 nanoseconds since epoch).
+# Prices are stored as float64 or float32; PnL columns always stay float64.
+PRICE_DTYPES = {
+    "float64": np.float64,
+    "float32": np.float32,
+}
+
+# Unit roundoff of each price dtype (max relative error of one stored price)
+PRICE_UNIT_ROUNDOFF = {
+    "float64": 2.0 ** -53,
+    "float32": 2.0 ** -24,
+}
+
+TIMESTAMP_DTYPE = "datetime64[ns]"
+QTY_DTYPE = np.int32
+FLAG_DTYPE = np.int8
+
+
+# ---------------- Raw data (as read from CSV) ----------------
+# Quantities may be null or written as floats (e.g. "7.0") in the raw feed,
+# so they are read as float32 and only cast to int32 after validation.
+RAW_QUOTES_DTYPES = {
+    "bid_price": np.float64,
+    "bid_qty": np.float32,
+    "ask_price": np.float64,
+    "ask_qty": np.float32,
+}
+
+RAW_SIGNALS_DTYPES = {
+    "signal_strength": np.float64,
+}
+
+
+def validated_quotes_schema(precision="float64"):
+    """
+    Column dtypes of the validated quote data.
+
+    Parameters
+    ----------
+    precision : str, optional
+        Price precision mode, one of PRICE_DTYPES. Default is "float64".
+
+    Returns
+    -------
+    dict
+        Mapping of column name to dtype.
+    """
+    price_dtype = PRICE_DTYPES[precision]
+    return {
+        "timestamp": TIMESTAMP_DTYPE,
+        "bid_price": price_dtype,
+        "bid_qty": QTY_DTYPE,
+        "ask_price": price_dtype,
+        "ask_qty": QTY_DTYPE,
+        "spread_flag": FLAG_DTYPE,
+    }
+
+
+def validated_signals_schema(precision="float64"):
+    """
+    Column dtypes of the validated signal data.
+
+    Parameters
+    ----------
+    precision : str, optional
+        Precision mode, one of PRICE_DTYPES. Default is "float64".
+
+    Returns
+    -------
+    dict
+        Mapping of column name to dtype.
+    """
+    return {
+        "timestamp": TIMESTAMP_DTYPE,
+        "signal_strength": PRICE_DTYPES[precision],
+    }
+
+
+def matched_schema(precision="float64"):
+    """
+    Column dtypes of the matched (quotes + signals) data.
+    The string `action` column is not part of the schema; `action_int` carries it.
+
+    Parameters
+    ----------
+    precision : str, optional
+        Precision mode, one of PRICE_DTYPES. Default is "float64".
+
+    Returns
+    -------
+    dict
+        Mapping of column name to dtype.
+    """
+    schema = validated_quotes_schema(precision)
+    schema["signal_strength"] = PRICE_DTYPES[precision]
+    schema["action_int"] = FLAG_DTYPE
+    return schema
+
+
+def results_schema(price_dtype=np.float64):
+    """
+    Column dtypes of the simulation results.
+
+    Prices follow the dtype of the input quotes, PnL and probabilities are kept
+    in float64. Sizes and positions are int32 whenever they are integral.
+
+    Parameters
+    ----------
+    price_dtype : numpy.dtype, optional
+        Dtype of the price columns. Default is float64.
+
+    Returns
+    -------
+    dict
+        Mapping of column name to dtype.
+    """
+    schema = {
+        "signal": FLAG_DTYPE,
+        "exchange_time": TIMESTAMP_DTYPE,
+        "order_sent_time": TIMESTAMP_DTYPE,
+        "mid_price": np.float64,
+        "slippage": np.float64,
+        "gross_pnl": np.float64,
+        "net_pnl": np.float64,
+        "max_drawdown": np.float64,
+        "peak_pnl": np.float64,
+        "realized_pnl": np.float64,
+        "unrealized_pnl": np.float64,
+        "prob_exec": np.float64,
+        "price_aggressiveness": np.float64,
+        "num_of_trades": FLAG_DTYPE,
+        "num_of_opened_trades": FLAG_DTYPE,
+        "num_of_closed_trades": FLAG_DTYPE,
+        "spread_flag": FLAG_DTYPE,
+        "long_position": QTY_DTYPE,
+        "short_position": QTY_DTYPE,
+    }
+    for side in ("close_long", "close_short", "open_short", "open_long"):
+        schema[f"{side}_sent_price"] = price_dtype
+        schema[f"{side}_fill_price"] = price_dtype
+        schema[f"filled_{side}_size"] = QTY_DTYPE
+    return schema
+
+
+def apply_schema(df, schema):
+    """
+    Cast the columns of a DataFrame to the given dtypes.
+
+    Columns missing from the DataFrame are ignored, columns not in the schema
+    are left untouched. Float columns holding non-integral values are not cast
+    to an integer dtype (e.g. fractional order sizes stay float).
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        DataFrame to cast.
+    schema : dict
+        Mapping of column name to dtype.
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame with the schema dtypes applied.
+    """
+    dtypes = {}
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        if np.issubdtype(np.dtype(dtype), np.integer) and df[col].dtype.kind == "f":
+            if not np.all(np.mod(df[col].to_numpy(), 1) == 0):
+                continue
+        dtypes[col] = dtype
+    return df.astype(dtypes, copy=False)
+
+
+def resolve_precision(df, precision, price_columns=("bid_price", "ask_price")):
+    """
+    Check that the requested price precision keeps all distinct prices distinct.
+
+    Rounding is monotonic, so if no two distinct prices collapse to the same
+    value, every bid/ask comparison in the simulator keeps its outcome.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        DataFrame holding the price columns in full precision.
+    precision : str
+        Requested precision mode, one of PRICE_DTYPES.
+    price_columns : tuple of str, optional
+        Price columns to check.
+
+    Returns
+    -------
+    str
+        The requested precision mode, or "float64" if it would merge prices.
+    """
+    if precision not in PRICE_DTYPES:
+        raise ValueError(f"Unknown precision mode '{precision}'. Expected one of {list(PRICE_DTYPES)}.")
+
+    if precision == "float64":
+        return precision
+
+    prices = np.concatenate([df[col].to_numpy(dtype=np.float64) for col in price_columns])
+    distinct_prices = np.unique(prices)
+    if np.unique(distinct_prices.astype(PRICE_DTYPES[precision])).size != distinct_prices.size:
+        logger.warning(f"FLAG: {precision} prices would merge distinct price levels. Falling back to float64.")
+        return "float64"
+
+    return precision
+
+
+def memory_per_row(df):
+    """Return the in-memory size of a DataFrame in bytes per row."""
+    if len(df) == 0:
+        return 0.0
+    return df.memory_usage(index=False, deep=True).sum() / len(df)
+
+
+def log_memory_reduction(stage, before, after):
+    """Log the bytes per row of a stage before and after applying its schema."""
+    reduction = (1 - after / before) * 100 if before else 0.0
+    logger.info(f"MEMORY: {stage} {before:.1f} -> {after:.1f} bytes/row ({reduction:.1f}% smaller).")
+
+
+# Filled size columns of the results, summed into the traded quantity of pnl_error_bound()
+FILLED_SIZE_COLUMNS = ["filled_close_long_size", "filled_close_short_size", "filled_open_short_size", "filled_open_long_size"]
+
+
+def pnl_error_bound(results_df, max_abs_price, precision):
+    """
+    Upper bound of the PnL error caused by storing prices at the given precision.
+
+    Every stored price carries a relative error of at most the unit roundoff u
+    of its dtype. PnL is computed in float64 from traded quantities and the
+    marked position, so the absolute PnL error is bounded by
+    u * max|price| * (total traded quantity + max open long + short position).
+
+    Parameters
+    ----------
+    results_df : pandas.DataFrame
+        Simulation results.
+    max_abs_price : float
+        Largest absolute price in the quote data.
+    precision : str
+        Price precision mode, one of PRICE_DTYPES.
+
+    Returns
+    -------
+    float
+        Upper bound of the absolute PnL error.
+    """
+    if results_df.empty:
+        return 0.0
+
+    traded_qty = results_df[FILLED_SIZE_COLUMNS].to_numpy(dtype=np.float64).sum()
+    max_position = (results_df["long_position"] + results_df["short_position"]).max()
+    return price_error_bound(max_abs_price, precision, traded_qty, max_position)
+
+
+def price_error_bound(max_abs_price, precision, traded_qty, max_position):
+    """pnl_error_bound() from the total traded quantity and the max open long + short position."""
+    return PRICE_UNIT_ROUNDOFF[precision] * max_abs_price * (traded_qty + max_position)
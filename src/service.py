@@ -0,0 +1,380 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from logger_config import logger, log_blank_line
+from calibration import apply_overlay
+from market_features import MarketFeatures
+from metrics import RealTimePnL, summarize_results
+from partitions import resolve_data_files
+from signal_integration import integrate_signals
+from simulator import event_simulation, simulation_params
+from validation import validate_quotes, validate_signals
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+config_path = os.path.join(PROJECT_ROOT, "config", "config.json")
+
+# Config keys that change the validated, matched data (everything else only changes the simulation). The time
+# range and signal strength threshold are not among them: requests slice and reclassify the cached data instead.
+DATA_CONFIG_KEYS = {
+    "data": ["signals_csv_path", "quotes_csv_path", "precision_mode"],
+    "validation": None,
+}
+
+# Request latencies kept for the status percentiles
+LATENCY_WINDOW = 1000
+
+
+def request_config(config, request):
+    """Config of one request: the base config with its "overrides" sections and "start" / "end" time range applied."""
+    config = apply_overlay(config, request.get("overrides", {}))
+    if request.get("start") is not None or request.get("end") is not None:
+        time_range = config["data"].get("time_range") or {}
+        config = apply_overlay(config, {"data": {"time_range": {"start": request.get("start", time_range.get("start")),
+                                                                "end": request.get("end", time_range.get("end"))}}})
+    return config
+
+
+
+def data_fingerprint(config, project_root=PROJECT_ROOT):
+    """
+    Key of the matched data a config produces.
+
+    Covers the data-related config keys (DATA_CONFIG_KEYS) and the path, size
+    and modification time of every input file, so an edited or appended file
+    gets a new key without hashing its contents on every request.
+    """
+    data_config = {section: {key: value for key, value in config.get(section, {}).items() if keys is None or key in keys}
+                   for section, keys in DATA_CONFIG_KEYS.items()}
+    files = []
+    for name in ("signals_csv_path", "quotes_csv_path"):
+        for path in resolve_data_files(os.path.join(project_root, config["data"][name])):
+            paths = sorted(str(file) for file in Path(path).rglob("*") if file.is_file()) if os.path.isdir(path) else [path]
+            files.extend((file, os.stat(file).st_size, os.stat(file).st_mtime_ns) for file in paths)
+
+    canonical = json.dumps({"config": data_config, "files": files}, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+
+def load_matched(config, project_root=PROJECT_ROOT):
+    """
+    Validate the quotes and signals of a config and match them, as the validate / integrate stages of main.py do.
+
+    Returns
+    -------
+    tuple
+        (matched_df, features) with the MarketFeatures of the matched quotes.
+    """
+    data_config, validation_config = config["data"], config["validation"]
+    time_range = data_config.get("time_range") or {}
+    time_range = (time_range.get("start"), time_range.get("end"))
+    precision = data_config.get("precision_mode", "float64")
+    plots_dir_path = os.path.join(project_root, config["output"]["plots"])
+    os.makedirs(plots_dir_path, exist_ok=True)
+
+    quotes_validated_df = validate_quotes(os.path.join(project_root, data_config["quotes_csv_path"]), None, validation_config["k"],
+                                          plots_dir_path, precision, validation_config.get("spread_flag_method", "global"),
+                                          validation_config.get("spread_window"), validation_config.get("spread_halflife"),
+                                          time_range, validation_config.get("external_sort_rows"),
+                                          validation_config.get("external_sort_dir"))
+    plt.close("all")
+    signals_validated_df = validate_signals(os.path.join(project_root, data_config["signals_csv_path"]), None, None, precision,
+                                            quote_timestamps=quotes_validated_df["timestamp"], time_range=time_range)
+    matched_df = integrate_signals(quotes_validated_df, signals_validated_df, None, config["simulation"]["strength_threshold"])
+    return matched_df, MarketFeatures.from_quotes(matched_df)
+
+
+
+def select_matched(matched_df, features, config):
+    """
+    Rows and actions of one request, taken from cached matched data.
+
+    Keeps the rows in the config's data.time_range and reclassifies
+    action_int at its simulation.strength_threshold as integrate_signals()
+    does, without validating the data again. The spread flags stay those of
+    the cached data, i.e. computed over the service's configured range.
+
+    Returns
+    -------
+    tuple
+        (matched_df, features); the cached features are reused when no rows are dropped.
+    """
+    time_range = config["data"].get("time_range") or {}
+    start, end = time_range.get("start"), time_range.get("end")
+    if start is not None or end is not None:
+        timestamps = matched_df["timestamp"]
+        in_range = np.ones(len(matched_df), dtype=bool)
+        if start is not None:
+            in_range &= (timestamps >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            in_range &= (timestamps < pd.Timestamp(end)).to_numpy()
+        if not in_range.all():
+            matched_df = matched_df[in_range].reset_index(drop=True)
+            features = MarketFeatures.from_quotes(matched_df)
+
+    threshold = config["simulation"]["strength_threshold"]
+    strength = matched_df["signal_strength"].to_numpy()
+    actions = np.select([strength > threshold, strength < -threshold], [1, -1], default=0).astype(matched_df["action_int"].dtype)
+    if not np.array_equal(actions, matched_df["action_int"].to_numpy()):
+        matched_df = matched_df.assign(action_int=actions)
+    return matched_df, features
+
+
+
+class MatchedDataCache:
+    """
+    LRU cache of (matched DataFrame, MarketFeatures) keyed by data_fingerprint().
+
+    Loads of the same key run one at a time, so concurrent requests for the
+    same new data wait for a single load instead of validating it twice;
+    loads of different keys run in parallel.
+    """
+
+    def __init__(self, max_entries=4):
+        self.max_entries = max(int(max_entries), 1)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+        return None
+
+    def get(self, key, loader):
+        """Return (entry, hit), loading and inserting the entry on a miss and evicting the least recently used one."""
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry, True
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry, True
+            try:
+                entry = loader()
+            except BaseException:
+                with self._lock:
+                    self._load_locks.pop(key, None)
+                raise
+            with self._lock:
+                self.misses += 1
+                self.entries[key] = entry
+                self._load_locks.pop(key, None)
+                while len(self.entries) > self.max_entries:
+                    evicted, _ = self.entries.popitem(last=False)
+                    logger.info(f"INFO: Evicted matched data {evicted} from the cache.")
+            return entry, False
+
+    def status(self):
+        with self._lock:
+            return {"entries": list(self.entries), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses,
+                    "rows": {key: len(matched_df) for key, (matched_df, _) in self.entries.items()}}
+
+
+
+class SimulationService:
+    """
+    Resident simulator keeping validated, matched data in memory.
+
+    Each request is a JSON object with optional "overrides" (config sections
+    merged over config.json, e.g. {"simulation": {"seed": 3}}) and "start" /
+    "end" time range. It runs on a worker thread pool with the event-driven
+    engine and a private RNG seeded as a standalone run, and returns the
+    summary metrics of main.py's run with the same config, plus its queue,
+    run and total time.
+    """
+
+    def __init__(self, config, project_root=PROJECT_ROOT, max_workers=None, cache_entries=4):
+        self.config = config
+        self.project_root = project_root
+        self.cache = MatchedDataCache(cache_entries)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="simulation")
+        self.latencies_ms = deque(maxlen=LATENCY_WINDOW)
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def simulate(self, request, submitted_at=None):
+        """Run one request in the calling thread and return its response dict."""
+        started_at = time.perf_counter()
+        submitted_at = started_at if submitted_at is None else submitted_at
+
+        config = request_config(self.config, request)
+        key = data_fingerprint(config, self.project_root)
+        # The cached data covers the configured time range; the request's range and threshold are applied to it
+        load_config = apply_overlay(config, {"data": {"time_range": self.config["data"].get("time_range")}})
+        (matched_df, features), hit = self.cache.get(key, lambda: load_matched(load_config, self.project_root))
+        matched_df, features = select_matched(matched_df, features, config)
+
+        params = simulation_params(config["simulation"])
+        pnl_obj = RealTimePnL(config["simulation"]["commision_per_trade"])
+        results_df, signal_count = event_simulation(matched_df, pnl_obj=pnl_obj, per_tick=False, features=features,
+                                                    rng=np.random.RandomState(params["seed"]), **params)
+        metrics = summarize_results(results_df)
+
+        finished_at = time.perf_counter()
+        return {"metrics": {name: _json_value(value) for name, value in metrics.items()},
+                "num_of_signals": int(signal_count), "data_key": key, "cache_hit": hit,
+                "queue_ms": (started_at - submitted_at) * 1000, "run_ms": (finished_at - started_at) * 1000,
+                "total_ms": (finished_at - submitted_at) * 1000}
+
+    def _run(self, request, submitted_at):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            response = self.simulate(request, submitted_at)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.running -= 1
+
+        with self._lock:
+            self.completed += 1
+            self.latencies_ms.append(response["total_ms"])
+        logger.info(f"INFO: Request on {response['data_key']} ({'cached' if response['cache_hit'] else 'loaded'}) "
+                    f"in {response['total_ms']:.1f} ms (queued {response['queue_ms']:.1f} ms): net PnL {response['metrics']['net_pnl']}.")
+        return response
+
+    def submit(self, request):
+        """Queue a request on the worker pool; returns a Future of its response."""
+        with self._lock:
+            self.queued += 1
+        return self.pool.submit(self._run, request, time.perf_counter())
+
+    def status(self):
+        """Queue depth, request counts, latency percentiles (ms) of recent requests and cache contents."""
+        with self._lock:
+            latencies = np.array(self.latencies_ms)
+            status = {"queue_depth": self.queued, "running": self.running, "completed": self.completed, "failed": self.failed}
+        if len(latencies):
+            status["latency_ms"] = {"p50": float(np.percentile(latencies, 50)), "p90": float(np.percentile(latencies, 90)),
+                                    "p99": float(np.percentile(latencies, 99)), "max": float(latencies.max())}
+        status["cache"] = self.cache.status()
+        return status
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+
+def _json_value(value):
+    """NumPy scalars to Python, NaN to None (JSON has no NaN)."""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+
+def make_handler(service):
+    """HTTP handler class serving POST /simulate and GET /status for a SimulationService."""
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/status":
+                self._send_json(200, service.status())
+            else:
+                self._send_json(404, {"error": f"Unknown path {self.path}. Use POST /simulate or GET /status."})
+
+        def do_POST(self):
+            if self.path != "/simulate":
+                self._send_json(404, {"error": f"Unknown path {self.path}. Use POST /simulate or GET /status."})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError as e:
+                self._send_json(400, {"error": f"Invalid JSON request: {e}"})
+                return
+            try:
+                self._send_json(200, service.submit(request).result())
+            except Exception as e:
+                logger.info(f"FLAG: Request failed: {e!r}")
+                self._send_json(500, {"error": repr(e)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Warm simulation service: keeps matched data in memory and answers "
+                                                 "simulation requests over HTTP on localhost.")
+    parser.add_argument("--host", help="Address to listen on (overrides service.host).")
+    parser.add_argument("--port", type=int, help="Port to listen on (overrides service.port).")
+    parser.add_argument("--workers", type=int, help="Simulation worker threads (overrides service.max_workers).")
+    parser.add_argument("--cache-entries", type=int, help="Matched datasets kept in memory (overrides service.cache_entries).")
+    parser.add_argument("--no-preload", action="store_true", help="Do not load the data of config.json at startup.")
+    return parser.parse_args()
+
+
+
+def main(args):
+    with open(config_path, "r") as f:
+        config = json.load(f)
+    service_config = config.get("service", {})
+    host = args.host or service_config.get("host", "127.0.0.1")
+    port = args.port if args.port is not None else service_config.get("port", 8765)
+    # Nothing is shown; validation still saves the spread histogram of every load
+    plt.switch_backend("Agg")
+
+    service = SimulationService(config, PROJECT_ROOT, args.workers or service_config.get("max_workers"),
+                                args.cache_entries or service_config.get("cache_entries", 4))
+    if not args.no_preload:
+        service.simulate({})
+
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    log_blank_line()
+    logger.info(f"INFO: Simulation service listening on http://{host}:{server.server_address[1]} (POST /simulate, GET /status).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+
+if __name__ == "__main__":
+    main(parse_args())
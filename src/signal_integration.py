@@ -1,5 +1,7 @@
 import pandas as pd
+import numpy as np
 from logger_config import logger, log_blank_line
+from schema import matched_schema, apply_schema
 
 
 def classify_signal(strength, threshold):
@@ -19,17 +21,14 @@ def integrate_signals(quotes_validated_df,signals_validated_df,matched_csv_path,
 
     merged = pd.merge(quotes_validated_df, signals_validated_df, on="timestamp", how="left")
     merged["signal_strength"] = merged["signal_strength"].fillna(0)
-    merged["action"] = merged["signal_strength"].apply(lambda x: classify_signal(x, threshold=strength_threshold))
 
+    # Same rule as classify_signal, vectorized: Buy = 1, Sell = -1, Hold = 0
+    strength = merged["signal_strength"].to_numpy()
+    merged["action_int"] = np.select([strength > strength_threshold, strength < -strength_threshold], [1, -1], default=0)
+    merged = apply_schema(merged, matched_schema(str(merged["bid_price"].dtype)))
 
-    action_map = {
-    "Buy": 1,
-    "Sell": -1,
-    "Hold": 0}
-
-    merged['action_int'] = merged['action'].map(action_map)
-
-    merged.to_csv(matched_csv_path, index=False)
+    if matched_csv_path is not None:
+        merged.to_csv(matched_csv_path, index=False)
 
     logger.info(f"INFO: Signal integration and classification completed successfully.")
 
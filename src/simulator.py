@@ -1,8 +1,10 @@
 import time
 import pandas as pd
 import numpy as np
-from copy import deepcopy
 from logger_config import logger, log_blank_line, log_once
+from schema import results_schema, apply_schema
+from results_buffer import ResultsBuffer
+from checkpoint import input_fingerprint, params_fingerprint
 
 
      
@@ -95,326 +97,785 @@ def order_generator(signal, best_bid_price, best_ask_price, long_position, short
 
 
 
-def simulation(merged_df, open_order_size, pnl_obj, spread_penalty_factor, cb, ca, min_price_aggressiveness, seed, min_exec_prob_threshold):
+def readonly_column(df, column):
     """
-    Run a full trading simulation cycle using the order generation and PnL update modules.
+    Return a write-protected NumPy view of a DataFrame column.
+
+    The view shares memory with the DataFrame (no copy for single-dtype columns),
+    and any attempt to write through it raises ValueError.
+    """
+    values = df[column].to_numpy().view()
+    values.flags.writeable = False
+    return values
+
+
+
+def build_exchange_index(timestamps):
+    """
+    Prepare the exchange timestamp lookup used to match an order to its execution tick.
 
     Parameters
     ----------
-    merged_df : pandas.DataFrame
-        Combined DataFrame containing timestamped bid/ask prices, quantities, and signal actions.
-    open_order_size : int or float
-        Order size to be sent for each trading action.
-    pnl_obj : RealTimePnL
-        Instance of the RealTimePnL class used to update PnL and position states.
-    spread_penalty_factor : float
-        Factor applied to execution probability when spread is wide or flagged abnormal.
-    cb : float
-        Coefficient controlling bid-side aggressiveness scaling.
-    ca : float
-        Coefficient controlling ask-side aggressiveness scaling.
-    min_price_aggressiveness : float
-        Minimum aggressiveness threshold for execution probability.
-    min_exec_prob_threshold : float
-        Minimum execution probability required for an order to be filled.
+    timestamps : numpy.ndarray
+        Quote timestamps in row order.
 
     Returns
     -------
     tuple
-        (results_df, total_received_signal_count)
-        - results_df : pandas.DataFrame
-            DataFrame containing detailed trade logs, including prices, fills, PnL, slippage, and position data.
-        - total_received_signal_count : int
-            Total number of trading signals processed during the simulation.
+        (sorted_timestamps, order) where order maps positions in sorted_timestamps
+        back to row positions, or is None when the timestamps are already sorted.
     """
+    if len(timestamps) < 2 or bool(np.all(timestamps[1:] >= timestamps[:-1])):
+        return timestamps, None
 
-    np.random.seed(seed)
-    exchange_df = deepcopy(merged_df)
-    trader_df = deepcopy(merged_df)
+    # Stable sort keeps the first row of equal timestamps first, as .loc[...].iloc[0] does
+    order = np.argsort(timestamps, kind="stable")
+    return timestamps[order], order
 
-    # Convert to numpy arrays for efficient iteration
-    timestamps = trader_df["timestamp"].to_numpy()
-    bid_prices = trader_df["bid_price"].to_numpy()
-    ask_prices = trader_df["ask_price"].to_numpy()
-    signals = trader_df["action_int"].to_numpy()
 
-    long_position = 0
-    short_position = 0
-    log_records = []
 
-    # data_end_time = timestamps.max() 
-    total_num_of_trades = 0
-    total_open_count = 0
-    total_close_count = 0
-    buy_signal_count = (trader_df["action_int"] == 1).sum()
-    sell_signal_count = (trader_df["action_int"] == -1).sum()
-    total_received_signal_count = buy_signal_count + sell_signal_count
+def find_exchange_row(sorted_timestamps, order, exec_time):
+    """Return the row index of the first quote at exactly exec_time, or -1 if there is none."""
+    pos = np.searchsorted(sorted_timestamps, exec_time, side="left")
+    if pos == len(sorted_timestamps) or sorted_timestamps[pos] != exec_time:
+        return -1
+    return int(pos) if order is None else int(order[pos])
 
-    for ts, best_bid_price, best_ask_price, signal in zip(timestamps, bid_prices, ask_prices, signals):
 
-        order_dict = order_generator(signal, best_bid_price, best_ask_price, long_position, short_position, open_order_size)
-        order_sent_time = ts
 
-        open_long_size = order_dict["open_long_size"] 
-        close_long_size = order_dict["close_long_size"]
-        open_short_size = order_dict["open_short_size"]
-        close_short_size = order_dict["close_short_size"]
-        sent_order_price = order_dict["sent_order_price"]
-        signal = order_dict["signal"]
-        
+def check_features(features, timestamps):
+    """Raise ValueError unless a MarketFeatures was computed for these quote rows."""
+    if len(features) != len(timestamps) or not np.array_equal(features.timestamps, timestamps):
+        raise ValueError(f"Market features of {len(features)} quote(s) do not belong to the {len(timestamps)} simulated quote(s).")
 
-        
-        # ====================== EXCHANGE ===============================================================
 
-        # Checking whether any orders have been received
-        order_generated = open_long_size>0 or close_long_size>0 or open_short_size>0 or close_short_size>0
 
-        exec_time = order_sent_time + np.timedelta64(1, "s") 
-        matched_event = exchange_df.loc[exchange_df["timestamp"] == exec_time]
+def latency_offset(latency_in_secs):
+    """Order-to-exchange latency in seconds as a nanosecond timedelta64, added to the order sent time."""
+    return np.timedelta64(int(round(latency_in_secs * 1e9)), "ns")
 
-        # If we want match with clostset data point instead of just cancelling
-        # while order_generated and matched_event.empty:
-        #     logger.info(f"waiting for matching")
-        #     exec_time = exec_time + np.timedelta64(1, "s")
-        #     matched_event = exchange_df.loc[exchange_df["timestamp"] == exec_time]
-        #     if exec_time>=data_end_time:
-        #         break
 
-        if not matched_event.empty:
 
-            filled_open_long_size = filled_close_long_size = filled_open_short_size = filled_close_short_size = 0
+def find_exchange_rows(sorted_timestamps, order, exec_times):
+    """Vectorized find_exchange_row(): row index per exec time, -1 where there is no quote."""
+    pos = np.searchsorted(sorted_timestamps, exec_times, side="left")
+    clipped = np.minimum(pos, max(len(sorted_timestamps) - 1, 0))
+    found = (pos < len(sorted_timestamps)) & (sorted_timestamps[clipped] == exec_times) if len(sorted_timestamps) else pos < 0
+    rows = clipped if order is None else order[clipped]
+    return np.where(found, rows, -1)
 
-            close_long_sent_price = 0.0
-            close_long_fill_price = 0.0
-            close_short_sent_price = 0.0
-            close_short_fill_price = 0.0
-            open_short_sent_price = 0.0
-            open_short_fill_price = 0.0
-            open_long_sent_price = 0.0
-            open_long_fill_price = 0.0
 
-            prob_exec = 0.0
-            price_aggressiveness = 0.0
 
-            market_ask_price = matched_event["ask_price"].iloc[0]
-            market_bid_price = matched_event["bid_price"].iloc[0]
-            available_ask_qty = matched_event["ask_qty"].iloc[0]
-            available_bid_qty = matched_event["bid_qty"].iloc[0]
-            spread_flag = matched_event["spread_flag"].iloc[0]
-            
-            order_slippage = 0.0 
-            slippage = 0.0 
+# Columns of the simulation results, in the order of result_record()
+RESULT_COLUMNS = (
+    "signal", "exchange_time", "order_sent_time", "mid_price", "slippage", "gross_pnl", "net_pnl", "max_drawdown",
+    "peak_pnl", "realized_pnl", "unrealized_pnl", "long_position", "short_position",
+    "close_long_sent_price", "close_long_fill_price", "close_short_sent_price", "close_short_fill_price",
+    "open_short_sent_price", "open_short_fill_price", "open_long_sent_price", "open_long_fill_price",
+    "filled_close_long_size", "filled_close_short_size", "filled_open_short_size", "filled_open_long_size",
+    "prob_exec", "price_aggressiveness", "num_of_trades", "num_of_opened_trades", "num_of_closed_trades", "spread_flag",
+)
+
 
-            if order_generated:
 
-                if close_long_size>0: # ask
-                    if sent_order_price <= market_bid_price:
+def result_record(signal, exec_time, order_sent_time, fills, pnl_and_pos_dict, spread_flag):
+    """Build one row of the simulation results from the fills and PnL update of a tick."""
+    return {
+        "signal":signal,
+        "exchange_time": exec_time,    
+        "order_sent_time": order_sent_time,    
+        "mid_price":fills["mid_price"],
+        "slippage":fills["slippage"],
+        "gross_pnl": pnl_and_pos_dict['gross_pnl'],
+        "net_pnl": pnl_and_pos_dict['net_pnl'],
+        "max_drawdown":pnl_and_pos_dict['max_drawdown'],
+        "peak_pnl":pnl_and_pos_dict['peak_pnl'],
+        "realized_pnl": pnl_and_pos_dict['realized_pnl'],
+        "unrealized_pnl": pnl_and_pos_dict['unrealized_pnl'],
+        "long_position": pnl_and_pos_dict['total_long_pos'],
+        "short_position": pnl_and_pos_dict['total_short_pos'],
+        "close_long_sent_price": fills["close_long_sent_price"],
+        "close_long_fill_price": fills["close_long_fill_price"],
+        "close_short_sent_price": fills["close_short_sent_price"],
+        "close_short_fill_price": fills["close_short_fill_price"],
+        "open_short_sent_price": fills["open_short_sent_price"],
+        "open_short_fill_price": fills["open_short_fill_price"],
+        "open_long_sent_price": fills["open_long_sent_price"],
+        "open_long_fill_price": fills["open_long_fill_price"],
+        "filled_close_long_size": fills["filled_close_long_size"],
+        "filled_close_short_size": fills["filled_close_short_size"],
+        "filled_open_short_size": fills["filled_open_short_size"],
+        "filled_open_long_size": fills["filled_open_long_size"],
+        "prob_exec":fills["prob_exec"],
+        "price_aggressiveness":fills["price_aggressiveness"],
+        "num_of_trades":pnl_and_pos_dict['num_of_trades'],
+        "num_of_opened_trades":pnl_and_pos_dict['num_of_opened_trades'],
+        "num_of_closed_trades":pnl_and_pos_dict['num_of_closed_trades'],
+        "spread_flag":spread_flag
+        }
+
+
+
+def aggressiveness_terms(market_bid_price, market_ask_price, cb, ca, min_price_aggressiveness):
+    """
+    Quote-only terms of the execution probability, for scalars or arrays.
+
+    Returns
+    -------
+    tuple
+        (mid_price, bid_offset, bid_denominator, ask_offset, ask_denominator), where
+        sell-side price_aggressiveness = ((1 - min_price_aggressiveness) * sent_price + bid_offset) / bid_denominator
+        and buy-side uses the ask terms.
+    """
+    mid_price = (market_bid_price + market_ask_price) / 2
+    bid_offset = market_bid_price * ((min_price_aggressiveness * cb) - 1)
+    bid_denominator = market_bid_price * (cb - 1)
+    ask_offset = market_ask_price * ((min_price_aggressiveness * ca) - 1)
+    ask_denominator = market_ask_price * (ca - 1)
+    return mid_price, bid_offset, bid_denominator, ask_offset, ask_denominator
 
-                        logger.info(f"Exchange received close_long order: {close_long_size} unit(s) @{sent_order_price:.2f}.")
-                
-                        # --- Mid-price and slippage ---
-                        mid_price = (market_bid_price + market_ask_price) / 2
 
-                        # Compute execution probability
-                        price_aggressiveness = (((1-min_price_aggressiveness)*(sent_order_price))+(market_bid_price*((min_price_aggressiveness*cb)-1)))/(market_bid_price*(cb-1))
-                        price_aggressiveness = np.clip(price_aggressiveness, 0, 1.0)
-                        penalty = spread_penalty_factor if spread_flag == 1 else 1.0
-                        prob_exec = penalty * price_aggressiveness
 
-                        # if prob_exec >= min_exec_prob_threshold and available_bid_qty > 0:
-                        rand_val = np.random.random()
-                        if rand_val < prob_exec and available_bid_qty > 0:
+def exchange_fill(order_dict, market, mid_price, best_bid_price, best_ask_price, spread_penalty_factor, cb, ca, min_price_aggressiveness,
+                  random=np.random.random, quote_terms=None):
+    """
+    Match one tick's orders against the exchange quote and decide their fills.
 
-                            logger.info(f"close_long order FILLED: {close_long_size} unit(s) @{market_bid_price:.2f} ")
+    Parameters
+    ----------
+    order_dict : dict
+        Orders returned by order_generator().
+    market : tuple
+        (market_bid_price, market_ask_price, available_bid_qty, available_ask_qty, spread_flag)
+        of the quote at the execution time.
+    mid_price : float
+        Mid price reported for the previous order, kept when no order reaches the exchange.
+    best_bid_price, best_ask_price : float
+        Quote the orders were generated from.
+    spread_penalty_factor, cb, ca, min_price_aggressiveness : float
+        Execution probability parameters, as in simulation().
+    random : callable, optional
+        Source of uniform [0, 1) draws, one per order reaching the exchange.
+        Default is the global NumPy RNG.
+    quote_terms : numpy.ndarray, optional
+        Precomputed aggressiveness_terms() of the market quote, e.g. a row of
+        MarketFeatures.aggressiveness(). Default is None (computed here).
 
-                            filled_close_long_size = close_long_size if available_bid_qty >= close_long_size else available_bid_qty
-                            available_bid_qty = available_bid_qty - filled_close_long_size
-                            close_long_sent_price = sent_order_price
-                            close_long_fill_price = market_bid_price
+    Returns
+    -------
+    dict
+        Filled sizes, sent / fill prices per order type, prob_exec,
+        price_aggressiveness, slippage and mid_price; order_prob_exec maps
+        each order type that reached the exchange to its own prob_exec.
+    """
+    open_long_size = order_dict["open_long_size"] 
+    close_long_size = order_dict["close_long_size"]
+    open_short_size = order_dict["open_short_size"]
+    close_short_size = order_dict["close_short_size"]
+    sent_order_price = order_dict["sent_order_price"]
+    market_bid_price, market_ask_price, available_bid_qty, available_ask_qty, spread_flag = market
+
+    # Checking whether any orders have been received
+    order_generated = open_long_size>0 or close_long_size>0 or open_short_size>0 or close_short_size>0
+
+    filled_open_long_size = filled_close_long_size = filled_open_short_size = filled_close_short_size = 0
+
+    close_long_sent_price = 0.0
+    close_long_fill_price = 0.0
+    close_short_sent_price = 0.0
+    close_short_fill_price = 0.0
+    open_short_sent_price = 0.0
+    open_short_fill_price = 0.0
+    open_long_sent_price = 0.0
+    open_long_fill_price = 0.0
+
+    prob_exec = 0.0
+    price_aggressiveness = 0.0
+    order_prob_exec = {}
+
+    order_slippage = 0.0 
+    slippage = 0.0 
+
+    if order_generated:
+        if quote_terms is None:
+            quote_terms = aggressiveness_terms(market_bid_price, market_ask_price, cb, ca, min_price_aggressiveness)
+        else:
+            quote_terms = quote_terms.tolist()
+        exchange_mid_price, bid_offset, bid_denominator, ask_offset, ask_denominator = quote_terms
 
-                            order_slippage =  (close_long_fill_price - close_long_sent_price) * filled_close_long_size # Sell side
-                            slippage = slippage + order_slippage
+        if close_long_size>0: # ask
+            if sent_order_price <= market_bid_price:
 
-                            
-                        else:
-                            logger.info(f"close_long order NOT FILLED: (exec_prob={prob_exec:.2f}, available_qty={available_bid_qty}).")   
-                    else:
-                        logger.info(f"close_long order NOT FILLED: sent_order_price({sent_order_price}) > market_bid_price({market_bid_price})")
+                logger.info(f"Exchange received close_long order: {close_long_size} unit(s) @{sent_order_price:.2f}.")
+        
+                # --- Mid-price and slippage ---
+                mid_price = exchange_mid_price
 
+                # Compute execution probability
+                price_aggressiveness = (((1-min_price_aggressiveness)*(sent_order_price))+bid_offset)/bid_denominator
+                price_aggressiveness = np.clip(price_aggressiveness, 0, 1.0)
+                penalty = spread_penalty_factor if spread_flag == 1 else 1.0
+                prob_exec = penalty * price_aggressiveness
+                order_prob_exec["close_long"] = prob_exec
 
-                if close_short_size>0: # bid
-                    if sent_order_price >= market_ask_price: 
+                # if prob_exec >= min_exec_prob_threshold and available_bid_qty > 0:
+                rand_val = random()
+                if rand_val < prob_exec and available_bid_qty > 0:
 
-                        logger.info(f"Exchange received close_short order: {close_short_size} unit(s) @ {sent_order_price:.2f}")
+                    logger.info(f"close_long order FILLED: {close_long_size} unit(s) @{market_bid_price:.2f} ")
 
-                        # --- Mid-price and slippage ---
-                        mid_price = (market_bid_price + market_ask_price) / 2
+                    filled_close_long_size = close_long_size if available_bid_qty >= close_long_size else available_bid_qty
+                    available_bid_qty = available_bid_qty - filled_close_long_size
+                    close_long_sent_price = sent_order_price
+                    close_long_fill_price = market_bid_price
 
-                        # Compute execution probability
-                        price_aggressiveness = (((1 - min_price_aggressiveness) * sent_order_price) + (market_ask_price * ((min_price_aggressiveness * ca) - 1)))/(market_ask_price * (ca - 1))
-                        price_aggressiveness = np.clip(price_aggressiveness, 0, 1.0)
-                        penalty = spread_penalty_factor if spread_flag == 1 else 1.0
-                        prob_exec = penalty * price_aggressiveness
+                    order_slippage =  (close_long_fill_price - close_long_sent_price) * filled_close_long_size # Sell side
+                    slippage = slippage + order_slippage
 
-                        # if prob_exec >= min_exec_prob_threshold and available_ask_qty > 0:
-                        rand_val = np.random.random()
-                        if rand_val < prob_exec and available_ask_qty > 0:
+                    
+                else:
+                    logger.info(f"close_long order NOT FILLED: (exec_prob={prob_exec:.2f}, available_qty={available_bid_qty}).")   
+            else:
+                logger.info(f"close_long order NOT FILLED: sent_order_price({sent_order_price}) > market_bid_price({market_bid_price})")
 
-                            logger.info(f"close_short order FILLED: {close_short_size} unit(s) @{market_ask_price:.2f}")
 
-                            filled_close_short_size = close_short_size if available_ask_qty >= close_short_size else available_ask_qty
-                            available_ask_qty = available_ask_qty - filled_close_short_size
-                            close_short_sent_price = sent_order_price
-                            close_short_fill_price = market_ask_price
+        if close_short_size>0: # bid
+            if sent_order_price >= market_ask_price: 
 
-                            order_slippage = (close_short_sent_price - close_short_fill_price) * filled_close_short_size # Buy side
-                            slippage = slippage + order_slippage
+                logger.info(f"Exchange received close_short order: {close_short_size} unit(s) @ {sent_order_price:.2f}")
 
+                # --- Mid-price and slippage ---
+                mid_price = exchange_mid_price
 
-                        else:    
-                            logger.info(f"close_short order NOT FILLED: (exec_prob={prob_exec:.2f}, available_qty={available_ask_qty}).")
-                    else:
-                        logger.info(f"close_long order NOT FILLED: sent_order_price({sent_order_price}) < market_ask_price({market_ask_price})")
+                # Compute execution probability
+                price_aggressiveness = (((1 - min_price_aggressiveness) * sent_order_price) + ask_offset)/ask_denominator
+                price_aggressiveness = np.clip(price_aggressiveness, 0, 1.0)
+                penalty = spread_penalty_factor if spread_flag == 1 else 1.0
+                prob_exec = penalty * price_aggressiveness
+                order_prob_exec["close_short"] = prob_exec
 
+                # if prob_exec >= min_exec_prob_threshold and available_ask_qty > 0:
+                rand_val = random()
+                if rand_val < prob_exec and available_ask_qty > 0:
 
-                
-                if open_short_size>0: # ask
-                    if sent_order_price <= market_bid_price:
+                    logger.info(f"close_short order FILLED: {close_short_size} unit(s) @{market_ask_price:.2f}")
 
-                        logger.info(f"Exchange received open_short order: {open_short_size} unit(s) @ {sent_order_price:.2f}")
+                    filled_close_short_size = close_short_size if available_ask_qty >= close_short_size else available_ask_qty
+                    available_ask_qty = available_ask_qty - filled_close_short_size
+                    close_short_sent_price = sent_order_price
+                    close_short_fill_price = market_ask_price
 
-                        # --- Mid-price and slippage ---
-                        mid_price = (market_bid_price + market_ask_price) / 2
+                    order_slippage = (close_short_sent_price - close_short_fill_price) * filled_close_short_size # Buy side
+                    slippage = slippage + order_slippage
 
-                        # Compute execution probability
-                        price_aggressiveness = (((1-min_price_aggressiveness)*(sent_order_price))+(market_bid_price*((min_price_aggressiveness*cb)-1)))/(market_bid_price*(cb-1))
-                        price_aggressiveness = np.clip(price_aggressiveness, 0, 1.0)
-                        penalty = spread_penalty_factor if spread_flag == 1 else 1.0
-                        prob_exec = penalty * price_aggressiveness
 
+                else:    
+                    logger.info(f"close_short order NOT FILLED: (exec_prob={prob_exec:.2f}, available_qty={available_ask_qty}).")
+            else:
+                logger.info(f"close_long order NOT FILLED: sent_order_price({sent_order_price}) < market_ask_price({market_ask_price})")
 
-                        # if prob_exec >= min_exec_prob_threshold and available_bid_qty > 0:
-                        rand_val = np.random.random()
-                        if rand_val < prob_exec and available_bid_qty > 0:
 
-                            logger.info(f"open_short order FILLED: {open_short_size} unit(s) @ {market_bid_price:.2f}")
+        
+        if open_short_size>0: # ask
+            if sent_order_price <= market_bid_price:
 
-                            filled_open_short_size = open_short_size if available_bid_qty >= open_short_size else available_bid_qty
-                            available_bid_qty = available_bid_qty - filled_open_short_size
-                            open_short_sent_price = sent_order_price
-                            open_short_fill_price = market_bid_price
+                logger.info(f"Exchange received open_short order: {open_short_size} unit(s) @ {sent_order_price:.2f}")
 
-                            order_slippage = (open_short_fill_price - open_short_sent_price) * filled_open_short_size # Sell side
-                            slippage = slippage + order_slippage
+                # --- Mid-price and slippage ---
+                mid_price = exchange_mid_price
 
+                # Compute execution probability
+                price_aggressiveness = (((1-min_price_aggressiveness)*(sent_order_price))+bid_offset)/bid_denominator
+                price_aggressiveness = np.clip(price_aggressiveness, 0, 1.0)
+                penalty = spread_penalty_factor if spread_flag == 1 else 1.0
+                prob_exec = penalty * price_aggressiveness
+                order_prob_exec["open_short"] = prob_exec
 
-                        else:
-                            logger.info(f"open_short order NOT FILLED: (exec_prob={prob_exec:.2f}, available_qty={available_bid_qty}).")
-                    else:
-                        logger.info(f"close_long order NOT FILLED: sent_order_price({sent_order_price}) > market_bid_price({market_bid_price})")
 
+                # if prob_exec >= min_exec_prob_threshold and available_bid_qty > 0:
+                rand_val = random()
+                if rand_val < prob_exec and available_bid_qty > 0:
 
+                    logger.info(f"open_short order FILLED: {open_short_size} unit(s) @ {market_bid_price:.2f}")
 
-                if open_long_size>0: # bid
-                    if sent_order_price >= market_ask_price: 
+                    filled_open_short_size = open_short_size if available_bid_qty >= open_short_size else available_bid_qty
+                    available_bid_qty = available_bid_qty - filled_open_short_size
+                    open_short_sent_price = sent_order_price
+                    open_short_fill_price = market_bid_price
 
-                        logger.info(f"Exchange received open_long order: {open_long_size} unit(s) @ {sent_order_price:.2f}")
+                    order_slippage = (open_short_fill_price - open_short_sent_price) * filled_open_short_size # Sell side
+                    slippage = slippage + order_slippage
 
-                        # --- Mid-price and slippage ---
-                        mid_price = (market_bid_price + market_ask_price) / 2
 
-                        # Compute execution probability
-                        price_aggressiveness = (((1 - min_price_aggressiveness) * sent_order_price) + (market_ask_price * ((min_price_aggressiveness * ca) - 1)))/(market_ask_price * (ca - 1))
-                        price_aggressiveness = np.clip(price_aggressiveness, 0, 1.0)
-                        penalty = spread_penalty_factor if spread_flag == 1 else 1.0
-                        prob_exec = penalty * price_aggressiveness
+                else:
+                    logger.info(f"open_short order NOT FILLED: (exec_prob={prob_exec:.2f}, available_qty={available_bid_qty}).")
+            else:
+                logger.info(f"close_long order NOT FILLED: sent_order_price({sent_order_price}) > market_bid_price({market_bid_price})")
 
-                        # if prob_exec >= min_exec_prob_threshold and available_ask_qty > 0:
-                        rand_val = np.random.random()
-                        if rand_val < prob_exec and available_ask_qty > 0:
 
-                            logger.info(f"open_long order FILLED: {open_long_size} unit(s) @ {market_ask_price:.2f}")
 
-                            filled_open_long_size = open_long_size if available_ask_qty >= open_long_size else available_ask_qty
-                            available_ask_qty = available_ask_qty - filled_open_long_size
-                            open_long_sent_price = sent_order_price
-                            open_long_fill_price = market_ask_price
+        if open_long_size>0: # bid
+            if sent_order_price >= market_ask_price: 
 
-                            slippage = slippage + order_slippage
-                            order_slippage = (open_long_sent_price - open_long_fill_price) * filled_open_long_size # Sell side
+                logger.info(f"Exchange received open_long order: {open_long_size} unit(s) @ {sent_order_price:.2f}")
 
+                # --- Mid-price and slippage ---
+                mid_price = exchange_mid_price
 
-                        else:
-                            logger.info(f"open_long order NOT FILLED: (exec_prob={prob_exec:.2f}, available_qty={available_ask_qty}).")
-                    else:
-                        logger.info(f"close_long order NOT FILLED: sent_order_price({sent_order_price}) < market_ask_price({market_ask_price})")
+                # Compute execution probability
+                price_aggressiveness = (((1 - min_price_aggressiveness) * sent_order_price) + ask_offset)/ask_denominator
+                price_aggressiveness = np.clip(price_aggressiveness, 0, 1.0)
+                penalty = spread_penalty_factor if spread_flag == 1 else 1.0
+                prob_exec = penalty * price_aggressiveness
+                order_prob_exec["open_long"] = prob_exec
 
+                # if prob_exec >= min_exec_prob_threshold and available_ask_qty > 0:
+                rand_val = random()
+                if rand_val < prob_exec and available_ask_qty > 0:
+
+                    logger.info(f"open_long order FILLED: {open_long_size} unit(s) @ {market_ask_price:.2f}")
+
+                    filled_open_long_size = open_long_size if available_ask_qty >= open_long_size else available_ask_qty
+                    available_ask_qty = available_ask_qty - filled_open_long_size
+                    open_long_sent_price = sent_order_price
+                    open_long_fill_price = market_ask_price
+
+                    slippage = slippage + order_slippage
+                    order_slippage = (open_long_sent_price - open_long_fill_price) * filled_open_long_size # Sell side
+
+
+                else:
+                    logger.info(f"open_long order NOT FILLED: (exec_prob={prob_exec:.2f}, available_qty={available_ask_qty}).")
             else:
-                logger.info(f"No new orders received...")
-                mid_price = (best_bid_price + best_ask_price) / 2
-                   
+                logger.info(f"close_long order NOT FILLED: sent_order_price({sent_order_price}) < market_ask_price({market_ask_price})")
+
+    else:
+        logger.info(f"No new orders received...")
+        mid_price = (best_bid_price + best_ask_price) / 2
+
+    return {
+        "mid_price": mid_price,
+        "slippage": slippage,
+        "close_long_sent_price": close_long_sent_price,
+        "close_long_fill_price": close_long_fill_price,
+        "close_short_sent_price": close_short_sent_price,
+        "close_short_fill_price": close_short_fill_price,
+        "open_short_sent_price": open_short_sent_price,
+        "open_short_fill_price": open_short_fill_price,
+        "open_long_sent_price": open_long_sent_price,
+        "open_long_fill_price": open_long_fill_price,
+        "filled_close_long_size": filled_close_long_size,
+        "filled_close_short_size": filled_close_short_size,
+        "filled_open_short_size": filled_open_short_size,
+        "filled_open_long_size": filled_open_long_size,
+        "prob_exec": prob_exec,
+        "price_aggressiveness": price_aggressiveness,
+        "order_prob_exec": order_prob_exec,
+    }
+
+
+
+def simulation(merged_df, open_order_size, pnl_obj, spread_penalty_factor, cb, ca, min_price_aggressiveness, seed, min_exec_prob_threshold,
+               latency=1, checkpointer=None, resume=False, results_sink=None, flush_every=100000, features=None):
+    """
+    Run a full trading simulation cycle using the order generation and PnL update modules.
+
+    Parameters
+    ----------
+    merged_df : pandas.DataFrame
+        Combined DataFrame containing timestamped bid/ask prices, quantities, and signal actions.
+        It is read through write-protected views and never copied or modified.
+    open_order_size : int or float
+        Order size to be sent for each trading action.
+    pnl_obj : RealTimePnL
+        Instance of the RealTimePnL class used to update PnL and position states.
+    spread_penalty_factor : float
+        Factor applied to execution probability when spread is wide or flagged abnormal.
+    cb : float
+        Coefficient controlling bid-side aggressiveness scaling.
+    ca : float
+        Coefficient controlling ask-side aggressiveness scaling.
+    min_price_aggressiveness : float
+        Minimum aggressiveness threshold for execution probability.
+    seed : int or None
+        Seed for the global NumPy RNG. None continues the current RNG stream.
+    min_exec_prob_threshold : float
+        Minimum execution probability required for an order to be filled.
+    latency : float, optional
+        Seconds between sending an order and its execution; the order fills against
+        the quote at exactly that time or is cancelled. Default is 1.
+    checkpointer : SimulationCheckpointer, optional
+        Writes periodic checkpoints of the loop state when given. Default is None.
+    resume : bool, optional
+        Continue from the checkpointer's last checkpoint if one exists. The
+        output is identical to an uninterrupted run. A checkpoint written for
+        other input data or other parameters (including the commission of
+        pnl_obj) raises ValueError. Default is False.
+    results_sink : CsvResultsSink or ParquetResultsSink, optional
+        When given, result rows are flushed to the sink every `flush_every` rows
+        instead of being kept in memory. Default is None.
+    flush_every : int, optional
+        Number of buffered result rows per sink write. Default is 100000.
+    features : MarketFeatures, optional
+        Precomputed features of merged_df's quotes (see market_features.py); the
+        exchange rows and execution probability terms are then read from it
+        instead of being computed per tick. Default is None.
+
+    Returns
+    -------
+    tuple
+        (results_df, total_received_signal_count)
+        - results_df : pandas.DataFrame or None
+            DataFrame containing detailed trade logs, including prices, fills, PnL, slippage, and position data.
+            None when the results were written to results_sink.
+        - total_received_signal_count : int
+            Total number of trading signals processed during the simulation.
+    """
+
+    if seed is not None:
+        np.random.seed(seed)
+
+    # Read-only views of the input arrays, shared by the trader and exchange sides
+    timestamps = readonly_column(merged_df, "timestamp")
+    bid_prices = readonly_column(merged_df, "bid_price")
+    ask_prices = readonly_column(merged_df, "ask_price")
+    bid_qtys = readonly_column(merged_df, "bid_qty")
+    ask_qtys = readonly_column(merged_df, "ask_qty")
+    spread_flags = readonly_column(merged_df, "spread_flag")
+    signals = readonly_column(merged_df, "action_int")
+    sorted_timestamps, exchange_order = build_exchange_index(timestamps)
+    exec_rows = quote_terms = None
+    if features is not None:
+        check_features(features, timestamps)
+        exec_rows = features.exec_rows(latency)
+        quote_terms = features.aggressiveness(cb, ca, min_price_aggressiveness)
+
+    # A checkpoint only resumes the run it was written for: same input columns and parameters
+    fingerprints = None
+    if checkpointer is not None:
+        fingerprints = {
+            "input": input_fingerprint(timestamps, bid_prices, ask_prices, bid_qtys, ask_qtys, spread_flags, signals),
+            "params": params_fingerprint({"open_order_size": open_order_size, "spread_penalty_factor": spread_penalty_factor,
+                                          "cb": cb, "ca": ca, "min_price_aggressiveness": min_price_aggressiveness, "seed": seed,
+                                          "min_exec_prob_threshold": min_exec_prob_threshold, "latency": latency,
+                                          "commision_per_trade": pnl_obj.commision_per_trade}),
+        }
+    latency = latency_offset(latency)
+
+    # Start from the positions already held by pnl_obj (zero for a fresh run)
+    long_position = pnl_obj.total_long_position_size
+    short_position = pnl_obj.total_short_position_size
+    buffer_rows = len(timestamps) if results_sink is None else flush_every
+    log_records = ResultsBuffer(results_schema(bid_prices.dtype), buffer_rows)
+    mid_price = np.nan  # mid of the last order that reached the exchange
+    start_row = 0
+    state = checkpointer.load() if checkpointer is not None and resume else None
+
+    if state is not None:
+        if state.get("input") != fingerprints["input"]:
+            raise ValueError(f"Checkpoint {checkpointer.path} was written for different input data.")
+        if state.get("params") != fingerprints["params"]:
+            raise ValueError(f"Checkpoint {checkpointer.path} was written with different simulation parameters.")
+        start_row = state["next_row"]
+        long_position = state["long_position"]
+        short_position = state["short_position"]
+        mid_price = state["mid_price"]
+        pnl_obj.__dict__.update(state["pnl"])
+        np.random.set_state(state["rng"])
+        log_records.restore(state["results"])
+
+    # Results flushed before the checkpoint stay in the sink, later ones are dropped
+    if results_sink is not None:
+        if state is not None and state["sink"] is not None:
+            results_sink.restore(state["sink"])
+        else:
+            results_sink.start()
+
+    # data_end_time = timestamps.max() 
+    total_num_of_trades = 0
+    total_open_count = 0
+    total_close_count = 0
+    buy_signal_count = (signals == 1).sum()
+    sell_signal_count = (signals == -1).sum()
+    total_received_signal_count = buy_signal_count + sell_signal_count
+
+    rows = zip(timestamps[start_row:], bid_prices[start_row:], ask_prices[start_row:], signals[start_row:])
+    for row, (ts, best_bid_price, best_ask_price, signal) in enumerate(rows, start=start_row):
+
+        # Prices may be stored as float32; all order and PnL arithmetic runs in float64
+        best_bid_price, best_ask_price = float(best_bid_price), float(best_ask_price)
+
+        order_dict = order_generator(signal, best_bid_price, best_ask_price, long_position, short_position, open_order_size)
+        order_sent_time = ts
+
+        open_long_size = order_dict["open_long_size"] 
+        close_long_size = order_dict["close_long_size"]
+        open_short_size = order_dict["open_short_size"]
+        close_short_size = order_dict["close_short_size"]
+        signal = order_dict["signal"]
+        
+
+        
+        # ====================== EXCHANGE ===============================================================
+
+        # Checking whether any orders have been received
+        order_generated = open_long_size>0 or close_long_size>0 or open_short_size>0 or close_short_size>0
 
+        exec_time = order_sent_time + latency
+        matched_row = find_exchange_row(sorted_timestamps, exchange_order, exec_time) if exec_rows is None else exec_rows[row]
+
+        # If we want match with clostset data point instead of just cancelling
+        # while order_generated and matched_row < 0:
+        #     logger.info(f"waiting for matching")
+        #     exec_time = exec_time + np.timedelta64(1, "s")
+        #     matched_row = find_exchange_row(sorted_timestamps, exchange_order, exec_time)
+        #     if exec_time>=data_end_time:
+        #         break
+
+        if matched_row >= 0:
+
+            market = (float(bid_prices[matched_row]), float(ask_prices[matched_row]),
+                      bid_qtys[matched_row], ask_qtys[matched_row], spread_flags[matched_row])
+            market_bid_price, market_ask_price, _, _, spread_flag = market
+
+            fills = exchange_fill(order_dict, market, mid_price, best_bid_price, best_ask_price,
+                                  spread_penalty_factor, cb, ca, min_price_aggressiveness,
+                                  quote_terms=None if quote_terms is None else quote_terms[matched_row])
+            mid_price = fills["mid_price"]
+            filled_open_long_size = fills["filled_open_long_size"]
+            filled_close_long_size = fills["filled_close_long_size"]
+            filled_open_short_size = fills["filled_open_short_size"]
+            filled_close_short_size = fills["filled_close_short_size"]
 
             pnl_and_pos_dict = pnl_obj.update_pnl(market_bid_price, market_ask_price, filled_open_long_size, filled_close_long_size, filled_open_short_size, filled_close_short_size)
 
-            gross_pnl = pnl_and_pos_dict['gross_pnl'] # Gross PnL
-            net_pnl = pnl_and_pos_dict['net_pnl'] # Net PnL
-            num_of_trades = pnl_and_pos_dict['num_of_trades'] 
-            max_drawdown = pnl_and_pos_dict['max_drawdown']
-            peak_pnl = pnl_and_pos_dict['peak_pnl']
-            num_of_opened_trades = pnl_and_pos_dict['num_of_opened_trades'] 
-            num_of_closed_trades = pnl_and_pos_dict['num_of_closed_trades'] 
-            realized_pnl = pnl_and_pos_dict['realized_pnl']
-            unrealized_pnl = pnl_and_pos_dict['unrealized_pnl']
             long_position = pnl_and_pos_dict['total_long_pos']
             short_position = pnl_and_pos_dict['total_short_pos']
 
+            # Add records
+            log_records.append(result_record(signal, exec_time, order_sent_time if order_generated else None,
+                                             fills, pnl_and_pos_dict, spread_flag))
+            
 
+        else: 
+            logger.info(f"Order Cancelled!!! --> No Matched events. ")
 
-            
-            # Add records
-            log_records.append({
-                "signal":signal,
-                "exchange_time": exec_time,    
-                "order_sent_time": order_sent_time if order_generated else None,    
-                "mid_price":mid_price,
-                "slippage":slippage,
-                "gross_pnl": gross_pnl,
-                "net_pnl": net_pnl,
-                "max_drawdown":max_drawdown,
-                "peak_pnl":peak_pnl,
-                "realized_pnl": realized_pnl,
-                "unrealized_pnl": unrealized_pnl,
+        if results_sink is not None and log_records.size >= flush_every:
+            results_sink.write(log_records.to_frame())
+            log_records.clear()
+
+        if checkpointer is not None and checkpointer.due(row + 1):
+            checkpointer.save({
+                **fingerprints,
+                "next_row": row + 1,
                 "long_position": long_position,
                 "short_position": short_position,
-                "close_long_sent_price": close_long_sent_price,
-                "close_long_fill_price": close_long_fill_price,
-                "close_short_sent_price": close_short_sent_price,
-                "close_short_fill_price": close_short_fill_price,
-                "open_short_sent_price": open_short_sent_price,
-                "open_short_fill_price": open_short_fill_price,
-                "open_long_sent_price": open_long_sent_price,
-                "open_long_fill_price": open_long_fill_price,
-                "filled_close_long_size": filled_close_long_size,
-                "filled_close_short_size": filled_close_short_size,
-                "filled_open_short_size": filled_open_short_size,
-                "filled_open_long_size": filled_open_long_size,
-                "prob_exec":prob_exec,
-                "price_aggressiveness":price_aggressiveness,
-                "num_of_trades":num_of_trades,
-                "num_of_opened_trades":num_of_opened_trades,
-                "num_of_closed_trades":num_of_closed_trades,
-                "spread_flag":spread_flag
+                "mid_price": mid_price,
+                "pnl": dict(vars(pnl_obj)),
+                "rng": np.random.get_state(legacy=False),
+                "results": log_records.snapshot(),
+                "sink": results_sink.state() if results_sink is not None else None,
                 })
-            
 
-        else: 
-            logger.info(f"Order Cancelled!!! --> No Matched events. ")
+    # Convert to DataFrame
+    results_df = log_records.to_frame()
+    if results_sink is not None:
+        results_sink.write(results_df)
+        results_sink.close()
+        results_df = None
+
+
+    return results_df, total_received_signal_count
+
 
-        # Convert to DataFrame
-        results_df = pd.DataFrame(log_records)
 
+def event_simulation(merged_df, open_order_size, pnl_obj, spread_penalty_factor, cb, ca, min_price_aggressiveness, seed,
+                     min_exec_prob_threshold, latency=1, per_tick=True, event_log=None, features=None, rng=None, mid_price=np.nan):
+    """
+    Event-driven simulation: only ticks with a signal run the order generator and exchange.
+
+    Hold ticks place no orders, so between two signals the positions, realized
+    PnL and commission stay fixed and each tick only re-marks the open positions.
+    Those ticks are computed in one vectorized step per gap (mark-to-market PnL,
+    peak and drawdown), and the Python-level work scales with the number of
+    signals instead of the number of quotes. The results and final state are
+    identical to simulation() with the same arguments.
 
+    Parameters
+    ----------
+    merged_df : pandas.DataFrame
+        Matched quotes and signals, as for simulation().
+    open_order_size, pnl_obj, spread_penalty_factor, cb, ca, min_price_aggressiveness, seed, min_exec_prob_threshold, latency
+        As for simulation().
+    per_tick : bool, optional
+        Return a result row for every tick, as simulation() does. When False, only
+        the signal ticks and the last tick are returned, which is enough for
+        summarize_results() to give the same metrics. Default is True.
+    event_log : EventLog, optional
+        Also record the orders, fills and sampled equity curve of the run
+        (see event_log.py). Default is None.
+    features : MarketFeatures, optional
+        As for simulation(); also shares one exchange index between several runs
+        on the same data. Default is None.
+    rng : numpy.random.RandomState, optional
+        Private RNG for the fills, seeded by the caller, so runs in other threads
+        do not share the global NumPy RNG. seed is then not used. Default is None.
+    mid_price : float, optional
+        Mid price carried over from the ticks simulated before merged_df, i.e. the
+        mid_price of their last result row, when continuing a run on newly
+        arrived quotes (see incremental.py). Default is NaN (a new run).
+
+    Returns
+    -------
+    tuple
+        (results_df, total_received_signal_count), as for simulation().
+    """
+
+    random = np.random.random
+    if rng is not None:
+        random = rng.random_sample
+    elif seed is not None:
+        np.random.seed(seed)
+
+    timestamps = readonly_column(merged_df, "timestamp")
+    bid_prices = readonly_column(merged_df, "bid_price")
+    ask_prices = readonly_column(merged_df, "ask_price")
+    bid_qtys = readonly_column(merged_df, "bid_qty")
+    ask_qtys = readonly_column(merged_df, "ask_qty")
+    spread_flags = readonly_column(merged_df, "spread_flag")
+    signals = readonly_column(merged_df, "action_int")
+
+    total_received_signal_count = (signals == 1).sum() + (signals == -1).sum()
+
+    # --- Ticks that reach the exchange; a signal tick without a quote at exec time is cancelled ---
+    exec_times = timestamps + latency_offset(latency)
+    quote_terms = None
+    if features is not None:
+        check_features(features, timestamps)
+        matched_rows = features.exec_rows(latency)
+        quote_terms = features.aggressiveness(cb, ca, min_price_aggressiveness)
+    else:
+        matched_rows = find_exchange_rows(*build_exchange_index(timestamps), exec_times)
+    tick_rows = np.flatnonzero(matched_rows >= 0)
+    exchange_rows = matched_rows[tick_rows]
+    is_event = signals[tick_rows] != 0
+    event_positions = np.flatnonzero(is_event)
+    logger.info(f"INFO: Event-driven simulation: {len(event_positions)} signal tick(s) out of {len(timestamps)} quote(s).")
+
+    # --- Output slot of every exchange tick (-1 = not kept) ---
+    num_ticks = len(tick_rows)
+    if per_tick:
+        slots = np.arange(num_ticks)
+    else:
+        kept = is_event.copy()
+        kept[-1:] = True
+        slots = np.full(num_ticks, -1)
+        slots[kept] = np.arange(int(kept.sum()))
+    num_out = int((slots >= 0).sum())
+
+    schema = results_schema(bid_prices.dtype)
+    columns = {name: np.zeros(num_out, dtype=np.dtype(schema[name]) if np.dtype(schema[name]).kind == "M" else np.float64)
+               for name in RESULT_COLUMNS}
+
+    out = slots >= 0
+    columns["exchange_time"][slots[out]] = exec_times[tick_rows[out]]
+    columns["spread_flag"][slots[out]] = spread_flags[exchange_rows[out]]
+
+    # Hold ticks: no orders, mid price of the current quote, zero fills and prices
+    hold = out & ~is_event
+    if features is not None:
+        tick_mids = features.mid[tick_rows]
+    else:
+        tick_mids = (bid_prices[tick_rows].astype(np.float64) + ask_prices[tick_rows].astype(np.float64)) / 2
+    columns["order_sent_time"][slots[hold]] = np.datetime64("NaT")
+    columns["mid_price"][slots[hold]] = tick_mids[hold]
+
+    market_bids = (bid_prices if features is None else features.bid)[exchange_rows].astype(np.float64, copy=False)
+    market_asks = (ask_prices if features is None else features.ask)[exchange_rows].astype(np.float64, copy=False)
+
+    def mark_gap(start, stop):
+        """Vectorized PnL of the hold ticks in [start, stop) and their output rows."""
+        if stop <= start:
+            return
+        marks = pnl_obj.mark_to_market(market_bids[start:stop], market_asks[start:stop])
+        gap_slots = slots[start:stop]
+        keep = gap_slots >= 0
+        for name, values in marks.items():
+            columns[name][gap_slots[keep]] = values[keep]
+        columns["long_position"][gap_slots[keep]] = pnl_obj.total_long_position_size
+        columns["short_position"][gap_slots[keep]] = pnl_obj.total_short_position_size
+        if event_log is not None:
+            sampled = event_log.equity_points(start, stop, num_ticks - 1) - start
+            event_log.record_equity(exec_times[tick_rows[start + sampled]], {name: values[sampled] for name, values in marks.items()},
+                                    pnl_obj.total_long_position_size, pnl_obj.total_short_position_size)
+
+    long_position = pnl_obj.total_long_position_size
+    short_position = pnl_obj.total_short_position_size
+    previous = 0
+
+    for position in event_positions:
+        mark_gap(previous, position)
+        if position > previous:
+            mid_price = float(tick_mids[position - 1])
+
+        row = tick_rows[position]
+        matched_row = exchange_rows[position]
+        best_bid_price, best_ask_price = float(bid_prices[row]), float(ask_prices[row])
+
+        order_dict = order_generator(signals[row], best_bid_price, best_ask_price, long_position, short_position, open_order_size)
+        market = (float(market_bids[position]), float(market_asks[position]),
+                  bid_qtys[matched_row], ask_qtys[matched_row], spread_flags[matched_row])
+
+        fills = exchange_fill(order_dict, market, mid_price, best_bid_price, best_ask_price,
+                              spread_penalty_factor, cb, ca, min_price_aggressiveness, random=random,
+                              quote_terms=None if quote_terms is None else quote_terms[matched_row])
+        mid_price = fills["mid_price"]
+
+        pnl_and_pos_dict = pnl_obj.update_pnl(market[0], market[1], fills["filled_open_long_size"], fills["filled_close_long_size"],
+                                              fills["filled_open_short_size"], fills["filled_close_short_size"])
+        long_position = pnl_and_pos_dict['total_long_pos']
+        short_position = pnl_and_pos_dict['total_short_pos']
+
+        if event_log is not None:
+            event_log.record_orders(order_dict, fills, timestamps[row], exec_times[row])
+            event_log.record_equity(exec_times[row:row + 1], pnl_and_pos_dict, long_position, short_position)
+
+        slot = slots[position]
+        if slot >= 0:
+            record = result_record(order_dict["signal"], exec_times[row], timestamps[row], fills, pnl_and_pos_dict, market[4])
+            for name, value in record.items():
+                columns[name][slot] = value
+        previous = position + 1
+
+    mark_gap(previous, num_ticks)
+
+    results_df = apply_schema(pd.DataFrame(columns, copy=False), schema)
     return results_df, total_received_signal_count
 
 
+
+def simulation_params(sim_config):
+    """
+    Map the "simulation" section of config.json to simulation() keyword arguments.
+
+    Parameters
+    ----------
+    sim_config : dict
+        The "simulation" section of the config.
+
+    Returns
+    -------
+    dict
+        Keyword arguments for simulation(), excluding merged_df and pnl_obj.
+    """
+    return {
+        "open_order_size": sim_config["open_order_size"],
+        "spread_penalty_factor": sim_config["spread_penalty_factor"],
+        # main() passes config ca, cb positionally into simulation(..., cb, ca, ...)
+        "cb": sim_config["ca"],
+        "ca": sim_config["cb"],
+        "min_price_aggressiveness": sim_config["min_price_aggressiveness"],
+        "seed": sim_config["seed"],
+        "min_exec_prob_threshold": sim_config["min_exec_prob_threshold"],
+        "latency": sim_config.get("latency_in_secs", 1),
+    }
@@ -0,0 +1,139 @@
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+
+SPREAD_FLAG_METHODS = ("global", "rolling", "ewma")
+
+# Number of observations before a rolling / EWMA threshold is used
+MIN_PERIODS = 2
+
+
+def relative_spread(bid_prices, ask_prices):
+    """Relative bid-ask spread: (ask - bid) / mid."""
+    mid_price = (ask_prices + bid_prices) / 2
+    return (ask_prices - bid_prices) / mid_price
+
+
+
+def ewma_alpha(halflife):
+    """Smoothing factor of an EWMA with the given half-life in ticks."""
+    return 1 - math.exp(math.log(0.5) / halflife)
+
+
+
+def spread_thresholds(spread, k, method="global", window=None, halflife=None):
+    """
+    Vectorized spread anomaly thresholds: mean + k * std of the relative spread.
+
+    "global" uses the mean and std of the whole series. "rolling" uses the last
+    `window` ticks (current tick included) and "ewma" an exponentially weighted
+    mean and variance with the given `halflife` in ticks. Rolling and EWMA
+    thresholds are NaN for the first ticks, which are never flagged.
+
+    Parameters
+    ----------
+    spread : pandas.Series
+        Relative spread per tick.
+    k : float
+        Number of standard deviations above the mean.
+    method : str, optional
+        One of SPREAD_FLAG_METHODS. Default is "global".
+    window : int, optional
+        Rolling window in ticks (method "rolling").
+    halflife : float, optional
+        EWMA half-life in ticks (method "ewma").
+
+    Returns
+    -------
+    pandas.Series
+        Threshold per tick.
+    """
+    if method == "global":
+        return pd.Series(spread.mean() + k * spread.std(), index=spread.index)
+
+    if method == "rolling":
+        rolling = spread.rolling(window, min_periods=MIN_PERIODS)
+        return rolling.mean() + k * rolling.std()
+
+    if method == "ewma":
+        # adjust=False / bias=True is the recursive form used by OnlineSpreadFlagger
+        ewm = spread.ewm(alpha=ewma_alpha(halflife), adjust=False, min_periods=MIN_PERIODS)
+        return ewm.mean() + k * np.sqrt(ewm.var(bias=True))
+
+    raise ValueError(f"Unknown spread_flag_method '{method}'. Expected one of {list(SPREAD_FLAG_METHODS)}.")
+
+
+
+def spread_flags(spread, k, method="global", window=None, halflife=None):
+    """Return the int8 spread flag per tick (1 = spread above its threshold)."""
+    threshold = spread_thresholds(spread, k, method, window, halflife)
+    return (spread > threshold).astype(np.int8)
+
+
+
+class OnlineSpreadFlagger:
+    """
+    Streaming spread flagger with O(1) work per tick.
+
+    Keeps a rolling window (Welford add / remove updates over a ring buffer) or an
+    EWMA mean and variance of the relative spread, and flags each new quote
+    against mean + k * std including that quote. It follows the same
+    definitions as spread_thresholds(), so batch and streaming flags agree up
+    to floating-point rounding.
+    """
+
+    def __init__(self, k, method="rolling", window=None, halflife=None):
+        if method not in ("rolling", "ewma"):
+            raise ValueError(f"OnlineSpreadFlagger supports 'rolling' and 'ewma', got '{method}'.")
+
+        self.k = k
+        self.method = method
+        self.window = window
+        self.alpha = ewma_alpha(halflife) if method == "ewma" else None
+        self.values = deque()
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def _update_rolling(self, spread):
+        self.values.append(spread)
+        self.count += 1
+        delta = spread - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (spread - self.mean)
+
+        if self.count > self.window:
+            oldest = self.values.popleft()
+            self.count -= 1
+            delta = oldest - self.mean
+            self.mean -= delta / self.count
+            self.m2 -= delta * (oldest - self.mean)
+
+        return math.sqrt(max(self.m2, 0.0) / (self.count - 1)) if self.count > 1 else math.nan
+
+    def _update_ewma(self, spread):
+        self.count += 1
+        if self.count == 1:
+            self.mean = spread
+            return math.nan
+
+        delta = spread - self.mean
+        self.mean += self.alpha * delta
+        self.m2 = (1 - self.alpha) * (self.m2 + self.alpha * delta * delta)
+        return math.sqrt(self.m2)
+
+    def update(self, bid_price, ask_price):
+        """Add one quote and return its spread flag (1 = flagged, 0 = valid)."""
+        spread = float(relative_spread(bid_price, ask_price))
+        std = self._update_rolling(spread) if self.method == "rolling" else self._update_ewma(spread)
+        if self.count < MIN_PERIODS:
+            return 0
+        return int(spread > self.mean + self.k * std)
+
+    def update_many(self, bid_prices, ask_prices):
+        """Flag a batch of quotes in order, continuing the streaming state."""
+        return np.fromiter((self.update(bid, ask) for bid, ask in zip(bid_prices, ask_prices)),
+                           dtype=np.int8, count=len(bid_prices))
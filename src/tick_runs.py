@@ -0,0 +1,272 @@
+import numpy as np
+import pandas as pd
+
+from logger_config import logger
+from schema import results_schema, apply_schema
+from simulator import (RESULT_COLUMNS, aggressiveness_terms, build_exchange_index, exchange_fill, find_exchange_rows, latency_offset,
+                       order_generator, result_record)
+
+
+# Ticks whose exchange quotes run_length_simulation() resolves at a time
+DEFAULT_BLOCK_ROWS = 1 << 16
+
+# Per-run columns: a run is a stretch of consecutive rows where all of them are unchanged and there is no signal
+RUN_COLUMNS = ("bid_price", "bid_qty", "ask_price", "ask_qty", "spread_flag", "action_int")
+
+
+def run_starts(columns, actions=None):
+    """
+    First row of every run of consecutive rows with equal values in all columns.
+
+    Rows with a non-zero action always start a run of their own.
+    """
+    num_rows = len(columns[0]) if len(columns) else 0
+    new_run = np.ones(num_rows, dtype=bool)
+    if num_rows > 1:
+        changed = np.zeros(num_rows - 1, dtype=bool)
+        for values in columns:
+            changed |= values[1:] != values[:-1]
+        if actions is not None:
+            changed |= (actions[1:] != 0) | (actions[:-1] != 0)
+        new_run[1:] = changed
+    return np.flatnonzero(new_run)
+
+
+
+class TickRuns:
+    """
+    Run-length encoded matched ticks.
+
+    Quote feeds repeat the same top of book for long stretches, and after
+    signal integration most of those rows are holds. Consecutive rows with
+    unchanged bid / ask price and quantity and spread flag and no signal are
+    stored once, as a run (start row, row count and the run's values); signal
+    rows are runs of one. Only the timestamps stay per row, since they decide
+    the exchange quote each tick is matched to.
+
+    Parameters
+    ----------
+    timestamps : numpy.ndarray
+        Timestamp of every row (datetime64[ns]).
+    starts : numpy.ndarray
+        First row of each run, increasing from 0.
+    columns : dict
+        {name: per-run values} for RUN_COLUMNS.
+    """
+
+    def __init__(self, timestamps, starts, columns):
+        self.timestamps = np.asarray(timestamps, dtype="datetime64[ns]")
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.columns = {name: np.asarray(values) for name, values in columns.items()}
+        self.counts = np.diff(self.starts, append=len(self.timestamps))
+
+    @classmethod
+    def from_frame(cls, matched_df, columns=RUN_COLUMNS):
+        """Compress a matched DataFrame (rows in simulation order)."""
+        values = [matched_df[name].to_numpy() for name in columns]
+        starts = run_starts(values, matched_df["action_int"].to_numpy())
+        return cls(matched_df["timestamp"].to_numpy(), starts, {name: column[starts] for name, column in zip(columns, values)})
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def num_rows(self):
+        return len(self.timestamps)
+
+    @property
+    def compression(self):
+        """Rows per run."""
+        return self.num_rows / len(self) if len(self) else 1.0
+
+    @property
+    def nbytes(self):
+        return self.timestamps.nbytes + self.starts.nbytes + self.counts.nbytes + sum(values.nbytes for values in self.columns.values())
+
+    def run_ids(self, rows):
+        """Run of each row index."""
+        return np.searchsorted(self.starts, rows, side="right") - 1
+
+    def expand(self, name):
+        """Per-row values of a run column."""
+        return np.repeat(self.columns[name], self.counts)
+
+    def to_frame(self):
+        """The matched rows back as a DataFrame of the timestamp and RUN_COLUMNS."""
+        return pd.DataFrame({"timestamp": self.timestamps, **{name: self.expand(name) for name in self.columns}})
+
+    def log_compression(self):
+        """Log the number of runs, rows per run and the size of the runs."""
+        logger.info(f"INFO: Tick runs: {self.num_rows} row(s) in {len(self)} run(s) ({self.compression:.1f} rows/run), "
+                    f"{self.nbytes / 1024:.1f} KiB.")
+
+
+
+def run_length_simulation(runs, open_order_size, pnl_obj, spread_penalty_factor, cb, ca, min_price_aggressiveness, seed,
+                          min_exec_prob_threshold, latency=1, per_tick=True, rng=None, block_rows=DEFAULT_BLOCK_ROWS):
+    """
+    Event-driven simulation over run-length encoded ticks.
+
+    As event_simulation(), but the quotes are looked up by run: every tick's
+    exchange quote is resolved to the run holding it, and the hold ticks
+    between two signals are marked to market once per stretch of ticks that
+    execute against the same run instead of once per tick. Repeating a net
+    PnL leaves the peak and max drawdown unchanged, so the marks of such a
+    stretch are the same for every tick in it. Exchange quotes are resolved
+    block_rows ticks at a time, so apart from the timestamps and the results
+    no per-tick arrays are held. The results and final state are identical
+    to simulation() on runs.to_frame().
+
+    Parameters
+    ----------
+    runs : TickRuns
+        Compressed matched quotes and signals.
+    open_order_size, pnl_obj, spread_penalty_factor, cb, ca, min_price_aggressiveness, seed, min_exec_prob_threshold, latency
+        As for simulation().
+    per_tick, rng
+        As for event_simulation().
+    block_rows : int, optional
+        Ticks resolved at a time. Default is DEFAULT_BLOCK_ROWS.
+
+    Returns
+    -------
+    tuple
+        (results_df, total_received_signal_count), as for simulation().
+    """
+
+    random = np.random.random
+    if rng is not None:
+        random = rng.random_sample
+    elif seed is not None:
+        np.random.seed(seed)
+
+    timestamps = runs.timestamps
+    bid_prices, ask_prices = runs.columns["bid_price"], runs.columns["ask_price"]
+    bid_qtys, ask_qtys = runs.columns["bid_qty"], runs.columns["ask_qty"]
+    spread_flags, signals = runs.columns["spread_flag"], runs.columns["action_int"]
+
+    total_received_signal_count = runs.counts[signals == 1].sum() + runs.counts[signals == -1].sum()
+
+    offset = latency_offset(latency)
+    exchange_index = build_exchange_index(timestamps)
+
+    def exchange_ticks(first_row):
+        """Rows of [first_row, first_row + block_rows) whose order reaches the exchange, their exec times and matched rows."""
+        exec_times = timestamps[first_row:first_row + block_rows] + offset
+        matched_rows = find_exchange_rows(*exchange_index, exec_times)
+        ticks = np.flatnonzero(matched_rows >= 0)
+        return ticks + first_row, exec_times[ticks], matched_rows[ticks]
+
+    # --- First pass: number of exchange ticks and signal ticks (sizes the results) ---
+    num_ticks = num_events = 0
+    last_is_event = False
+    for first_row in range(0, runs.num_rows, block_rows):
+        tick_rows, _, _ = exchange_ticks(first_row)
+        if len(tick_rows):
+            is_event = signals[runs.run_ids(tick_rows)] != 0
+            num_ticks += len(tick_rows)
+            num_events += int(is_event.sum())
+            last_is_event = bool(is_event[-1])
+    logger.info(f"INFO: Run-length simulation: {num_events} signal tick(s) out of {runs.num_rows} quote(s) in {len(runs)} run(s).")
+
+    # Output rows: every exchange tick, or the signal ticks and the last exchange tick
+    num_out = num_ticks if per_tick else num_events + int(num_ticks > 0 and not last_is_event)
+    schema = results_schema(bid_prices.dtype)
+    columns = {name: np.zeros(num_out, dtype=np.dtype(schema[name]) if np.dtype(schema[name]).kind == "M" else np.float64)
+               for name in RESULT_COLUMNS}
+
+    run_mids = (bid_prices.astype(np.float64) + ask_prices.astype(np.float64)) / 2
+    run_bids = bid_prices.astype(np.float64, copy=False)
+    run_asks = ask_prices.astype(np.float64, copy=False)
+    quote_terms = np.column_stack(aggressiveness_terms(run_bids, run_asks, cb, ca, min_price_aggressiveness))
+
+    def mark_gap(gap_runs, gap_slots):
+        """PnL of a stretch of hold ticks, marked once per sub-stretch executing against the same run."""
+        if len(gap_runs) == 0:
+            return
+        stretch_starts = np.flatnonzero(np.concatenate(([True], gap_runs[1:] != gap_runs[:-1])))
+        stretch_runs = gap_runs[stretch_starts]
+        marks = pnl_obj.mark_to_market(run_bids[stretch_runs], run_asks[stretch_runs])
+
+        keep = np.flatnonzero(gap_slots >= 0)
+        stretch_of = np.searchsorted(stretch_starts, keep, side="right") - 1
+        for name, values in marks.items():
+            columns[name][gap_slots[keep]] = values[stretch_of]
+        columns["long_position"][gap_slots[keep]] = pnl_obj.total_long_position_size
+        columns["short_position"][gap_slots[keep]] = pnl_obj.total_short_position_size
+
+    long_position = pnl_obj.total_long_position_size
+    short_position = pnl_obj.total_short_position_size
+    mid_price = np.nan
+    hold_run = -1  # run of the last hold tick since the previous signal tick, carried across blocks
+    next_slot = 0
+    ticks_done = 0
+
+    for first_row in range(0, runs.num_rows, block_rows):
+        tick_rows, exec_times, matched_rows = exchange_ticks(first_row)
+        if len(tick_rows) == 0:
+            continue
+        tick_runs, exchange_runs = runs.run_ids(tick_rows), runs.run_ids(matched_rows)
+        is_event = signals[tick_runs] != 0
+        ticks_done += len(tick_rows)
+
+        # --- Output slot of every exchange tick of the block (-1 = not kept) ---
+        if per_tick:
+            slots = np.arange(next_slot, next_slot + len(tick_rows))
+        else:
+            kept = is_event.copy()
+            if ticks_done == num_ticks:
+                kept[-1] = True
+            slots = np.full(len(tick_rows), -1)
+            slots[kept] = np.arange(next_slot, next_slot + int(kept.sum()))
+        out = slots >= 0
+        next_slot += int(out.sum())
+
+        columns["exchange_time"][slots[out]] = exec_times[out]
+        columns["spread_flag"][slots[out]] = spread_flags[exchange_runs[out]]
+
+        # Hold ticks: no orders, mid price of the current quote, zero fills and prices
+        hold = out & ~is_event
+        columns["order_sent_time"][slots[hold]] = np.datetime64("NaT")
+        columns["mid_price"][slots[hold]] = run_mids[tick_runs[hold]]
+
+        previous = 0
+        for position in np.flatnonzero(is_event):
+            mark_gap(exchange_runs[previous:position], slots[previous:position])
+            if position > previous:
+                hold_run = tick_runs[position - 1]
+            if hold_run >= 0:
+                mid_price = float(run_mids[hold_run])
+            hold_run = -1
+
+            row = tick_rows[position]
+            run, matched_run = tick_runs[position], exchange_runs[position]
+            best_bid_price, best_ask_price = float(bid_prices[run]), float(ask_prices[run])
+
+            order_dict = order_generator(signals[run], best_bid_price, best_ask_price, long_position, short_position, open_order_size)
+            market = (float(run_bids[matched_run]), float(run_asks[matched_run]),
+                      bid_qtys[matched_run], ask_qtys[matched_run], spread_flags[matched_run])
+
+            fills = exchange_fill(order_dict, market, mid_price, best_bid_price, best_ask_price,
+                                  spread_penalty_factor, cb, ca, min_price_aggressiveness, random=random,
+                                  quote_terms=quote_terms[matched_run])
+            mid_price = fills["mid_price"]
+
+            pnl_and_pos_dict = pnl_obj.update_pnl(market[0], market[1], fills["filled_open_long_size"], fills["filled_close_long_size"],
+                                                  fills["filled_open_short_size"], fills["filled_close_short_size"])
+            long_position = pnl_and_pos_dict['total_long_pos']
+            short_position = pnl_and_pos_dict['total_short_pos']
+
+            slot = slots[position]
+            if slot >= 0:
+                record = result_record(order_dict["signal"], exec_times[position], timestamps[row], fills, pnl_and_pos_dict, market[4])
+                for name, value in record.items():
+                    columns[name][slot] = value
+            previous = position + 1
+
+        mark_gap(exchange_runs[previous:], slots[previous:])
+        if previous < len(tick_rows):
+            hold_run = tick_runs[-1]
+
+    results_df = apply_schema(pd.DataFrame(columns, copy=False), schema)
+    return results_df, total_received_signal_count
@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger
+from schema import RAW_QUOTES_DTYPES
+
+
+# Fixed-width column layout of the store; timestamps are int64 nanoseconds since epoch
+TICK_COLUMNS = {
+    "timestamp": np.int64,
+    "bid_price": RAW_QUOTES_DTYPES["bid_price"],
+    "bid_qty": RAW_QUOTES_DTYPES["bid_qty"],
+    "ask_price": RAW_QUOTES_DTYPES["ask_price"],
+    "ask_qty": RAW_QUOTES_DTYPES["ask_qty"],
+}
+
+META_FILE = "meta.json"
+INDEX_FILE = "time_index.bin"
+
+# One sparse index entry (timestamp of the first row) per block of rows
+DEFAULT_INDEX_EVERY = 4096
+
+
+def is_tick_store(path):
+    """True when path is a tick store directory."""
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+
+class TickStore:
+    """
+    Append-only, memory-mapped columnar store of quote ticks.
+
+    Each column of TICK_COLUMNS lives in its own fixed-width binary file
+    (`<column>.bin`), rows sorted by timestamp. A sparse time index holds the
+    timestamp of every `index_every`-th row, so a [start, end) range is found
+    with two binary searches that touch one index block each, and reading it
+    only pages in the rows of the range through np.memmap.
+
+    Appends write the column files first and update meta.json last (atomic
+    rename), so a crash mid-append leaves the store at its previous length.
+    """
+
+    def __init__(self, path, index_every=DEFAULT_INDEX_EVERY):
+        self.path = path
+        if is_tick_store(path):
+            with open(os.path.join(path, META_FILE), "r") as f:
+                meta = json.load(f)
+            self.rows = meta["rows"]
+            self.index_every = meta["index_every"]
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.rows = 0
+            self.index_every = index_every
+            self._write_meta()
+
+    def _column_path(self, column):
+        return os.path.join(self.path, f"{column}.bin")
+
+    def _write_meta(self):
+        meta = {"rows": self.rows, "index_every": self.index_every,
+                "columns": {column: np.dtype(dtype).str for column, dtype in TICK_COLUMNS.items()}}
+        tmp_path = os.path.join(self.path, f"{META_FILE}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, META_FILE))
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, column, first_row=0, last_row=None):
+        """Read-only memmap of rows [first_row, last_row) of one column (no data is read until accessed)."""
+        last_row = self.rows if last_row is None else last_row
+        dtype = np.dtype(TICK_COLUMNS[column])
+        if last_row <= first_row:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._column_path(column), dtype=dtype, mode="r",
+                         offset=first_row * dtype.itemsize, shape=(last_row - first_row,))
+
+    def _time_index(self):
+        num_entries = -(-self.rows // self.index_every)
+        if num_entries == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.memmap(os.path.join(self.path, INDEX_FILE), dtype=np.int64, mode="r", shape=(num_entries,))
+
+    def append(self, quotes_df):
+        """
+        Append quotes (timestamp, bid_price, bid_qty, ask_price, ask_qty) to the store.
+
+        Rows are sorted by timestamp (stable) and must not start before the last
+        stored timestamp.
+        """
+        if quotes_df.empty:
+            return
+
+        timestamps = pd.to_datetime(quotes_df["timestamp"]).to_numpy("datetime64[ns]").view(np.int64)
+        order = np.argsort(timestamps, kind="stable")
+        timestamps = timestamps[order]
+        if self.rows > 0 and timestamps[0] < self.column("timestamp", self.rows - 1)[0]:
+            raise ValueError("Tick store is append-only: new quotes start before the last stored timestamp.")
+
+        # Truncate anything past the committed length (left by an interrupted append)
+        for column, dtype in TICK_COLUMNS.items():
+            values = timestamps if column == "timestamp" else quotes_df[column].to_numpy(dtype)[order]
+            with open(self._column_path(column), "ab") as f:
+                f.truncate(self.rows * np.dtype(dtype).itemsize)
+                f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+
+        # Sparse index: timestamp of every index_every-th row
+        first_new = self.rows
+        new_rows = first_new + len(timestamps)
+        index_rows = np.arange(-(-first_new // self.index_every) * self.index_every, new_rows, self.index_every)
+        with open(os.path.join(self.path, INDEX_FILE), "ab") as f:
+            f.truncate(-(-first_new // self.index_every) * 8)
+            f.write(timestamps[index_rows - first_new].astype(np.int64).tobytes())
+
+        self.rows = new_rows
+        self._write_meta()
+
+    def truncate(self, rows):
+        """Roll the store back to its first `rows` rows (the column files are cut on the next append)."""
+        self.rows = min(rows, self.rows)
+        self._write_meta()
+
+    def row_range(self, start=None, end=None):
+        """
+        Rows [first_row, last_row) with start <= timestamp < end.
+
+        The sparse index narrows each bound to one block of index_every rows,
+        which is then binary searched in the memmapped timestamps.
+        """
+        def bound(ts):
+            ts = pd.Timestamp(ts).value
+            block = max(int(np.searchsorted(self._time_index(), ts, side="left")) - 1, 0)
+            first_row = block * self.index_every
+            last_row = min(first_row + 2 * self.index_every, self.rows)
+            return first_row + int(np.searchsorted(self.column("timestamp", first_row, last_row), ts, side="left"))
+
+        first_row = 0 if start is None else bound(start)
+        last_row = self.rows if end is None else bound(end)
+        return first_row, max(first_row, last_row)
+
+    def timestamps(self, start=None, end=None):
+        """datetime64[ns] timestamps of the [start, end) range (a memmap view)."""
+        first_row, last_row = self.row_range(start, end)
+        return self.column("timestamp", first_row, last_row).view("datetime64[ns]")
+
+    def read(self, start=None, end=None):
+        """
+        Quotes of the [start, end) time range as a DataFrame in the raw quote layout.
+
+        Columns are backed by the memmaps where pandas allows it, so only the
+        pages of the requested rows are read from disk.
+        """
+        first_row, last_row = self.row_range(start, end)
+        data = {column: self.column(column, first_row, last_row) for column in TICK_COLUMNS}
+        data["timestamp"] = data["timestamp"].view("datetime64[ns]")
+        return pd.DataFrame(data, copy=False)
+
+
+
+def import_quotes_csv(quotes_csv_path, store_path, chunksize=1_000_000, index_every=DEFAULT_INDEX_EVERY, tmp_dir=None):
+    """
+    Append a quote CSV in the raw feed format to a tick store.
+
+    The CSV is sorted by timestamp out of core first (ExternalQuoteSort with
+    runs of chunksize rows), so it may be out of order across chunks, and the
+    sorted blocks are appended one at a time. Rows without a parseable
+    timestamp cannot be placed in the time index and are dropped. Everything
+    else (nulls, duplicates, crossed quotes) is kept for validate_quotes() to
+    report.
+
+    The import is all or nothing: a new store is built in a temporary
+    directory next to store_path and moved into place when complete, and an
+    existing store is rolled back to its previous length if the import fails
+    (e.g. the CSV starts before the last stored timestamp).
+
+    Parameters
+    ----------
+    quotes_csv_path : str
+        Raw quote CSV (timestamp, bid_price, bid_qty, ask_price, ask_qty).
+    store_path : str
+        Tick store directory, created if missing.
+    chunksize : int, optional
+        Rows per sorted run. Default is 1,000,000.
+    index_every : int, optional
+        Rows per sparse index entry for a new store. Default is DEFAULT_INDEX_EVERY.
+    tmp_dir : str, optional
+        Directory for the spilled sort runs. Default is the system temporary directory.
+
+    Returns
+    -------
+    TickStore
+        The store after the import.
+    """
+    # Imported here: external_sort -> partitions -> tick_store
+    from external_sort import ExternalQuoteSort
+
+    new_store = not is_tick_store(store_path)
+    build_path = store_path
+    if new_store:
+        parent = os.path.dirname(os.path.abspath(store_path))
+        os.makedirs(parent, exist_ok=True)
+        build_path = tempfile.mkdtemp(dir=parent, prefix=f".{os.path.basename(os.path.normpath(store_path))}.")
+
+    store = TickStore(build_path, index_every)
+    rows_before = len(store)
+    dropped = 0
+    sorter = ExternalQuoteSort(quotes_csv_path, run_rows=chunksize, tmp_dir=tmp_dir, drop_duplicates=False)
+
+    try:
+        for block in sorter:
+            # NaT timestamps sort last
+            valid_time = block["timestamp"].notna()
+            dropped += int((~valid_time).sum())
+            store.append(block[valid_time])
+        if new_store:
+            os.replace(build_path, store_path)
+            store.path = store_path
+    except BaseException:
+        if new_store:
+            shutil.rmtree(build_path, ignore_errors=True)
+        else:
+            store.truncate(rows_before)
+        raise
+
+    if sorter.stats["out_of_order"] > 0:
+        logger.info(f"ACTION: Sorted {sorter.stats['out_of_order']} out-of-order position(s) in the quote CSV.")
+    if dropped > 0:
+        logger.info(f"FLAG: Dropped {dropped} quote row(s) without a valid timestamp.")
+    logger.info(f"INFO: Imported {len(store) - rows_before} quote row(s) into {store_path} ({len(store)} in total).")
+    return store
+
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Import a quote CSV into a memory-mapped tick store.")
+    parser.add_argument("quotes_csv", help="Quote CSV in the raw feed format.")
+    parser.add_argument("store", help="Tick store directory (appended to if it exists).")
+    parser.add_argument("--chunksize", type=int, default=1_000_000, help="Rows per sorted run.")
+    return parser.parse_args()
+
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    import_quotes_csv(args.quotes_csv, args.store, args.chunksize)
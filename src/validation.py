@@ -4,26 +4,90 @@ from pathlib import Path
 import os
 from logger_config import logger, log_blank_line
 from plotting import plot_spread_distribution
+from spread_flags import relative_spread, spread_thresholds
+from tick_store import TickStore, is_tick_store
+from partitions import is_partitioned, read_partitions
+from external_sort import external_sort_quotes
+from schema import (RAW_QUOTES_DTYPES, RAW_SIGNALS_DTYPES, validated_quotes_schema, validated_signals_schema,
+                    apply_schema, resolve_precision, memory_per_row, log_memory_reduction)
+
+
+
+def read_raw_quotes(quotes_path, time_range=None, usecols=None):
+    """
+    Read raw quotes from a CSV, a partitioned set of CSVs (glob pattern or
+    directory) or a tick store directory, restricted to a [start, end) time range.
+
+    A tick store only pages in the rows of the range; CSVs are read in full and
+    then filtered. Timestamps come back parsed from a tick store or partitions
+    and as raw strings from a single CSV.
+    """
+    start, end = time_range if time_range is not None else (None, None)
+    if is_tick_store(quotes_path):
+        quotes_raw_df = TickStore(quotes_path).read(start, end)
+        return quotes_raw_df if usecols is None else quotes_raw_df[usecols]
+
+    if is_partitioned(quotes_path):
+        quotes_raw_df = read_partitions(quotes_path, RAW_QUOTES_DTYPES, usecols)
+        timestamps = quotes_raw_df["timestamp"]
+    else:
+        quotes_raw_df = pd.read_csv(quotes_path, dtype=RAW_QUOTES_DTYPES, usecols=usecols)
+        if start is None and end is None:
+            return quotes_raw_df
+        timestamps = pd.to_datetime(quotes_raw_df["timestamp"].astype(str).str.replace(",", ".", regex=False), errors="coerce")
+
+    if start is None and end is None:
+        return quotes_raw_df
+    in_range = pd.Series(True, index=quotes_raw_df.index)
+    if start is not None:
+        in_range &= timestamps >= pd.Timestamp(start)
+    if end is not None:
+        in_range &= timestamps < pd.Timestamp(end)
+    return quotes_raw_df[in_range].reset_index(drop=True)
 
 
 
-def validate_signals(signals_csv_path, quotes_csv_path, signals_validated_csv_path):
+
+def validate_signals(signals_csv_path, quotes_csv_path, signals_validated_csv_path, precision="float64", quote_timestamps=None,
+                     time_range=None):
     logger.info("-------- Signal Data Validation Report --------")
     logger.info("===============================================")
 
-    signals_raw_df = pd.read_csv(signals_csv_path) 
-    quotes_raw_df = pd.read_csv(quotes_csv_path) 
+    if is_partitioned(signals_csv_path):
+        signals_raw_df = read_partitions(signals_csv_path, RAW_SIGNALS_DTYPES)
+    else:
+        signals_raw_df = pd.read_csv(signals_csv_path, dtype=RAW_SIGNALS_DTYPES) 
+    # Callers that already loaded the quotes pass their timestamps instead of re-reading the file
+    if quote_timestamps is not None:
+        quotes_raw_df = pd.DataFrame({"timestamp": quote_timestamps})
+    else:
+        quotes_raw_df = read_raw_quotes(quotes_csv_path, time_range, usecols=["timestamp"])
     initial_signals_row_count = len(signals_raw_df)
+    raw_bytes_per_row = memory_per_row(signals_raw_df)
 
     # --- Converting timestamp columns ---
-    signals_raw_df["timestamp"] = pd.to_datetime(
-        signals_raw_df["timestamp"].astype(str).str.replace(",", ".", regex=False),
-        errors="coerce"
-    )
-    quotes_raw_df["timestamp"] = pd.to_datetime(
-        quotes_raw_df["timestamp"].astype(str).str.replace(",", ".", regex=False),
-        errors="coerce"
-    )
+    if not pd.api.types.is_datetime64_dtype(signals_raw_df["timestamp"]):
+        signals_raw_df["timestamp"] = pd.to_datetime(
+            signals_raw_df["timestamp"].astype(str).str.replace(",", ".", regex=False),
+            errors="coerce"
+        )
+    if not pd.api.types.is_datetime64_dtype(quotes_raw_df["timestamp"]):
+        quotes_raw_df["timestamp"] = pd.to_datetime(
+            quotes_raw_df["timestamp"].astype(str).str.replace(",", ".", regex=False),
+            errors="coerce"
+        )
+
+    # ------------------------- Time Range ----------------------------------
+    if time_range is not None and any(bound is not None for bound in time_range):
+        start, end = time_range
+        in_range = pd.Series(True, index=signals_raw_df.index)
+        if start is not None:
+            in_range &= signals_raw_df["timestamp"] >= pd.Timestamp(start)
+        if end is not None:
+            in_range &= signals_raw_df["timestamp"] < pd.Timestamp(end)
+        signals_raw_df = signals_raw_df[in_range].reset_index(drop=True)
+        initial_signals_row_count = len(signals_raw_df)
+        logger.info(f"INFO: {initial_signals_row_count} signal row(s) in time range [{start}, {end}).")
 
     # ------------------------- Null Values Check -------------------------
     null_count = signals_raw_df.isnull().sum().sum()
@@ -53,38 +117,55 @@ def validate_signals(signals_csv_path, quotes_csv_path, signals_validated_csv_pa
     logger.info(f"Rows checked (Initial): {initial_signals_row_count}")
     logger.info(f"Rows dropped (Total): {total_rows_dropped}")
     logger.info(f"Rows remaining (Final): {final_row_count}")
+
+    signals_raw_df = apply_schema(signals_raw_df, validated_signals_schema(precision))
+    log_memory_reduction("signals", raw_bytes_per_row, memory_per_row(signals_raw_df))
     log_blank_line()
 
-    signals_raw_df.to_csv(signals_validated_csv_path, index=False)
+    if signals_validated_csv_path is not None:
+        signals_raw_df.to_csv(signals_validated_csv_path, index=False)
 
     return signals_raw_df
 
 
 
 
-def validate_quotes(quotes_csv_path, quotes_validated_csv_path, k, plots_dir_path):
+def validate_quotes(quotes_csv_path, quotes_validated_csv_path, k, plots_dir_path, precision="float64",
+                    spread_flag_method="global", spread_window=None, spread_halflife=None, time_range=None,
+                    external_sort_rows=None, external_sort_dir=None):
 
     logger.info("-------- Quote Data Validation Report --------")
     logger.info("==============================================")
 
-    quotes_raw_df = pd.read_csv(quotes_csv_path) 
-    initial_row_count = len(quotes_raw_df)
+    # Out-of-core dedupe and sort for feeds too large to dedupe / sort in memory (see external_sort.py)
+    use_external_sort = external_sort_rows is not None and not is_tick_store(quotes_csv_path)
+    if use_external_sort:
+        quotes_raw_df, sort_stats = external_sort_quotes(quotes_csv_path, external_sort_rows, tmp_dir=external_sort_dir,
+                                                         time_range=time_range)
+        initial_row_count = sort_stats["rows"]
+    else:
+        # quotes_csv_path may also be a tick store directory (see tick_store.py)
+        quotes_raw_df = read_raw_quotes(quotes_csv_path, time_range)
+        initial_row_count = len(quotes_raw_df)
+    raw_bytes_per_row = memory_per_row(quotes_raw_df)
 
     # --- Normalize timestamp columns ---
-    quotes_raw_df["timestamp"] = pd.to_datetime(
-        quotes_raw_df["timestamp"].astype(str).str.replace(",", ".", regex=False),
-        errors="coerce"
-    )
+    if not pd.api.types.is_datetime64_dtype(quotes_raw_df["timestamp"]):
+        quotes_raw_df["timestamp"] = pd.to_datetime(
+            quotes_raw_df["timestamp"].astype(str).str.replace(",", ".", regex=False),
+            errors="coerce"
+        )
 
 
     # -----------------------------------Duplicate Row Check----------------------------------------------
-    has_duplicates = quotes_raw_df.duplicated().any()
+    has_duplicates = sort_stats["duplicates"] > 0 if use_external_sort else quotes_raw_df.duplicated().any()
 
     if has_duplicates:
         logger.info("FLAG: Detected duplicate rows.")
         
-        # Drop duplicate rows
-        quotes_raw_df.drop_duplicates(subset=quotes_raw_df.columns, keep="first", inplace=True)
+        # Drop duplicate rows (already dropped by the external sort)
+        if not use_external_sort:
+            quotes_raw_df.drop_duplicates(subset=quotes_raw_df.columns, keep="first", inplace=True)
         rows_dropped = initial_row_count - len(quotes_raw_df)
         logger.info(f"ACTION: Removed {rows_dropped} duplicate row(s) from dataset.")
     else:
@@ -93,10 +174,13 @@ def validate_quotes(quotes_csv_path, quotes_validated_csv_path, k, plots_dir_pat
 
     
     # ----------------Check for strictly increasing timestamps ----------------------
-    if not quotes_raw_df['timestamp'].is_monotonic_increasing:
+    is_sorted = sort_stats["sorted"] if use_external_sort else quotes_raw_df['timestamp'].is_monotonic_increasing
+    if not is_sorted:
         logger.info("FLAG: Timestamps are not strictly increasing. Sorting by timestamp.")
 
-        quotes_raw_df = quotes_raw_df.sort_values('timestamp').reset_index(drop=True)
+        # Already sorted by the external sort
+        if not use_external_sort:
+            quotes_raw_df = quotes_raw_df.sort_values('timestamp').reset_index(drop=True)
         logger.info(f"ACTION: Sorted timestamps.")
 
     else:
@@ -134,21 +218,22 @@ def validate_quotes(quotes_csv_path, quotes_validated_csv_path, k, plots_dir_pat
 
 
     # -----------------------------------Spread threshold------------------------------------------------
-    mid_price = (quotes_raw_df['ask_price'] + quotes_raw_df['bid_price']) / 2
-    spread = (quotes_raw_df['ask_price'] - quotes_raw_df['bid_price']) / mid_price
+    spread = relative_spread(quotes_raw_df['bid_price'], quotes_raw_df['ask_price'])
     mean = spread.mean()
     std = spread.std()
     spread_threshold = mean + k * std   # flag anything > k standard deviations away
 
-    # Add a flag column for spread validation
-    quotes_raw_df['spread_flag'] = (spread > spread_threshold).astype(int)  # 1 = flagged, 0 = valid
+    # Add a flag column for spread validation (global, rolling or EWMA threshold)
+    thresholds = spread_thresholds(spread, k, spread_flag_method, spread_window, spread_halflife)
+    quotes_raw_df['spread_flag'] = (spread > thresholds).astype(int)  # 1 = flagged, 0 = valid
 
     invalid_rows_count = quotes_raw_df['spread_flag'].sum()
+    threshold_label = f"{spread_threshold:.6f}" if spread_flag_method == "global" else f"{spread_flag_method} mean + {k} std"
 
     if invalid_rows_count > 0:
-        logger.info(f"FLAG: {invalid_rows_count} row(s) with spread > {spread_threshold:.6f} identified and flagged.")
+        logger.info(f"FLAG: {invalid_rows_count} row(s) with spread > {threshold_label} identified and flagged.")
     else:
-        logger.info(f"PASS: No rows with spread > {spread_threshold:.6f} found.")
+        logger.info(f"PASS: No rows with spread > {threshold_label} found.")
 
     plot_spread_distribution(spread, mean, k, spread_threshold, plots_dir_path)
 
@@ -179,8 +264,13 @@ def validate_quotes(quotes_csv_path, quotes_validated_csv_path, k, plots_dir_pat
     logger.info(f"Rows dropped (Total): {total_rows_dropped}")
     logger.info(f"Rows remaining (Final): {final_row_count}")
 
+    # --- Apply compact dtypes ---
+    precision = resolve_precision(quotes_raw_df, precision)
+    quotes_raw_df = apply_schema(quotes_raw_df, validated_quotes_schema(precision))
+    log_memory_reduction("quotes", raw_bytes_per_row, memory_per_row(quotes_raw_df))
 
     quotes_validated_df = quotes_raw_df 
-    quotes_validated_df.to_csv(quotes_validated_csv_path, index=False) 
+    if quotes_validated_csv_path is not None:
+        quotes_validated_df.to_csv(quotes_validated_csv_path, index=False) 
 
     return quotes_validated_df
\ No newline at end of file
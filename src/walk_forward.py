@@ -0,0 +1,250 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger, log_blank_line
+from metrics import RealTimePnL, running_drawdown, summarize_results
+from simulator import latency_offset, simulation, simulation_params
+
+
+# PnL columns that accumulate over a run and are offset when windows are stitched
+CUMULATIVE_PNL_COLUMNS = ["gross_pnl", "net_pnl", "realized_pnl"]
+
+
+def make_windows(timestamps, window_secs, step_secs):
+    """
+    Split sorted timestamps into [start, start + window) time windows every step.
+
+    Parameters
+    ----------
+    timestamps : numpy.ndarray
+        Sorted datetime64 timestamps of the matched data.
+    window_secs : float
+        Window length in seconds.
+    step_secs : float
+        Distance between window starts in seconds.
+
+    Returns
+    -------
+    list of tuple
+        (window_start, window_end, first_row, last_row_exclusive) per non-empty window.
+    """
+    if len(timestamps) == 0:
+        return []
+
+    window = np.timedelta64(int(window_secs * 1e9), "ns")
+    step = np.timedelta64(int(step_secs * 1e9), "ns")
+    if step <= np.timedelta64(0, "ns") or window <= np.timedelta64(0, "ns"):
+        raise ValueError("walk_forward window_secs and step_secs must be positive.")
+
+    windows = []
+    start = timestamps[0]
+    while start <= timestamps[-1]:
+        end = start + window
+        first_row, last_row = np.searchsorted(timestamps, [start, end], side="left")
+        if last_row > first_row:
+            windows.append((start, end, int(first_row), int(last_row)))
+        start = start + step
+    return windows
+
+
+
+def parameter_sets(sim_config, param_grid):
+    """Expand a {config_key: [values]} grid into full "simulation" config sections."""
+    if not param_grid:
+        return [dict(sim_config)]
+
+    keys = list(param_grid)
+    return [{**sim_config, **dict(zip(keys, values))} for values in product(*(param_grid[key] for key in keys))]
+
+
+
+def _run_window(window_df, sim_config):
+    """Simulate one window from a fresh state (process pool worker)."""
+    pnl_obj = RealTimePnL(sim_config["commision_per_trade"])
+    results_df, _ = simulation(window_df, pnl_obj=pnl_obj, **simulation_params(sim_config))
+    return results_df, summarize_results(results_df)
+
+
+
+def stitch_results(window_results, keep_from=None):
+    """
+    Concatenate per-window results into one continuous run.
+
+    Each window's cumulative PnL columns are offset by the final values of the
+    previous windows, and peak / max drawdown are recomputed on the stitched net PnL.
+    Windows that were run with carried state are already continuous.
+
+    When windows overlap (step_secs < window_secs), a window only contributes
+    its rows from keep_from on (the previous test window's end, as an exchange
+    time), and its cumulative PnL is counted from the last row before that, so
+    no tick is counted twice.
+
+    Parameters
+    ----------
+    window_results : list of pandas.DataFrame
+        Results of consecutive test windows.
+    keep_from : list, optional
+        First exchange time kept of each window (None = every row). Default keeps every row.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Stitched results.
+    """
+    frames = []
+    offsets = dict.fromkeys(CUMULATIVE_PNL_COLUMNS, 0.0)
+    keep_from = keep_from or [None] * len(window_results)
+    for results_df, first_time in zip(window_results, keep_from):
+        if results_df.empty:
+            continue
+        bases = dict.fromkeys(CUMULATIVE_PNL_COLUMNS, 0.0)
+        if first_time is not None:
+            # Rows are in tick order, so the kept rows are a suffix
+            kept = (results_df["exchange_time"] >= first_time).to_numpy()
+            if not kept.any():
+                continue
+            first_kept = int(kept.argmax())
+            if first_kept > 0:
+                bases = {col: float(results_df[col].iloc[first_kept - 1]) for col in CUMULATIVE_PNL_COLUMNS}
+                results_df = results_df.iloc[first_kept:]
+        results_df = results_df.copy()
+        for col in CUMULATIVE_PNL_COLUMNS:
+            results_df[col] = results_df[col] - bases[col] + offsets[col]
+            offsets[col] = float(results_df[col].iloc[-1])
+        frames.append(results_df)
+
+    if not frames:
+        return pd.DataFrame()
+
+    stitched_df = pd.concat(frames, ignore_index=True)
+    stitched_df["peak_pnl"], stitched_df["max_drawdown"] = running_drawdown(stitched_df["net_pnl"].to_numpy())
+    return stitched_df
+
+
+
+def run_walk_forward(matched_df, config):
+    """
+    Walk-forward / rolling-window backtest over the matched data.
+
+    Every (window, parameter set) pair is simulated independently from a fresh
+    state on a process pool. When the grid holds several parameter sets, the set
+    with the best objective on window i is used to test window i + 1; otherwise
+    every window is a test window. With state_at_boundary = "carry", the test
+    windows are replayed in order keeping positions, PnL and the RNG stream, so
+    their metrics are cumulative from the first test window.
+
+    Parameters
+    ----------
+    matched_df : pandas.DataFrame
+        Matched quotes and signals, sorted by timestamp.
+    config : dict
+        Full config. Uses the "simulation" and "walk_forward" sections.
+
+    Returns
+    -------
+    tuple
+        (windows_df, stitched_df, stitched_summary)
+        - windows_df : pandas.DataFrame
+            One row of metrics per (window, parameter set), with an is_test column.
+        - stitched_df : pandas.DataFrame
+            Results of the test windows stitched into one run.
+        - stitched_summary : dict
+            summarize_results() of the stitched run.
+    """
+    wf_config = config["walk_forward"]
+    state_at_boundary = wf_config.get("state_at_boundary", "reset")
+    objective = wf_config.get("objective", "net_pnl")
+    if state_at_boundary not in ("reset", "carry"):
+        raise ValueError(f"Unknown walk_forward state_at_boundary '{state_at_boundary}'. Expected 'reset' or 'carry'.")
+
+    log_blank_line()
+    logger.info("-------- Walk-Forward Backtest --------")
+    logger.info("=======================================")
+
+    timestamps = matched_df["timestamp"].to_numpy()
+    windows = make_windows(timestamps, wf_config["window_secs"], wf_config["step_secs"])
+    param_sets = parameter_sets(config["simulation"], wf_config.get("param_grid", {}))
+    tuning = len(param_sets) > 1
+    logger.info(f"INFO: {len(windows)} window(s) x {len(param_sets)} parameter set(s), state at boundary: {state_at_boundary}.")
+
+    # --- Evaluate every (window, parameter set) independently ---
+    jobs = list(product(range(len(windows)), range(len(param_sets))))
+    with ProcessPoolExecutor(max_workers=wf_config.get("max_workers")) as pool:
+        futures = [pool.submit(_run_window, matched_df.iloc[windows[w][2]:windows[w][3]], param_sets[p]) for w, p in jobs]
+        outputs = [future.result() for future in futures]
+
+    results = {job: output[0] for job, output in zip(jobs, outputs)}
+    summaries = {job: output[1] for job, output in zip(jobs, outputs)}
+
+    # --- Choose the parameters tested on each window ---
+    test_plan = []
+    for w in range(len(windows)):
+        if not tuning:
+            test_plan.append((w, 0))
+        elif w > 0:
+            scores = [summaries[(w - 1, p)][objective] for p in range(len(param_sets))]
+            test_plan.append((w, int(np.nanargmax(scores))))
+
+    # --- Test windows: reuse the independent runs, or replay them carrying state ---
+    # Overlapping windows (step_secs < window_secs) only add the ticks after the previous test window's end
+    overlapping = wf_config["step_secs"] < wf_config["window_secs"]
+    if overlapping:
+        logger.info("INFO: Windows overlap; each test window adds only the ticks after the previous test window to the stitched run.")
+    if state_at_boundary == "reset":
+        test_results = [results[job] for job in test_plan]
+        keep_from = []
+        previous_end = None
+        for w, p in test_plan:
+            start, end = windows[w][:2]
+            overlaps = previous_end is not None and previous_end > start
+            keep_from.append(previous_end + latency_offset(simulation_params(param_sets[p])["latency"]) if overlaps else None)
+            previous_end = end
+    else:
+        test_results = []
+        pnl_obj = RealTimePnL(config["simulation"]["commision_per_trade"])
+        previous_last_row = 0
+        for i, (w, p) in enumerate(test_plan):
+            kwargs = simulation_params(param_sets[p])
+            if i > 0:
+                kwargs["seed"] = None  # continue the RNG stream of the previous window
+            first_row = max(windows[w][2], previous_last_row)
+            previous_last_row = windows[w][3]
+            if first_row >= windows[w][3]:
+                continue
+            window_df = matched_df.iloc[first_row:windows[w][3]]
+            results_df, _ = simulation(window_df, pnl_obj=pnl_obj, **kwargs)
+            test_results.append(results_df)
+            summaries[(w, p)] = summarize_results(results_df)
+
+    rows = []
+    test_jobs = set(test_plan)
+    for w, p in jobs:
+        start, end, first_row, last_row = windows[w]
+        row = {"window": w, "window_start": start, "window_end": end, "num_of_rows": last_row - first_row,
+               "param_set": p, "is_test": (w, p) in test_jobs}
+        row.update({key: param_sets[p][key] for key in wf_config.get("param_grid", {})})
+        row.update(summaries[(w, p)])
+        rows.append(row)
+    windows_df = pd.DataFrame(rows)
+
+    if state_at_boundary == "carry":
+        stitched_df = pd.concat(test_results, ignore_index=True) if test_results else pd.DataFrame()
+    else:
+        stitched_df = stitch_results(test_results, keep_from)
+    stitched_summary = summarize_results(stitched_df)
+
+    logger.info(f"INFO: Stitched {len(test_plan)} test window(s): net PnL {stitched_summary['net_pnl']:.6f}, "
+                f"max drawdown {stitched_summary['max_drawdown']:.6f}.")
+
+    return windows_df, stitched_df, stitched_summary
+
+
+
+def save_walk_forward(windows_df, stitched_df, results_path):
+    """Write the per-window metrics and the stitched results next to results.csv."""
+    windows_df.to_csv(os.path.join(results_path, "walk_forward_windows.csv"), index=False)
+    stitched_df.to_csv(os.path.join(results_path, "walk_forward_stitched.csv"), index=False)